@@ -53,7 +53,6 @@ class ProfileForm(forms.ModelForm):
         
         return whatsapp
     
-    print(type(clean_whatsapp))
 
     def clean_email(self):
         try :
@@ -48,12 +48,23 @@ class ProfilePicture(models.Model):
     profile = models.ForeignKey(Profile,  on_delete=models.CASCADE, related_name='profile_picture')
     profile_picture = models.ImageField(
         upload_to=user_directory_path , default='accounts/defaults/avatar.png', blank=True, null=True)
+    # resized copies written by accounts.tasks.render_profile_picture; empty until it has run
+    picture_128 = models.ImageField(max_length=255, blank=True, editable=False)
+    picture_200 = models.ImageField(max_length=255, blank=True, editable=False)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return str(self.id)
+
+    @property
+    def avatar_128(self):
+        return self.picture_128 or self.profile_picture
+
+    @property
+    def avatar_200(self):
+        return self.picture_200 or self.profile_picture
     
 class Roles(models.Model):
     name = models.CharField(max_length=100, blank=False, null=False)
@@ -69,9 +80,6 @@ class Roles(models.Model):
 
 
 def agent_image_location(instance, filename):
-    print(instance)
-    print(filename)
-    print(instance.user.username)
     return 'agents/{0}/{1}'.format(instance.user.username, filename)
 
 
@@ -0,0 +1,82 @@
+from functools import partial, wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import redirect
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import SimpleLazyObject
+
+from accounts import models as accounts_models
+
+
+# profile and roles ...............................................................
+# The signed-in user's Profile is read at most once per request and kept on the
+# request. It is also linked to request.user in both directions, so
+# request.user.profile and profile.user in views and templates cost no query.
+# role_required gates a view on one of the Profile role flags (is_business,
+# is_realtor, is_workman) with that same lookup.
+
+def _link(user, profile):
+    field = accounts_models.Profile.user.field
+    if profile is not None:
+        field.set_cached_value(profile, user)
+    field.remote_field.set_cached_value(user, profile)  # None makes user.profile raise as usual
+    return profile
+
+
+def get_profile(request):
+    """The Profile of request.user, or None for anonymous users and users without one"""
+    if not hasattr(request, '_cached_profile'):
+        user = request.user
+        request._cached_profile = _link(
+            user, accounts_models.Profile.objects.filter(user_id=user.pk).first()
+        ) if user.is_authenticated else None
+    return request._cached_profile
+
+
+async def aget_profile(request):
+    if not hasattr(request, '_cached_profile'):
+        user = await request.auser()
+        request._cached_profile = _link(
+            user, await accounts_models.Profile.objects.filter(user_id=user.pk).afirst()
+        ) if user.is_authenticated else None
+    return request._cached_profile
+
+
+class ProfileMiddleware(MiddlewareMixin):
+    """Lazy request.profile and async request.aprofile(), after AuthenticationMiddleware"""
+
+    def process_request(self, request):
+        request.profile = SimpleLazyObject(partial(get_profile, request))
+        request.aprofile = partial(aget_profile, request)
+
+
+def role_required(role, message, redirect_to='accounts:profile'):
+    """
+    Log in, then let through only users whose profile has `role` set. Users
+    without a profile are sent to create one; the others get `message`.
+    Works on sync and async views.
+    """
+    def denied(request, profile):
+        if profile is None:
+            return redirect('accounts:profile')
+        if not getattr(profile, role):
+            messages.error(request, message, extra_tags='danger')
+            return redirect(redirect_to)
+        return None
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                response = denied(request, await aget_profile(request))
+                return response if response is not None else await view(request, *args, **kwargs)
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                response = denied(request, get_profile(request))
+                return response if response is not None else view(request, *args, **kwargs)
+        return login_required(wrapper, login_url='account_login')
+
+    return decorator
@@ -0,0 +1,33 @@
+from property.images import FORMATS, generate_renditions
+from property.tasks import background_task
+
+from accounts import models as accounts_models
+from yk.log import get_logger
+
+
+logger = get_logger(__name__)
+
+AVATAR_RENDITIONS = {
+    '200': (200, 200),
+    '128': (128, 128),
+}
+
+
+@background_task
+def render_profile_picture(pk):
+    """Write the 128px and 200px avatars in one decode and record them on the ProfilePicture"""
+    profile_picture = accounts_models.ProfilePicture.objects.filter(pk=pk).first()
+    if profile_picture is None or not profile_picture.profile_picture:
+        return
+    field_file = profile_picture.profile_picture
+    try:
+        names = generate_renditions(
+            field_file, AVATAR_RENDITIONS, {'jpeg': FORMATS['jpeg']}, crop=True)
+    except OSError:
+        logger.warning('profile_picture_render_failed', pk=pk, name=field_file.name, exc_info=True)
+        return
+    # only record the variants if the upload has not been replaced meanwhile
+    accounts_models.ProfilePicture.objects.filter(pk=pk, profile_picture=field_file.name).update(
+        picture_128=names['128']['jpeg'],
+        picture_200=names['200']['jpeg'],
+    )
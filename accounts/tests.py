@@ -1,3 +1,83 @@
-from django.test import TestCase
+import tempfile
+from io import BytesIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from accounts.models import Profile, ProfilePicture
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ProfilePictureUpdateTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='testpass123')
+        profile = Profile.objects.create(user=self.user, username='owner')
+        ProfilePicture.objects.create(user=self.user, profile=profile)
+        self.client.force_login(self.user)
+
+    def upload(self):
+        content = BytesIO()
+        Image.new('RGB', (1200, 800), 'teal').save(content, 'JPEG')
+        return SimpleUploadedFile('me.jpg', content.getvalue(), content_type='image/jpeg')
+
+    def test_variants_are_rendered_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(
+                reverse('accounts:profile_picture_update'), {'profile_picture': self.upload()})
+        self.assertRedirects(response, reverse('accounts:profile'), fetch_redirect_response=False)
+
+        picture = ProfilePicture.objects.get(user=self.user)
+        self.assertFalse(picture.picture_128)
+        self.assertEqual(picture.avatar_128, picture.profile_picture)
+
+        for callback in callbacks:
+            callback()
+        picture.refresh_from_db()
+        with Image.open(picture.picture_128.path) as small, Image.open(picture.picture_200.path) as large:
+            self.assertEqual((small.size, large.size), ((128, 128), (200, 200)))
+        with Image.open(picture.profile_picture.path) as original:
+            self.assertEqual(original.size, (1200, 800))
+
+
+class RoleRequiredTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='testpass123')
+        self.profile = Profile.objects.create(user=self.user, username='owner', is_business=True)
+        self.client.force_login(self.user)
+
+    def profile_queries(self, url, client=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = (client or self.client).get(url)
+        return response, sum(' FROM "accounts_profile"' in query['sql'] for query in queries)
+
+    def test_one_profile_query_per_request(self):
+        # clients:dashboard and clients:portions_vacants are async views
+        for name in ('clients:dashboard', 'clients:portions_vacants', 'clients:portions_all_list', 'clients:reports'):
+            response, queries = self.profile_queries(reverse(name))
+            self.assertNotEqual(response.status_code, 302, name)
+            self.assertEqual(queries, 1, name)
+
+    def test_other_roles_are_redirected(self):
+        for name in ('workman:dashboard', 'realtor:dashboard', 'property:inquire_lists'):
+            response, queries = self.profile_queries(reverse(name))
+            self.assertEqual(response.status_code, 302, name)
+            self.assertEqual(queries, 1, name)
+        response = self.client.get(reverse('property:inquire_lists'))
+        self.assertRedirects(response, reverse('webpages:home'), fetch_redirect_response=False)
+
+    def test_users_without_profile_are_sent_to_create_one(self):
+        self.profile.delete()
+        response = self.client.get(reverse('clients:dashboard'))
+        self.assertRedirects(response, reverse('accounts:profile'), fetch_redirect_response=False)
+
+    def test_anonymous_users_log_in_first(self):
+        self.client.logout()
+        response = self.client.get(reverse('clients:dashboard'))
+        self.assertTrue(response['Location'].startswith(reverse('account_login')))
@@ -20,6 +20,7 @@ urlpatterns = [
     path('dashboard/portions/unlisted/', clients_views.portions_unlisted, name='portions_unlisted'),
     path('dashboard/<int:property_id>/portions/', clients_views.portions_a_building, name='portions_a_building' ),
     path('dashboard/<int:property_id>/portions/add/', clients_views.portions_add, name='portions_add' ),
+    path('dashboard/<int:property_id>/portions/import/', clients_views.portions_import, name='portions_import' ),
     path('dashboard/portions/<int:portions_id>/update/', clients_views.portions_update, name='portions_update' ),
 
     # Operations
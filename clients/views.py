@@ -1,98 +1,83 @@
+import asyncio
+import datetime
+
+from asgiref.sync import sync_to_async
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib import messages
-from django.contrib.auth.decorators import login_required
 from django.db.models import Count
-from django.core.exceptions import ObjectDoesNotExist
 
+from accounts.roles import role_required
 from property import models as property_models
 from property import forms as property_forms
+from property.bulk_import import import_portions
+from property.pagination import (PORTION_JSON_FIELDS, PROPERTY_JSON_FIELDS, akeyset_paginate, keyset_paginate,
+                                 wants_json)
+from property.vacancy import HORIZONS, horizon_days, vacancy_timeline
 
 
 
 # Create your views here.
 
-@login_required(login_url='account_login')
-def dashboard(request):
-    try:
-        profile = request.user.profile
-    except ObjectDoesNotExist:
-        print("profile is none")
-        return redirect('accounts:profile')
-    if request.user.profile.is_business == False:
-        messages.error(request, 'You are not authorized to access Property Dashboard.', extra_tags='danger')
-        return redirect('accounts:profile')
-    profile = request.user.profile
-    properties = property_models.Property_data.objects.filter(user=request.user)
-    print('properties')
-    print(properties)
-    portions_count = properties.annotate(number_of_portions=Count('portions')).values('id', 'number_of_portions')
-    
-    print('portions_count')
-    print(portions_count)
-    
+business_required = role_required('is_business', 'You are not authorized to access Property Dashboard.')
+
+
+# async dashboards ...............................................................
+# Under ASGI these views wait on the database without holding a worker thread.
+# Independent queries are awaited together; templates still render in a thread
+# because base templates read request.user and other lazy relations.
+
+async def fetch(queryset):
+    return [obj async for obj in queryset]
+
+
+arender = sync_to_async(render)
+
+
+@business_required
+async def dashboard(request):
+    profile = await request.aprofile()
+    properties = property_models.Property_data.objects.filter(user_id=profile.user_id).prefetch_related('portions')
+    properties, portions_count = await asyncio.gather(
+        fetch(properties),
+        fetch(properties.annotate(number_of_portions=Count('portions')).values('id', 'number_of_portions')),
+    )
+
     data = {
         'profile' : profile,
         'properties': properties,
         'portions_count': portions_count,
-
-
     }
-    return render(request, "clients/dashboard.html", data )
+    return await arender(request, "clients/dashboard.html", data)
 
 
 
 
 # Properties **********************************************************************
-@ login_required(login_url='account_login')
-def property_all_list(request):
-    try:
-        profile = request.user.profile
-    except ObjectDoesNotExist:
-        print("profile is none")
-        return redirect('accounts:profile')
-    if request.user.profile.is_business == False:
-        messages.error(request, 'You are not authorized to access Property Dashboard.', extra_tags='danger')
-        return redirect('accounts:profile')
-    profile = request.user.profile
-    properties = property_models.Property_data.objects.filter(user=request.user)
-    print('properties')
-    print(properties)
-    portions_count = properties.annotate(number_of_portions=Count('portions')).values('id', 'number_of_portions')
-    
-    print('portions_count')
-    print(portions_count)
+@business_required
+async def property_all_list(request):
+    profile = await request.aprofile()
+    properties = await akeyset_paginate(
+        request, property_models.Property_data.objects.filter(user_id=profile.user_id).prefetch_related('portions'))
+    if wants_json(request):
+        return properties.json_response(PROPERTY_JSON_FIELDS)
     data = {
         'profile' : profile,
         'properties': properties,
-        'portions_count': portions_count,
         }
-    return render(request, "clients/pages/properties_all_list.html", data )
+    return await arender(request, "clients/pages/properties_all_list.html", data)
 
 
 
-@ login_required(login_url='account_login')
+@business_required
 def property_own_list(request):
-    try:
-        profile = request.user.profile
-    except ObjectDoesNotExist:
-        print("profile is none")
-        return redirect('accounts:profile')
-    if request.user.profile.is_business == False:
-        messages.error(request, 'You are not authorized to access Property Dashboard.', extra_tags='danger')
-        return redirect('accounts:profile')
-    profile = request.user.profile
-    properties = property_models.Property_data.objects.all()
-    print('properties')
-    print(properties)
-    portions_count = properties.annotate(number_of_portions=Count('portions')).values('id', 'number_of_portions')
-    
-    print('portions_count')
-    print(portions_count)
+    profile = request.profile
+    properties = keyset_paginate(request, property_models.Property_data.objects.prefetch_related('portions'))
+    if wants_json(request):
+        return properties.json_response(PROPERTY_JSON_FIELDS)
     data = {
         'profile' : profile,
         'properties': properties,
-        'portions_count': portions_count,
         }
     return render(request, "clients/pages/properties_all_list.html", data )
 
@@ -102,16 +87,12 @@ def property_own_list(request):
 
 
 
-@ login_required(login_url='account_login')
+@business_required
 def property_create(request):
     form = property_forms.PropertyForm()
-    print('property_create')
     if request.method == 'POST':
-        print('property_create_post')
-        print(request.POST)
         form = property_forms.PropertyForm(request.POST, request.FILES)
         if form.is_valid():
-            print('form valid')
             form = form.save(commit=False)
             form.user = request.user
 
@@ -123,9 +104,8 @@ def property_create(request):
 
 
 
-@ login_required(login_url='account_login')
+@business_required
 def property_update(request,  property_id):
-    print('property_update', property_id)
     property_data = property_models.Property_data.objects.get(id=property_id)
     form = property_forms.PropertyForm(instance=property_data)
     if request.method == 'POST':
@@ -148,20 +128,12 @@ def property_update(request,  property_id):
 # portions **********************************************************************
 
 
-@login_required(login_url='account_login')
+@business_required
 def portions_all_list(request):
-    try:
-        profile = request.user.profile
-    except ObjectDoesNotExist:
-        print("profile is none")
-        return redirect('accounts:profile')
-    if request.user.profile.is_business == False:
-        messages.error(request, 'You are not authorized to access Property Dashboard.', extra_tags='danger')
-        return redirect('accounts:profile')
-    profile = request.user.profile
-    portions = property_models.Portions.objects.filter(user=request.user)
-    print('portions')
-    print(portions)  
+    profile = request.profile
+    portions = keyset_paginate(request, property_models.Portions.objects.for_listing().for_owner(request.user))
+    if wants_json(request):
+        return portions.json_response(PORTION_JSON_FIELDS)
     data = {
         'profile' : profile,
         'portions': portions, 
@@ -169,20 +141,12 @@ def portions_all_list(request):
     return render(request, "clients/pages/portions_all_list.html", data )
 
 
-@login_required(login_url='account_login')
+@business_required
 def portions_own_list(request):
-    try:
-        profile = request.user.profile
-    except ObjectDoesNotExist:
-        print("profile is none")
-        return redirect('accounts:profile')
-    if request.user.profile.is_business == False:
-        messages.error(request, 'You are not authorized to access Property Dashboard.', extra_tags='danger')
-        return redirect('accounts:profile')
-    profile = request.user.profile
-    portions = property_models.Portions.objects.filter(user=request.user)
-    print('portions')
-    print(portions)  
+    profile = request.profile
+    portions = keyset_paginate(request, property_models.Portions.objects.for_listing().for_owner(request.user))
+    if wants_json(request):
+        return portions.json_response(PORTION_JSON_FIELDS)
     data = {
         'profile' : profile,
         'portions': portions, 
@@ -190,15 +154,15 @@ def portions_own_list(request):
     return render(request, "clients/pages/portions_all_list.html", data )
 
 
-@login_required(login_url='account_login')
+@business_required
 def portions_a_building(request, property_id):
     
     property = get_object_or_404(property_models.Property_data, id=property_id)
     
-    profile = request.user.profile
-    portions = property_models.Portions.objects.filter(user=request.user, property_data_id=property_id)
-    print('portions')
-    print(portions)  
+    profile = request.profile
+    portions = keyset_paginate(request, property_models.Portions.objects.for_listing().for_owner(request.user).filter(property_data_id=property_id))
+    if wants_json(request):
+        return portions.json_response(PORTION_JSON_FIELDS)
     data = {
         'profile' : profile,
         'property': property, 
@@ -207,39 +171,60 @@ def portions_a_building(request, property_id):
     return render(request, "clients/pages/portions_all_list.html", data )
 
 
-@ login_required(login_url='account_login')
+@business_required
 def portions_add(request, property_id):
     if property_id == None:
-        print('property_id is none')
         return redirect('property:dashboard')
     building = get_object_or_404(property_models.Property_data, id=property_id)
     if building.user != request.user:
         messages.error(request, 'You are not authorized to access this portion.', extra_tags='danger')
         return redirect('property:dashboard')
     form = property_forms.PortionsForm()
-    print('portion_single_add')
     if request.method == 'POST':
         form = property_forms.PortionsForm(request.POST, request.FILES)
         if form.is_valid():
             form = form.save(commit=False)
-            print('form valid')
             form.property_data_id = property_id
             form.user = request.user
 
             form.save()
 
             return redirect('property:portions_of_property', pk=request.user.id, property_id=property_id)
-    context = {'form': form}
+    context = {'form': form, 'property_id': property_id}
 
 
     return render(request, 'clients/pages/portions_add.html', context)
 
 
+@business_required
+def portions_import(request, property_id):
+    """Bulk add portions to a building from a CSV/XLSX file"""
+    building = get_object_or_404(property_models.Property_data, id=property_id)
+    if building.user != request.user:
+        messages.error(request, 'You are not authorized to access this property.', extra_tags='danger')
+        return redirect('clients:dashboard')
+    form = property_forms.PortionImportUploadForm()
+    result = None
+    if request.method == 'POST':
+        form = property_forms.PortionImportUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            result = import_portions(building, request.user, form.cleaned_data['file'])
+            if result.file_error:
+                messages.error(request, result.file_error, extra_tags='danger')
+            else:
+                messages.success(request, f'Imported {result.created} portions, {result.failed} rows skipped.')
+    context = {
+        'form': form,
+        'building': building,
+        'result': result,
+    }
+    return render(request, 'clients/pages/portions_import.html', context)
+
+
 # @todo portions listing
-@login_required(login_url='account_login')
+@business_required
 def portions_update(request, portions_id):
     all_portions = get_object_or_404(property_models.Portions, id=portions_id)
-    print(all_portions)
     form = property_forms.PortionsForm(instance=all_portions)
     if request.method == 'POST':
         form = property_forms.PortionsForm(request.POST, request.FILES,
@@ -258,124 +243,106 @@ def portions_update(request, portions_id):
 
 # Portion Status Views **********************************************************************
 
-@login_required(login_url='account_login')
-def portions_vacant_soon(request):
+@business_required
+async def portions_vacant_soon(request):
     """Display portions that will be vacant soon (status pending or expiring within 30 days)"""
-    try:
-        profile = request.user.profile
-    except ObjectDoesNotExist:
-        return redirect('accounts:profile')
-    if request.user.profile.is_business == False:
-        messages.error(request, 'You are not authorized to access Property Dashboard.', extra_tags='danger')
-        return redirect('accounts:profile')
-
-    profile = request.user.profile
-    # Get portions with vacant_soon status
-    portions = property_models.Portions.objects.filter(
-        user=request.user,
-        portions_status__status='vacant_soon'
-    ).distinct()
+    profile = await request.aprofile()
+
+    days = horizon_days(request)
+    # Get portions with vacant_soon status within the horizon
+    portions = (property_models.Portions.objects.for_listing().for_owner(profile.user_id)
+                .with_status('VACANT_SOON')
+                .filter(current_vacant_date__lte=datetime.date.today() + datetime.timedelta(days=days)))
+    if wants_json(request):
+        return (await akeyset_paginate(request, portions)).json_response(PORTION_JSON_FIELDS)
+    portions, timeline = await asyncio.gather(
+        akeyset_paginate(request, portions),
+        sync_to_async(vacancy_timeline)('VACANT_SOON', days, user=profile.user_id),
+    )
 
     data = {
         'profile': profile,
         'portions': portions,
         'filter_type': 'Vacant Soon',
+        'timeline': timeline,
+        'days': days,
+        'horizons': HORIZONS,
+        'query': f'days={days}',
     }
-    return render(request, "clients/pages/portions_all_list.html", data)
+    return await arender(request, "clients/pages/portions_all_list.html", data)
 
 
-@login_required(login_url='account_login')
-def portions_vacants(request):
+@business_required
+async def portions_vacants(request):
     """Display vacant portions (status vacant)"""
-    try:
-        profile = request.user.profile
-    except ObjectDoesNotExist:
-        return redirect('accounts:profile')
-    if request.user.profile.is_business == False:
-        messages.error(request, 'You are not authorized to access Property Dashboard.', extra_tags='danger')
-        return redirect('accounts:profile')
-
-    profile = request.user.profile
+    profile = await request.aprofile()
+
+    days = horizon_days(request)
     # Get vacant portions
-    portions = property_models.Portions.objects.filter(
-        user=request.user,
-        portions_status__status='vacant'
-    ).distinct()
+    portions = property_models.Portions.objects.for_listing().for_owner(profile.user_id).with_status('VACANT')
+    if wants_json(request):
+        return (await akeyset_paginate(request, portions)).json_response(PORTION_JSON_FIELDS)
+    portions, timeline = await asyncio.gather(
+        akeyset_paginate(request, portions),
+        sync_to_async(vacancy_timeline)('VACANT', days, user=profile.user_id),
+    )
 
     data = {
         'profile': profile,
         'portions': portions,
         'filter_type': 'Vacant',
+        'timeline': timeline,
+        'days': days,
+        'horizons': HORIZONS,
+        'query': f'days={days}',
     }
-    return render(request, "clients/pages/portions_all_list.html", data)
+    return await arender(request, "clients/pages/portions_all_list.html", data)
 
 
-@login_required(login_url='account_login')
-def portions_occupied(request):
+@business_required
+async def portions_occupied(request):
     """Display occupied portions (status occupied)"""
-    try:
-        profile = request.user.profile
-    except ObjectDoesNotExist:
-        return redirect('accounts:profile')
-    if request.user.profile.is_business == False:
-        messages.error(request, 'You are not authorized to access Property Dashboard.', extra_tags='danger')
-        return redirect('accounts:profile')
-
-    profile = request.user.profile
+    profile = await request.aprofile()
+
     # Get occupied portions
-    portions = property_models.Portions.objects.filter(
-        user=request.user,
-        portions_status__status='occupied'
-    ).distinct()
+    portions = await akeyset_paginate(
+        request, property_models.Portions.objects.for_listing().for_owner(profile.user_id).with_status('OCCUPIED'))
+    if wants_json(request):
+        return portions.json_response(PORTION_JSON_FIELDS)
 
     data = {
         'profile': profile,
         'portions': portions,
         'filter_type': 'Occupied',
     }
-    return render(request, "clients/pages/portions_all_list.html", data)
+    return await arender(request, "clients/pages/portions_all_list.html", data)
 
 
-@login_required(login_url='account_login')
-def portions_unlisted(request):
+@business_required
+async def portions_unlisted(request):
     """Display unlisted portions (not listed for rent/sale)"""
-    try:
-        profile = request.user.profile
-    except ObjectDoesNotExist:
-        return redirect('accounts:profile')
-    if request.user.profile.is_business == False:
-        messages.error(request, 'You are not authorized to access Property Dashboard.', extra_tags='danger')
-        return redirect('accounts:profile')
-
-    profile = request.user.profile
+    profile = await request.aprofile()
+
     # Get unlisted portions (those without any status)
-    portions = property_models.Portions.objects.filter(
-        user=request.user,
-        portions_status__isnull=True
-    )
+    portions = await akeyset_paginate(
+        request, property_models.Portions.objects.for_listing().for_owner(profile.user_id).with_status(''))
+    if wants_json(request):
+        return portions.json_response(PORTION_JSON_FIELDS)
 
     data = {
         'profile': profile,
         'portions': portions,
         'filter_type': 'Unlisted',
     }
-    return render(request, "clients/pages/portions_all_list.html", data)
+    return await arender(request, "clients/pages/portions_all_list.html", data)
 
 
 # Operations Views **********************************************************************
 
-@login_required(login_url='account_login')
+@business_required
 def visit_requests(request):
     """Display visit requests for properties"""
-    try:
-        profile = request.user.profile
-    except ObjectDoesNotExist:
-        return redirect('accounts:profile')
-    if request.user.profile.is_business == False:
-        messages.error(request, 'You are not authorized to access Property Dashboard.', extra_tags='danger')
-        return redirect('accounts:profile')
-
-    profile = request.user.profile
+    profile = request.profile
     # TODO: Implement actual visit requests model
     visit_requests_list = []
 
@@ -386,18 +353,10 @@ def visit_requests(request):
     return render(request, "clients/pages/visit_requests.html", data)
 
 
-@login_required(login_url='account_login')
+@business_required
 def job_requests(request):
     """Display job/maintenance requests"""
-    try:
-        profile = request.user.profile
-    except ObjectDoesNotExist:
-        return redirect('accounts:profile')
-    if request.user.profile.is_business == False:
-        messages.error(request, 'You are not authorized to access Property Dashboard.', extra_tags='danger')
-        return redirect('accounts:profile')
-
-    profile = request.user.profile
+    profile = request.profile
     # TODO: Implement actual job requests model
     job_requests_list = []
 
@@ -408,18 +367,10 @@ def job_requests(request):
     return render(request, "clients/pages/job_requests.html", data)
 
 
-@login_required(login_url='account_login')
+@business_required
 def tenant_docs(request):
     """Display tenant documents"""
-    try:
-        profile = request.user.profile
-    except ObjectDoesNotExist:
-        return redirect('accounts:profile')
-    if request.user.profile.is_business == False:
-        messages.error(request, 'You are not authorized to access Property Dashboard.', extra_tags='danger')
-        return redirect('accounts:profile')
-
-    profile = request.user.profile
+    profile = request.profile
     # TODO: Implement actual tenant documents model
     tenant_docs_list = []
 
@@ -430,18 +381,10 @@ def tenant_docs(request):
     return render(request, "clients/pages/tenant_docs.html", data)
 
 
-@login_required(login_url='account_login')
+@business_required
 def rent_reports(request):
     """Display rent reports and payment history"""
-    try:
-        profile = request.user.profile
-    except ObjectDoesNotExist:
-        return redirect('accounts:profile')
-    if request.user.profile.is_business == False:
-        messages.error(request, 'You are not authorized to access Property Dashboard.', extra_tags='danger')
-        return redirect('accounts:profile')
-
-    profile = request.user.profile
+    profile = request.profile
     # TODO: Implement actual rent reports logic
     rent_reports_list = []
 
@@ -452,19 +395,13 @@ def rent_reports(request):
     return render(request, "clients/pages/rent_reports.html", data)
 
 
-@login_required(login_url='account_login')
+@business_required
 def portion_status_management(request):
     """Manage portion statuses"""
-    try:
-        profile = request.user.profile
-    except ObjectDoesNotExist:
-        return redirect('accounts:profile')
-    if request.user.profile.is_business == False:
-        messages.error(request, 'You are not authorized to access Property Dashboard.', extra_tags='danger')
-        return redirect('accounts:profile')
-
-    profile = request.user.profile
-    portions = property_models.Portions.objects.filter(user=request.user)
+    profile = request.profile
+    portions = keyset_paginate(request, property_models.Portions.objects.for_listing().for_owner(request.user))
+    if wants_json(request):
+        return portions.json_response(PORTION_JSON_FIELDS)
 
     data = {
         'profile': profile,
@@ -475,18 +412,10 @@ def portion_status_management(request):
 
 # General Pages **********************************************************************
 
-@login_required(login_url='account_login')
+@business_required
 def reports(request):
     """Display reports dashboard"""
-    try:
-        profile = request.user.profile
-    except ObjectDoesNotExist:
-        return redirect('accounts:profile')
-    if request.user.profile.is_business == False:
-        messages.error(request, 'You are not authorized to access Property Dashboard.', extra_tags='danger')
-        return redirect('accounts:profile')
-
-    profile = request.user.profile
+    profile = request.profile
 
     data = {
         'profile': profile,
@@ -494,18 +423,10 @@ def reports(request):
     return render(request, "clients/pages/reports.html", data)
 
 
-@login_required(login_url='account_login')
+@business_required
 def contacts(request):
     """Display contacts page"""
-    try:
-        profile = request.user.profile
-    except ObjectDoesNotExist:
-        return redirect('accounts:profile')
-    if request.user.profile.is_business == False:
-        messages.error(request, 'You are not authorized to access Property Dashboard.', extra_tags='danger')
-        return redirect('accounts:profile')
-
-    profile = request.user.profile
+    profile = request.profile
     # TODO: Implement actual contacts model
     contacts_list = []
 
@@ -516,18 +437,10 @@ def contacts(request):
     return render(request, "clients/pages/contacts.html", data)
 
 
-@login_required(login_url='account_login')
+@business_required
 def services(request):
     """Display services page"""
-    try:
-        profile = request.user.profile
-    except ObjectDoesNotExist:
-        return redirect('accounts:profile')
-    if request.user.profile.is_business == False:
-        messages.error(request, 'You are not authorized to access Property Dashboard.', extra_tags='danger')
-        return redirect('accounts:profile')
-
-    profile = request.user.profile
+    profile = request.profile
 
     data = {
         'profile': profile,
@@ -1,6 +1,9 @@
 from django.contrib import admin
+from .fulltext import search_portions
 from .models import *
 
+ADMIN_SEARCH_LIMIT = 500
+
 # Register your models here.
 
 
@@ -12,6 +15,7 @@ class BuildingInfoAdmin(admin.ModelAdmin):
                    'date_created', 'date_updated')
     search_fields = ('title', 'landmark', 'zone_no',
                      'street_no', 'property_no')
+    readonly_fields = ('geo_cell',)
     list_per_page = 10
 
     class Meta:
@@ -29,10 +33,17 @@ class PortionsAdmin(admin.ModelAdmin):
                     'furnished_type', 'furnished_extra_info', 'sqft', 'photo_main', 'date_created', 'date_updated')
     list_filter = ('price', 'bedrooms', 'bathrooms',
                    'furnished_type', 'date_created', 'date_updated')
-    search_fields = ('unit_no', 'description', 'price', 'bedrooms', 'bathrooms',
-                     'furnished_type', 'furnished_extra_info', 'sqft', 'date_created', 'date_updated')
+    search_fields = ('=unit_no',)
     list_per_page = 10
 
+    def get_search_results(self, request, queryset, search_term):
+        # unit numbers match exactly, words go through the full-text index instead of icontains scans
+        matches, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        hits = search_portions(search_term, limit=ADMIN_SEARCH_LIMIT)
+        if hits:
+            matches |= queryset.filter(id__in=[hit.portion_id for hit in hits])
+        return matches, may_have_duplicates
+
     class Meta:
         model = Portions
         verbose_name = 'portion'
@@ -44,7 +55,7 @@ class PortionsAdmin(admin.ModelAdmin):
 
 @admin.register(Zone_names)
 class Zone_namesAdmin(admin.ModelAdmin):
-    list_display = ('zone_name', 'zone_no')
+    list_display = ('zone_name', 'zone_no', 'latitude', 'longitude')
     list_filter = ('zone_name', 'zone_no')
     search_fields = ('zone_name', 'zone_no')
     list_per_page = 10
@@ -1,7 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class PropertyConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'property'
 
+    def ready(self):
+        from property import signals  # noqa: F401
+        from property.fulltext import create_text_index
+
+        post_migrate.connect(create_text_index, sender=self)
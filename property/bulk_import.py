@@ -0,0 +1,181 @@
+import csv
+import io
+import os
+from zipfile import BadZipFile
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+from property import forms as property_forms
+from property import models as property_models
+from property.fulltext import index_portions
+from property.matching import MATCHABLE_STATUSES
+from property.search import FacetDeltas, count_new_facets
+from property.tasks import enqueue, rematch_portions
+from property.vacancy import rebuild_vacancy_calendar
+
+
+# bulk portion import ..............................................................
+# Rows are streamed from the upload, validated with the PortionsForm rules and
+# written with bulk_create in fixed-size batches, so memory stays flat on 50k-row files.
+
+BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 200
+
+STATUS_COLUMNS = ['status', 'vacant_date']
+IMPORT_COLUMNS = property_forms.PortionImportForm.Meta.fields + STATUS_COLUMNS
+
+def valid_default(field):
+    try:
+        field.clean(field.get_default(), None)
+    except ValidationError:
+        return False
+    return True
+
+
+# the form requires every non-blank field, so empty cells fall back to the model defaults;
+# a default the field itself rejects (furnished_type's 'No' is not a choice) leaves the cell required
+PORTION_DEFAULTS = {
+    field.name: field.get_default()
+    for field in property_models.Portions._meta.concrete_fields
+    if field.name in property_forms.PortionImportForm.Meta.fields and field.has_default() and valid_default(field)
+}
+
+
+class UnreadableFile(Exception):
+    """The upload is not a workbook or UTF-8 text; rows read before it was noticed are kept"""
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.failed = 0
+        self.errors = []  # (row_no, {column: message}), capped at MAX_REPORTED_ERRORS
+        self.file_error = ''  # why reading the file stopped, if it did
+
+    def add_error(self, row_no, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((row_no, errors))
+
+    @property
+    def errors_truncated(self):
+        return self.failed > len(self.errors)
+
+
+def column_name(header):
+    return str(header or '').strip().lower().replace(' ', '_')
+
+
+def read_rows(upload):
+    """Yield (row_no, {column: value}) from a CSV or XLSX upload without reading it whole"""
+    if os.path.splitext(upload.name)[1].lower() == '.xlsx':
+        try:
+            workbook = load_workbook(upload.file, read_only=True, data_only=True)
+        except (BadZipFile, InvalidFileException, KeyError) as error:  # KeyError: a zip without a workbook
+            raise UnreadableFile('The file is not a readable .xlsx workbook.') from error
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [column_name(cell) for cell in next(rows, ())]
+            for row_no, values in enumerate(rows, start=2):
+                yield row_no, dict(zip(header, values))
+        finally:
+            workbook.close()
+    else:
+        reader = csv.reader(io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline=''))
+        row_no = 1
+        try:
+            header = [column_name(cell) for cell in next(reader, [])]
+            for row_no, values in enumerate(reader, start=2):
+                yield row_no, dict(zip(header, values))
+        except UnicodeDecodeError as error:
+            raise UnreadableFile(f'Stopped after row {row_no}: the file is not UTF-8 text, '
+                                 f'save it as "CSV UTF-8" and upload it again.') from error
+        except csv.Error as error:
+            raise UnreadableFile(f'Stopped after row {row_no}: {error}.') from error
+
+
+def build_row(row):
+    """Validate one row; returns (portion, status or None, errors)"""
+    data = {column: value for column, value in row.items()
+            if column in IMPORT_COLUMNS and value not in (None, '')}
+    if not data:
+        return None, None, None
+
+    portion_form = property_forms.PortionImportForm(data={**PORTION_DEFAULTS, **data})
+    status_form = None
+    if any(column in data for column in STATUS_COLUMNS):
+        status_form = property_forms.PortionsStatusForm(data=data)
+
+    errors = {}
+    if not portion_form.is_valid():
+        errors.update(portion_form.errors)
+    if status_form is not None and not status_form.is_valid():
+        errors.update(status_form.errors)
+    if errors:
+        return None, None, {column: ' '.join(messages) for column, messages in errors.items()}
+
+    portion = portion_form.save(commit=False)
+    status = status_form.save(commit=False) if status_form is not None else None
+    if status is not None:
+        # bulk_create skips the Portions_status receivers, so fill the snapshot here
+        portion.current_status = status.status
+        portion.current_vacant_date = status.vacant_date
+    return portion, status, None
+
+
+def save_batch(batch):
+    with transaction.atomic():
+        portions = property_models.Portions.objects.bulk_create([portion for portion, _ in batch])
+        statuses = []
+        for portion, status in zip(portions, (status for _, status in batch)):
+            if status is not None:
+                status.portions = portion
+                statuses.append(status)
+        property_models.Portions_status.objects.bulk_create(statuses)
+        # bulk_create skips the receivers that keep InquiryMatch current
+        matchable = [status.portions_id for status in statuses if status.status in MATCHABLE_STATUSES]
+        if matchable:
+            enqueue(rematch_portions, matchable)
+        index_portions(portion.id for portion in portions)
+    return portions
+
+
+def import_portions(building, user, upload, batch_size=BATCH_SIZE):
+    """Import portions of one building from a CSV/XLSX upload"""
+    result = ImportResult()
+    batch = []
+    facets = FacetDeltas()
+    token = property_models.portion_count_suspended.set(True)
+    try:
+        try:
+            for row_no, row in read_rows(upload):
+                portion, status, errors = build_row(row)
+                if errors:
+                    result.add_error(row_no, errors)
+                    continue
+                if portion is None:
+                    continue
+                portion.property_data = building
+                portion.user = user
+                batch.append((portion, status))
+                if len(batch) >= batch_size:
+                    portions = save_batch(batch)
+                    result.created += len(portions)
+                    facets.update(count_new_facets(portions))
+                    batch = []
+        except UnreadableFile as error:
+            result.file_error = str(error)
+        if batch:
+            portions = save_batch(batch)
+            result.created += len(portions)
+            facets.update(count_new_facets(portions))
+    finally:
+        property_models.portion_count_suspended.reset(token)
+        # one counter update, one calendar recount and one facet update for the whole file
+        property_models.adjust_portion_counts({building.id: result.created})
+        rebuild_vacancy_calendar([user.id])
+        facets.apply()
+    return result
@@ -5,7 +5,7 @@ from property.models import *
 class PropertyForm(forms.ModelForm):
     class Meta:
         model = Property_data
-        exclude = ['user', 'date_created', 'date_updated', 'property_code']
+        exclude = ['user', 'date_created', 'date_updated', 'property_code', 'location_source', 'geo_cell']
         widgets = {
             'name': forms.TextInput(attrs={'class': 'modern-input', 'placeholder': 'Property name'}),
             'address': forms.TextInput(attrs={'class': 'modern-input', 'placeholder': 'Property address'}),
@@ -20,6 +20,14 @@ class PropertyForm(forms.ModelForm):
             'photo_3': forms.FileInput(attrs={'class': 'modern-input', 'accept': 'image/*'}),
         }
 
+    def clean(self):
+        cleaned_data = super().clean()
+        if {'latitude', 'longitude'} & set(self.changed_data):
+            # coordinates typed in replace the derived ones; cleared, they are derived again
+            captured = cleaned_data.get('latitude') is not None and cleaned_data.get('longitude') is not None
+            self.instance.location_source = 'CAPTURED' if captured else ''
+        return cleaned_data
+
 
 class PortionsForm(forms.ModelForm):
     class Meta:
@@ -44,10 +52,30 @@ class PortionsForm(forms.ModelForm):
             'photo_3': forms.FileInput(attrs={'class': 'modern-input', 'accept': 'image/*'}),
         }
 
+class PortionImportForm(PortionsForm):
+    """PortionsForm rules for one imported row; the building comes from the URL and photos are not imported"""
+    class Meta(PortionsForm.Meta):
+        fields = ['portion_type', 'furnished_type', 'furnished_extra_info', 'unit_no', 'floor_no', 'description', 'price', 'bedrooms', 'bathrooms', 'sqft']
+
+
+class PortionImportUploadForm(forms.Form):
+    file = forms.FileField(
+        help_text='CSV or XLSX with a header row: ' + ', '.join(
+            PortionImportForm.Meta.fields + ['status', 'vacant_date']),
+        widget=forms.FileInput(attrs={'class': 'modern-input', 'accept': '.csv,.xlsx'}))
+
+    def clean_file(self):
+        file = self.cleaned_data['file']
+        if not file.name.lower().endswith(('.csv', '.xlsx')):
+            raise forms.ValidationError('Upload a .csv or .xlsx file.')
+        return file
+
+
 class Singelform(forms.ModelForm):
     class Meta:
         model = Portions
         fields = '__all__'
+        exclude = ['current_status', 'current_vacant_date']
         widgets = {
             'property_data': forms.HiddenInput(),
         }
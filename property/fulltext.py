@@ -0,0 +1,250 @@
+import re
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+from django.db import DEFAULT_DB_ALIAS, NotSupportedError, connections, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from property import models as property_models
+
+
+# full-text portion search ........................................................
+# A portion's description and furnishing notes are searched together with its
+# building's title and landmark. Text is normalized before it is indexed and
+# before it is queried: Arabic diacritics, tatweel and letter variants are
+# folded and Arabic-Indic digits become ASCII, so a query matches however the
+# listing was typed. PostgreSQL keeps an English and an Arabic tsvector per
+# portion in PortionDocument under a GIN index; SQLite keeps an FTS5 table.
+# Both rank matches and return a snippet with the matched words highlighted.
+# The receivers in property.signals and the bulk paths keep either current.
+
+TEXT_SEARCH_LIMIT = 50
+TEXT_FIELDS = {'description', 'furnished_extra_info', 'property_data'}  # Portions fields the index reads
+INDEX_BATCH = 1000
+
+# snippet markers the indexed text cannot contain, turned into <mark> after escaping
+MARK_START = '\x02'
+MARK_STOP = '\x03'
+
+ARABIC_MARKS = re.compile('[\u0610-\u061a\u0640\u064b-\u065f\u0670\u06d6-\u06ed]')  # harakat, tatweel
+ARABIC_LETTERS = re.compile('[\u0600-\u06ff]')
+FOLD = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',  # hamza / madda alef: alef
+    'ى': 'ي', 'ئ': 'ي',  # alef maqsura, yeh with hamza: yeh
+    'ؤ': 'و',  # waw with hamza: waw
+    'ة': 'ه',  # teh marbuta: heh
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+    **{chr(0x06f0 + digit): str(digit) for digit in range(10)},
+    MARK_START: ' ', MARK_STOP: ' ',
+})
+WORD = re.compile(r'\w+')
+
+# Arabic clitics for the SQLite engine, whose tokenizer has no Arabic stemmer (longest first)
+ARABIC_PREFIXES = ('وال', 'بال', 'كال', 'فال', 'لل', 'ال', 'و', 'ب', 'ل', 'ك', 'ف')
+ARABIC_SUFFIXES = ('ها', 'ان', 'ات', 'ون', 'ين', 'يه', 'ه', 'ي')
+
+
+def normalize(text):
+    return ARABIC_MARKS.sub('', (text or '').translate(FOLD))
+
+
+def highlight(snippet):
+    """Escape a snippet and turn its markers into <mark> tags"""
+    return mark_safe(escape(snippet).replace(MARK_START, '<mark>').replace(MARK_STOP, '</mark>'))
+
+
+class TextHit:
+    """One matching portion, best first"""
+
+    def __init__(self, portion_id, rank, snippet):
+        self.portion_id = portion_id
+        self.rank = rank
+        self.snippet = highlight(snippet or '')
+
+
+def portion_documents(portion_ids):
+    """(portion id, heading, body, extra) for each portion, normalized"""
+    rows = property_models.Portions.objects.filter(id__in=portion_ids).values_list(
+        'id', 'property_data__title', 'property_data__landmark', 'description', 'furnished_extra_info')
+    for portion_id, title, landmark, description, extra in rows:
+        yield portion_id, normalize(f'{title} {landmark}'), normalize(description), normalize(extra)
+
+
+def batches(portion_ids):
+    portion_ids = list(portion_ids)
+    for start in range(0, len(portion_ids), INDEX_BATCH):
+        yield portion_ids[start:start + INDEX_BATCH]
+
+
+class PostgresEngine:
+    """PortionDocument rows with a weighted tsvector per configuration, under a GIN index"""
+
+    def __init__(self, using):
+        self.using = using
+        self.configs = settings.FULLTEXT_CONFIGS
+
+    def vector(self):
+        return reduce(lambda left, right: left + right, (
+            SearchVector(field, config=config, weight=weight)
+            for config in self.configs
+            for field, weight in (('heading', 'A'), ('body', 'B'), ('extra', 'C'))
+        ))
+
+    def index(self, portion_ids):
+        documents = property_models.PortionDocument.objects.using(self.using)
+        for batch in batches(portion_ids):
+            with transaction.atomic(using=self.using):
+                documents.bulk_create([
+                    property_models.PortionDocument(portion_id=portion_id, heading=heading, body=body, extra=extra)
+                    for portion_id, heading, body, extra in portion_documents(batch)
+                ], update_conflicts=True, unique_fields=['portion'], update_fields=['heading', 'body', 'extra'])
+                documents.filter(portion_id__in=batch).update(vector=self.vector())
+
+    def remove(self, portion_ids):
+        for batch in batches(portion_ids):
+            property_models.PortionDocument.objects.using(self.using).filter(portion_id__in=batch).delete()
+
+    def rebuild(self):
+        property_models.PortionDocument.objects.using(self.using).all().delete()
+        self.index(property_models.Portions.objects.using(self.using).values_list('id', flat=True))
+
+    def search(self, text, limit):
+        text = normalize(text)
+        query = reduce(or_, (SearchQuery(text, config=config, search_type='websearch') for config in self.configs))
+        # Arabic text is parsed for the snippet with the Arabic configuration, anything else with the first
+        headline_config = 'arabic' if 'arabic' in self.configs and ARABIC_LETTERS.search(text) else self.configs[0]
+        rows = (property_models.PortionDocument.objects.using(self.using)
+                .filter(vector=query)
+                .annotate(rank=SearchRank(F('vector'), query, cover_density=True),
+                          snippet=SearchHeadline(
+                              Concat('heading', Value(' · '), 'body', Value(' · '), 'extra'), query,
+                              config=headline_config, start_sel=MARK_START, stop_sel=MARK_STOP,
+                              max_fragments=2, max_words=20, min_words=8))
+                .order_by('-rank', '-portion_id')
+                .values_list('portion_id', 'rank', 'snippet')[:limit])
+        return [TextHit(*row) for row in rows]
+
+
+class SQLiteEngine:
+    """
+    An FTS5 table with the same three weighted columns, created after migrate;
+    each row's rowid is its portion id, so replacing and deleting are key lookups
+    """
+
+    table = 'property_portion_fts'
+
+    def __init__(self, using):
+        self.using = using
+
+    def create(self):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute('SELECT name FROM pragma_table_info(%s)', [self.table])
+            unkeyed = 'portion_id' in {name for name, in cursor.fetchall()}
+            if unkeyed:  # the first layout kept the id in an UNINDEXED column
+                cursor.execute(f'DROP TABLE {self.table}')
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5('
+                f'heading, body, extra, tokenize="porter unicode61 remove_diacritics 2")')
+        if unkeyed:
+            self.rebuild()
+
+    def index(self, portion_ids):
+        for batch in batches(portion_ids):
+            with transaction.atomic(using=self.using), connections[self.using].cursor() as cursor:
+                self.delete(cursor, batch)
+                cursor.executemany(
+                    f'INSERT INTO {self.table} (rowid, heading, body, extra) VALUES (%s, %s, %s, %s)',
+                    list(portion_documents(batch)))
+
+    def remove(self, portion_ids):
+        for batch in batches(portion_ids):
+            with connections[self.using].cursor() as cursor:
+                self.delete(cursor, batch)
+
+    def delete(self, cursor, batch):
+        cursor.execute(f'DELETE FROM {self.table} WHERE rowid IN ({", ".join(["%s"] * len(batch))})', batch)
+
+    def rebuild(self):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+        self.index(property_models.Portions.objects.using(self.using).values_list('id', flat=True))
+
+    def match(self, word):
+        """FTS5 query for one word, quoted so FTS5 operators in the input stay literal"""
+        if not ARABIC_LETTERS.search(word):
+            return f'"{word}"'  # the porter tokenizer stems English on both sides
+        # strip the query word to a light stem, then match it with any clitic in front and any ending
+        stem = word
+        for affixes, strip in ((ARABIC_PREFIXES, lambda w, a: w[len(a):] if w.startswith(a) else None),
+                               (ARABIC_SUFFIXES, lambda w, a: w[:-len(a)] if w.endswith(a) else None)):
+            for affix in affixes:
+                stripped = strip(stem, affix)
+                if stripped and len(stripped) >= 2:
+                    stem = stripped
+                    break
+        return '(' + ' OR '.join(f'"{prefix}{stem}"*' for prefix in ('',) + ARABIC_PREFIXES) + ')'
+
+    def search(self, text, limit):
+        # every word must match
+        words = WORD.findall(normalize(text))
+        if not words:
+            return []
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, -bm25({self.table}, 10.0, 4.0, 2.0) AS rank, '
+                f"snippet({self.table}, -1, %s, %s, '…', 16) FROM {self.table} "
+                f'WHERE {self.table} MATCH %s ORDER BY rank DESC, rowid DESC LIMIT %s',
+                [MARK_START, MARK_STOP, ' '.join(self.match(word) for word in words), limit])
+            return [TextHit(*row) for row in cursor.fetchall()]
+
+
+ENGINES = {
+    'postgresql': PostgresEngine,
+    'sqlite': SQLiteEngine,
+}
+
+
+def get_engine(using=DEFAULT_DB_ALIAS):
+    """The full-text engine for a database, or None where there is none"""
+    engine = ENGINES.get(connections[using].vendor)
+    return engine(using) if engine else None
+
+
+def index_portions(portion_ids):
+    """(Re)index these portions, e.g. after their text or building changed"""
+    engine = get_engine()
+    if engine is not None:
+        engine.index(portion_ids)
+
+
+def remove_portions(portion_ids):
+    engine = get_engine()
+    if engine is not None:
+        engine.remove(portion_ids)
+
+
+def rebuild_text_index():
+    engine = get_engine()
+    if engine is None:
+        raise NotSupportedError(f'No full-text search engine for {connections[DEFAULT_DB_ALIAS].vendor}')
+    engine.rebuild()
+
+
+def search_portions(text, limit=TEXT_SEARCH_LIMIT):
+    """TextHits for a free-text query, best match first"""
+    engine = get_engine()
+    if engine is None:
+        raise NotSupportedError(f'No full-text search engine for {connections[DEFAULT_DB_ALIAS].vendor}')
+    return engine.search(text, limit) if text.strip() else []
+
+
+def create_text_index(using=DEFAULT_DB_ALIAS, **kwargs):
+    """post_migrate: create the index tables migrations do not manage"""
+    engine = get_engine(using)
+    if hasattr(engine, 'create'):
+        engine.create()
@@ -0,0 +1,186 @@
+import math
+
+from django.db.models import Avg, Q
+
+from property import models as property_models
+
+
+# near properties .................................................................
+# Buildings carry latitude / longitude, captured when they are entered or derived
+# offline: the average of the captured buildings on the same zone and street,
+# else the centroid of the zone from Zone_names. Each located building is filed
+# under a cell of a fixed grid (GRID_DEGREES, about 1.1 km) and geo_cell is
+# indexed, so nearest and radius searches read the cells around a point as
+# ranges of that index instead of scanning every building. Distances are
+# great-circle (haversine) kilometres, well within 0.5 % of the ellipsoidal ones
+# at this scale, so no geodesic library is needed on the request path.
+
+GRID_DEGREES = 0.01
+GRID_COLUMNS = 36001  # cells per grid row, 360 degrees of longitude and one spare
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+NEAREST_LIMIT = 50
+MAX_RADIUS_KM = 250  # nearest searches stop widening here, Qatar fits well inside
+LOCATION_FIELDS = {'latitude', 'longitude', 'location_source', 'geo_cell'}  # Property_data fields place() sets
+
+
+def grid_cell(latitude, longitude):
+    row = math.floor((latitude + 90) / GRID_DEGREES)
+    column = math.floor((longitude + 180) / GRID_DEGREES)
+    return row * GRID_COLUMNS + column
+
+
+def distance_km(latitude, longitude, other_latitude, other_longitude):
+    lat1, lng1, lat2, lng2 = map(math.radians, (latitude, longitude, other_latitude, other_longitude))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def cell_km(latitude):
+    """The shorter side of a grid cell at this latitude"""
+    return GRID_DEGREES * KM_PER_DEGREE * max(math.cos(math.radians(abs(latitude) + GRID_DEGREES)), 0.01)
+
+
+def cells_q(center, outer, inner=-1):
+    """
+    Buildings in the square of cells up to `outer` cells around `center`, leaving
+    out the square up to `inner` cells already read; one index range per row part
+    """
+    row, column = divmod(center, GRID_COLUMNS)
+    q = Q()
+    for other_row in range(row - outer, row + outer + 1):
+        first = other_row * GRID_COLUMNS + column - outer
+        last = other_row * GRID_COLUMNS + column + outer
+        if abs(other_row - row) <= inner:
+            q |= Q(property_data__geo_cell__range=(first, first + outer - inner - 1))
+            q |= Q(property_data__geo_cell__range=(last - outer + inner + 1, last))
+        else:
+            q |= Q(property_data__geo_cell__range=(first, last))
+    return q
+
+
+def located(latitude, longitude, rows):
+    """(distance, portion id) for (id, latitude, longitude) rows"""
+    return [(distance_km(latitude, longitude, lat, lng), portion_id) for portion_id, lat, lng in rows]
+
+
+def with_portions(found):
+    """[(distance_km, portion)] with the buildings joined, in the order found"""
+    portions = property_models.Portions.objects.select_related('property_data').with_zone_name().in_bulk(
+        [portion_id for _, portion_id in found])
+    return [(round(distance, 3), portions[portion_id]) for distance, portion_id in found if portion_id in portions]
+
+
+def nearest_portions(latitude, longitude, limit=NEAREST_LIMIT, statuses=('VACANT',)):
+    """
+    The `limit` portions with these statuses closest to a point, nearest first.
+    The searched square doubles until it holds `limit` portions no farther
+    than its edge, so one to a few queries read only the cells around the point.
+    """
+    portions = property_models.Portions.objects.with_status(*statuses).order_by().values_list(
+        'id', 'property_data__latitude', 'property_data__longitude')
+    center, span = grid_cell(latitude, longitude), cell_km(latitude)
+    found, inner, outer = [], -1, 0
+    while True:
+        found += located(latitude, longitude, portions.filter(cells_q(center, outer, inner)))
+        found.sort()
+        reach = outer * span  # everything closer than this lies in the square read so far
+        if len(found) >= limit and found[limit - 1][0] <= reach or reach >= MAX_RADIUS_KM:
+            return with_portions(found[:limit])
+        inner, outer = outer, max(1, outer * 2)
+
+
+def portions_within(latitude, longitude, radius_km, statuses=('VACANT',), limit=None):
+    """Portions with these statuses within radius_km of a point, nearest first"""
+    portions = property_models.Portions.objects.with_status(*statuses).order_by().values_list(
+        'id', 'property_data__latitude', 'property_data__longitude')
+    outer = math.ceil(min(radius_km, MAX_RADIUS_KM) / cell_km(latitude))
+    found = sorted(hit for hit in located(latitude, longitude, portions.filter(cells_q(grid_cell(latitude, longitude), outer)))
+                   if hit[0] <= radius_km)
+    return with_portions(found[:limit])
+
+
+def float_param(request, name):
+    try:
+        value = float(request.GET.get(name, ''))
+    except ValueError:
+        return None
+    return value if math.isfinite(value) else None
+
+
+def search_point(request):
+    """
+    ?property=<building id> or ?lat=&lng=, as (latitude, longitude, building);
+    None when neither gives a located point
+    """
+    building_id = request.GET.get('property', '')
+    if building_id:
+        building = (property_models.Property_data.objects.filter(id=building_id).first()
+                    if building_id.isdigit() else None)
+        if building is None or building.latitude is None or building.longitude is None:
+            return None
+        return building.latitude, building.longitude, building
+    latitude, longitude = float_param(request, 'lat'), float_param(request, 'lng')
+    if latitude is None or longitude is None or abs(latitude) > 90 or abs(longitude) > 180:
+        return None
+    return latitude, longitude, None
+
+
+def search_options(request):
+    """?status= (repeatable, default VACANT), ?k= up to NEAREST_LIMIT, ?radius_km= up to MAX_RADIUS_KM"""
+    known = {status for status, _ in property_models.PORTION_STATUS_CHOICES}
+    statuses = tuple(status for status in request.GET.getlist('status') if status in known) or ('VACANT',)
+    k = request.GET.get('k', '')
+    limit = min(int(k), NEAREST_LIMIT) if k.isdigit() and int(k) > 0 else NEAREST_LIMIT
+    radius_km = float_param(request, 'radius_km')
+    if radius_km is not None and not 0 < radius_km <= MAX_RADIUS_KM:
+        radius_km = None
+    return statuses, limit, radius_km
+
+
+# placing buildings
+
+def street_locations(buildings=None):
+    """{(zone_no, street_no): (latitude, longitude)} averaged over captured buildings"""
+    captured = property_models.Property_data.objects.filter(location_source='CAPTURED')
+    if buildings is not None:
+        captured = captured.filter(zone_no__in={zone_no for zone_no, _ in buildings},
+                                   street_no__in={street_no for _, street_no in buildings})
+    rows = (captured.order_by().values('zone_no', 'street_no')
+            .annotate(latitude=Avg('latitude'), longitude=Avg('longitude')))
+    return {(row['zone_no'], row['street_no']): (row['latitude'], row['longitude']) for row in rows}
+
+
+def zone_centroids(zones=None):
+    """{zone_no: (latitude, longitude)} from Zone_names"""
+    centroids = property_models.Zone_names.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    if zones is not None:
+        centroids = centroids.filter(zone_no__in=zones)
+    return {zone_no: (lat, lng) for zone_no, lat, lng in centroids.values_list('zone_no', 'latitude', 'longitude')}
+
+
+def place(building, streets, zones):
+    """Set a building's coordinates, source and grid cell; captured coordinates are kept"""
+    if building.location_source != 'CAPTURED' or building.latitude is None or building.longitude is None:
+        if (building.zone_no, building.street_no) in streets:
+            building.location_source = 'STREET'
+            building.latitude, building.longitude = streets[building.zone_no, building.street_no]
+        elif building.zone_no in zones:
+            building.location_source = 'ZONE'
+            building.latitude, building.longitude = zones[building.zone_no]
+        else:
+            building.location_source = ''
+            building.latitude = building.longitude = None
+    has_point = building.latitude is not None and building.longitude is not None
+    building.geo_cell = grid_cell(building.latitude, building.longitude) if has_point else None
+
+
+def locate(building):
+    """place() one building, as it is saved"""
+    if building.location_source == '' and building.latitude is not None and building.longitude is not None:
+        building.location_source = 'CAPTURED'  # entered outside PropertyForm, e.g. in the admin
+    if building.location_source == 'CAPTURED':
+        place(building, {}, {})
+    else:
+        key = [(building.zone_no, building.street_no)]
+        place(building, street_locations(key), zone_centroids([building.zone_no]))
@@ -0,0 +1,113 @@
+import os
+import posixpath
+import tempfile
+from io import BytesIO
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+
+# image renditions ...............................................................
+# Uploads are kept as-is; resized WebP/JPEG copies are written next to them under
+# renditions/ and served to listing and detail pages instead of the originals.
+
+PHOTO_RENDITIONS = {
+    'full': (1920, 1920),
+    'detail': (1024, 1024),
+    'card': (480, 360),
+}
+
+FORMATS = {
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+}
+
+EXISTS_CACHE_TIMEOUT = 60 * 60 * 24
+# renditions not written yet are remembered briefly too, so cards of fresh uploads do not
+# ask the storage (a round trip on S3) per photo per page; writing one drops its entry
+MISSING_CACHE_TIMEOUT = 60
+
+
+def rendition_name(name, rendition, fmt='jpeg'):
+    """Storage name of one rendition, e.g. property/7/B1/renditions/Building-x-card.webp"""
+    directory, filename = posixpath.split(name)
+    stem = os.path.splitext(filename)[0]
+    return posixpath.join(directory, 'renditions', f'{stem}-{rendition}.{FORMATS[fmt][1]}')
+
+
+def save_atomically(storage, name, content):
+    """Write a file so readers never see it half written"""
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        # remote storages publish an object only once the upload completes
+        if storage.exists(name):
+            storage.delete(name)
+        return storage.save(name, ContentFile(content))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return name
+
+
+def generate_renditions(field_file, renditions=PHOTO_RENDITIONS, formats=FORMATS, overwrite=False, crop=False):
+    """
+    Decode the image once and write every rendition, largest first so each
+    size is scaled down from the previous one. crop=True centre-crops to the
+    exact size (avatars) instead of fitting inside it. Returns {rendition: {fmt: name}}.
+    """
+    storage = field_file.storage
+    wanted = {
+        rendition: {fmt: rendition_name(field_file.name, rendition, fmt) for fmt in formats}
+        for rendition in renditions
+    }
+    if not overwrite and all(storage.exists(name) for names in wanted.values() for name in names.values()):
+        return wanted
+
+    largest = max(renditions.values())
+    with field_file.open('rb') as source:
+        image = Image.open(source)
+        image.draft('RGB', largest)  # JPEG: let the decoder downscale while reading
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        image.load()
+
+    for rendition, size in sorted(renditions.items(), key=lambda item: item[1], reverse=True):
+        if crop:
+            image = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+        else:
+            image = image.copy()
+            image.thumbnail(size, Image.Resampling.LANCZOS)
+        for fmt, name in wanted[rendition].items():
+            pil_format, _, params = formats[fmt]
+            buffer = BytesIO()
+            image.save(buffer, pil_format, **params)
+            save_atomically(storage, name, buffer.getvalue())
+            cache.delete(exists_cache_key(name))
+    return wanted
+
+
+def exists_cache_key(name):
+    return f'rendition-exists:{name}'
+
+
+def rendition_url(field_file, rendition, fmt='jpeg'):
+    """URL of a rendition if it has been generated, else the original upload"""
+    if not field_file:
+        return ''
+    name = rendition_name(field_file.name, rendition, fmt)
+    key = exists_cache_key(name)
+    exists = cache.get(key)
+    if exists is None:
+        exists = field_file.storage.exists(name)
+        cache.set(key, exists, EXISTS_CACHE_TIMEOUT if exists else MISSING_CACHE_TIMEOUT)
+    return field_file.storage.url(name) if exists else field_file.url
@@ -0,0 +1,70 @@
+import datetime
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from property import models as property_models
+
+
+# inventory counters ..............................................................
+# The realtor dashboard's counters: portions per status, the same per zone for
+# the statuses realtors work, and inquiries received today. Portion counts are
+# read from PortionFacet, which property.search keeps current on every write,
+# so one query over a few hundred rows answers them however many portions
+# exist. The result is cached under a version that every committed facet
+# change and every inquiry saved or deleted moves, and under today's date, so
+# dashboards read the cache until the inventory actually changes.
+
+VERSION_KEY = 'property:inventory-version'
+COUNTS_TIMEOUT = 60 * 60 * 24  # entries of older versions and days simply expire
+ZONE_STATUSES = ('VACANT', 'VACANT_SOON', 'BOOKED')
+
+
+def inventory_version():
+    return cache.get_or_set(VERSION_KEY, 1, None)
+
+
+def bump_inventory_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, None)
+
+
+def count_inventory(today):
+    """
+    {'status': {status: portions}, 'total': portions,
+     'zones': [{'zone_no', 'VACANT', 'VACANT_SOON', 'BOOKED'}, ...] most vacant first,
+     'inquiries_today': inquiries created today}
+    """
+    rows = property_models.PortionFacet.objects.filter(
+        Q(given='', facet='status') | Q(given__in=[f'status={status}' for status in ZONE_STATUSES], facet='zone_no'),
+        count__gt=0,  # rows counted down to zero wait for the sweep
+    ).values_list('given', 'value', 'count')
+    status, zones = {}, {}
+    for given, value, count in rows:
+        if not given:
+            status[value] = count
+        else:
+            zone = zones.setdefault(int(value), dict.fromkeys(ZONE_STATUSES, 0))
+            zone[given.split('=', 1)[1]] = count
+    start = timezone.make_aware(datetime.datetime.combine(today, datetime.time.min))
+    return {
+        'status': status,
+        'total': sum(status.values()),
+        'zones': sorted(({'zone_no': zone_no, **counts} for zone_no, counts in zones.items()),
+                        key=lambda zone: (-zone['VACANT'], -zone['VACANT_SOON'], zone['zone_no'])),
+        'inquiries_today': property_models.Inquire.objects.filter(date_created__gte=start).count(),
+    }
+
+
+def inventory_counts():
+    """count_inventory for today, from the cache unless the inventory changed since"""
+    today = timezone.localdate()
+    key = f'property:inventory:{inventory_version()}:{today.isoformat()}'
+    counts = cache.get(key)
+    if counts is None:
+        counts = count_inventory(today)
+        cache.set(key, counts, COUNTS_TIMEOUT)
+    return counts
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from property import models as property_models
+from property.search import rebuild_portion_facets
+from property.vacancy import rebuild_vacancy_calendar
+
+
+class Command(BaseCommand):
+    help = 'Backfill Portions.current_status / current_vacant_date from the latest Portions_status row'
+
+    def handle(self, *args, **options):
+        latest = property_models.Portions_status.objects.filter(
+            portions=OuterRef('pk')).order_by('-id')
+        # single UPDATE ... SET = (subquery); .update() leaves date_updated alone
+        updated = property_models.Portions.objects.update(
+            current_status=Coalesce(Subquery(latest.values('status')[:1]), Value('')),
+            current_vacant_date=Subquery(latest.values('vacant_date')[:1]),
+        )
+        buckets = rebuild_vacancy_calendar()
+        facets = rebuild_portion_facets()
+        self.stdout.write(self.style.SUCCESS(
+            f'Backfilled current status on {updated} portions, {buckets} vacancy calendar buckets, '
+            f'{facets} facet counts'))
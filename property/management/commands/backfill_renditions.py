@@ -0,0 +1,28 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from property.tasks import PHOTO_FIELDS, enqueue, render_photos
+
+
+class Command(BaseCommand):
+    help = 'Generate card/detail/full renditions for photos uploaded before the image pipeline existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--async', action='store_true', dest='use_queue',
+                            help='Queue one task per row instead of rendering here')
+        parser.add_argument('--overwrite', action='store_true',
+                            help='Regenerate renditions that already exist')
+
+    def handle(self, *args, **options):
+        for model_label in PHOTO_FIELDS:
+            model = apps.get_model(model_label)
+            done = 0
+            for pk in model._default_manager.order_by('pk').values_list('pk', flat=True).iterator():
+                if options['use_queue']:
+                    enqueue(render_photos, model_label, pk, options['overwrite'])
+                else:
+                    render_photos(model_label, pk, options['overwrite'])
+                done += 1
+                if done % 500 == 0:
+                    self.stdout.write(f'{model_label}: {done}')
+            self.stdout.write(self.style.SUCCESS(f'{model_label}: {done} rows processed'))
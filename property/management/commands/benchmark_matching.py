@@ -0,0 +1,123 @@
+import datetime
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from property import matching
+from property import models as property_models
+
+
+class Command(BaseCommand):
+    help = ('Time the inquiry matching engine: full build, live ranking, stored reads and incremental '
+            're-matching on status changes, optionally seeding a synthetic dataset first')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--portions', type=int, default=0,
+                            help='Number of synthetic portions to create first (e.g. 100000)')
+        parser.add_argument('--inquiries', type=int, default=0,
+                            help='Number of synthetic inquiries to create first (e.g. 10000)')
+        parser.add_argument('--samples', type=int, default=200)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['portions'] or options['inquiries']:
+            self.seed(options['portions'], options['inquiries'], options['batch_size'])
+
+        inquiry_ids = list(property_models.Inquire.objects.values_list('id', flat=True))
+        portion_ids = list(property_models.Portions.objects.values_list('id', flat=True))
+        if not inquiry_ids or not portion_ids:
+            self.stdout.write(self.style.WARNING('Nothing to match; pass --portions and --inquiries to seed'))
+            return
+        self.stdout.write(f'{len(portion_ids)} portions x {len(inquiry_ids)} inquiries')
+
+        started = time.perf_counter()
+        for start in range(0, len(inquiry_ids), 500):
+            matching.rematch_inquiries(inquiry_ids[start:start + 500])
+        self.report_total('full build', time.perf_counter() - started,
+                          property_models.InquiryMatch.objects.count())
+
+        zone_names = matching.zones_by_name()
+        sample = random.sample(inquiry_ids, min(options['samples'], len(inquiry_ids)))
+        inquiries = property_models.Inquire.objects.in_bulk(sample)
+        self.report('live ranking per inquiry', [
+            self.timed(matching.rank_matches, inquiries[inquiry_id], zone_names) for inquiry_id in sample])
+        self.report('stored matches per inquiry', [
+            self.timed(lambda inquiry_id: list(property_models.InquiryMatch.objects.filter(
+                inquire_id=inquiry_id).select_related('portion')), inquiry_id) for inquiry_id in sample])
+
+        statuses = dict(property_models.PORTION_STATUS_CHOICES)
+        changed = random.sample(portion_ids, min(options['samples'], len(portion_ids)))
+        timings = []
+        for portion_id in changed:
+            status = random.choice(list(statuses))
+            property_models.Portions.objects.filter(id=portion_id).update(current_status=status)
+            timings.append(self.timed(matching.rematch_portions, [portion_id]))
+        self.report('incremental re-match per status change', timings)
+
+    def timed(self, func, *args):
+        started = time.perf_counter()
+        func(*args)
+        return time.perf_counter() - started
+
+    def report_total(self, label, seconds, rows):
+        self.stdout.write(f'{label}: {seconds:.1f} s, {rows} matches stored')
+
+    def report(self, label, timings):
+        timings = sorted(timings)
+        p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+        self.stdout.write(f'{label}: p50 {statistics.median(timings) * 1000:.1f} ms, '
+                          f'p95 {p95 * 1000:.1f} ms, max {timings[-1] * 1000:.1f} ms')
+
+    def seed(self, portions, inquiries, batch_size):
+        user, _ = get_user_model().objects.get_or_create(username='matching_seed')
+        portion_types = [choice for choice, _ in property_models.Inquire.PORTIONS_CHOICES]
+        furnished_types = [choice for choice, _ in property_models.Portions.CHOICES]
+        statuses = [choice for choice, _ in property_models.PORTION_STATUS_CHOICES]
+        today = datetime.date.today()
+
+        created = 0
+        while created < portions:
+            size = min(batch_size, portions - created)
+            buildings = property_models.Property_data.objects.bulk_create([
+                property_models.Property_data(
+                    user=user, title=f'Seed {created + i}', client_code=f'M{created + i}',
+                    property_code=f'M{created + i}', landmark='Seed', zone_no=random.randint(1, 98))
+                for i in range(0, size, 100)
+            ])
+            property_models.Portions.objects.bulk_create([
+                property_models.Portions(
+                    property_data=buildings[i // 100], user=user, unit_no=i % 100,
+                    price=random.randrange(1500, 25000, 50), portion_type=random.choice(portion_types),
+                    furnished_type=random.choice(furnished_types), current_status=random.choice(statuses),
+                    current_vacant_date=today + datetime.timedelta(days=random.randint(0, 120)))
+                for i in range(size)
+            ], batch_size=batch_size)
+            created += size
+            self.stdout.write(f'seeded {created}/{portions} portions')
+
+        now = timezone.now()
+        created = 0
+        while created < inquiries:
+            size = min(batch_size, inquiries - created)
+            rows = []
+            for i in range(size):
+                price_from = random.randrange(1500, 20000, 500)
+                rows.append(property_models.Inquire(
+                    name=f'Seed {created + i}', locations=', '.join(
+                        str(random.randint(1, 98)) for _ in range(random.randint(0, 3))),
+                    date_from=now + datetime.timedelta(days=random.randint(0, 90)), duration=12,
+                    price_from=price_from, price_to=price_from + random.randrange(500, 5000, 500),
+                    furnished_type=random.choice(['Any'] + furnished_types),
+                    property_type=random.choice([''] + portion_types), notes='seed'))
+            property_models.Inquire.objects.bulk_create(rows, batch_size=batch_size)
+            created += size
+            self.stdout.write(f'seeded {created}/{inquiries} inquiries')
+
+        if connection.vendor in ('postgresql', 'sqlite'):
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
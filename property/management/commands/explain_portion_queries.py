@@ -0,0 +1,116 @@
+import datetime
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from property import models as property_models
+
+
+class RollbackIndexes(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Print query plans for the property listing filters with and without the Meta.indexes, '
+            'optionally seeding a synthetic dataset first')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Number of synthetic portions to create before explaining (e.g. 1000000)')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--portions-per-building', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.seed(options['seed'], options['batch_size'], options['portions_per_building'])
+
+        self.stdout.write(self.style.MIGRATE_HEADING('With indexes'))
+        self.explain_all()
+
+        if not connection.features.can_rollback_ddl:
+            self.stdout.write(self.style.WARNING('Database cannot roll back DDL; skipping the plans without indexes'))
+            return
+
+        # drop every Meta index inside the schema editor's transaction, explain, then roll the DDL back
+        self.stdout.write(self.style.MIGRATE_HEADING('Without indexes'))
+        try:
+            with connection.schema_editor(atomic=True) as schema_editor:
+                for model in self.indexed_models():
+                    for index in model._meta.indexes:
+                        schema_editor.remove_index(model, index)
+                self.explain_all()
+                raise RollbackIndexes
+        except RollbackIndexes:
+            pass
+
+    def indexed_models(self):
+        return [property_models.Property_data, property_models.Portions,
+                property_models.Portions_status, property_models.Zone_names, property_models.Inquire]
+
+    def queries(self):
+        portion = property_models.Portions.objects.order_by('id').first()
+        user_id = portion.user_id if portion else 0
+        property_id = portion.property_data_id if portion else 0
+        today = datetime.date.today()
+        return {
+            'portions of a building': property_models.Portions.objects.filter(
+                user_id=user_id, property_data_id=property_id),
+            'owner portions by status': property_models.Portions.objects.filter(
+                user_id=user_id, current_status='VACANT'),
+            'vacant soon window': property_models.Portions.objects.filter(
+                current_status='VACANT_SOON',
+                current_vacant_date__range=(today, today + datetime.timedelta(days=30))),
+            'portion listing page': property_models.Portions.objects.order_by('-date_created', '-id')[:25],
+            'status rows of a portion': property_models.Portions_status.objects.filter(
+                portions_id=portion.id if portion else 0, status='VACANT'),
+            'status by vacant date': property_models.Portions_status.objects.filter(
+                status='VACANT_SOON', vacant_date__gte=today),
+            'zone lookup': property_models.Zone_names.objects.filter(zone_no=38),
+            'inquiry match': property_models.Inquire.objects.filter(
+                property_type='2BHK', price_from__lte=6000, price_to__gte=6000),
+            'inquiry listing page': property_models.Inquire.objects.order_by('-date_created', '-id')[:25],
+        }
+
+    def explain_all(self):
+        for label, queryset in self.queries().items():
+            self.stdout.write(self.style.SQL_KEYWORD(f'-- {label}'))
+            self.stdout.write(queryset.explain())
+            self.stdout.write('')
+
+    def seed(self, total, batch_size, per_building):
+        user, _ = get_user_model().objects.get_or_create(username='explain_seed')
+        portion_types = [choice for choice, _ in property_models.Portions.PORTION_CHOICES]
+        statuses = [choice for choice, _ in property_models.PORTION_STATUS_CHOICES]
+        today = datetime.date.today()
+
+        created = 0
+        while created < total:
+            size = min(batch_size, total - created)
+            buildings = property_models.Property_data.objects.bulk_create([
+                property_models.Property_data(
+                    user=user, title=f'Seed {created + i}', client_code=f'S{created + i}',
+                    property_code=f'S{created + i}', landmark='Seed', zone_no=random.randint(1, 98))
+                for i in range(0, size, per_building)
+            ])
+            portions = []
+            for i in range(size):
+                status = random.choice(statuses)
+                portions.append(property_models.Portions(
+                    property_data=buildings[i // per_building], user=user, unit_no=i % per_building,
+                    price=random.randint(1500, 25000), portion_type=random.choice(portion_types),
+                    current_status=status,
+                    current_vacant_date=today + datetime.timedelta(days=random.randint(0, 120))))
+            portions = property_models.Portions.objects.bulk_create(portions, batch_size=batch_size)
+            property_models.Portions_status.objects.bulk_create([
+                property_models.Portions_status(
+                    portions=portion, status=portion.current_status, vacant_date=portion.current_vacant_date)
+                for portion in portions
+            ], batch_size=batch_size)
+            created += size
+            self.stdout.write(f'seeded {created}/{total} portions')
+
+        if connection.vendor in ('postgresql', 'sqlite'):
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
@@ -0,0 +1,71 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from property import models as property_models
+from property import zones
+from property.geo import LOCATION_FIELDS, place, street_locations, zone_centroids
+from webpages import api_docs
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = ('Place buildings without captured coordinates at their street or zone, from the local '
+            'Zone_names centroids; no geocoding service is called')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--centroids', metavar='CSV',
+                            help='Load zone centroids first: zone_no,latitude,longitude[,zone_name] per row')
+        parser.add_argument('--all', action='store_true', dest='replace',
+                            help='Place again buildings already placed at a street or zone')
+
+    def handle(self, *args, **options):
+        if options['centroids']:
+            loaded = self.load_centroids(options['centroids'])
+            self.stdout.write(f'Loaded {loaded} zone centroids')
+
+        streets, zones = street_locations(), zone_centroids()
+        buildings = property_models.Property_data.objects.order_by('id')
+        if not options['replace']:
+            buildings = buildings.filter(latitude__isnull=True)
+        buildings = buildings.only('id', 'zone_no', 'street_no', *LOCATION_FIELDS)
+        fields = sorted(LOCATION_FIELDS)
+        placed = unplaced = last_id = 0
+        # pages by id rather than one cursor, since each page is written back before the next is read
+        while batch := list(buildings.filter(id__gt=last_id)[:BATCH_SIZE]):
+            for building in batch:
+                place(building, streets, zones)
+                if building.geo_cell is None:
+                    unplaced += 1
+                else:
+                    placed += 1
+            property_models.Property_data.objects.bulk_update(batch, fields)
+            last_id = batch[-1].id
+        self.stdout.write(self.style.SUCCESS(f'Placed {placed} buildings, {unplaced} have no street or zone location'))
+
+    def load_centroids(self, path):
+        try:
+            with open(path, newline='', encoding='utf-8-sig') as upload:
+                rows = [row for row in csv.reader(upload) if row and row[0].strip().isdigit()]  # skips a header
+        except OSError as error:
+            raise CommandError(f'Cannot read {path}: {error}')
+        with transaction.atomic():
+            for row in rows:
+                try:
+                    zone_no, latitude, longitude = int(row[0]), float(row[1]), float(row[2])
+                except (IndexError, ValueError):
+                    raise CommandError(f'Bad centroid row: {",".join(row)}')
+                defaults = {'latitude': latitude, 'longitude': longitude}
+                if len(row) > 3 and row[3].strip():
+                    defaults['zone_name'] = row[3].strip()
+                updated = property_models.Zone_names.objects.filter(zone_no=zone_no).update(**defaults)
+                if not updated:
+                    property_models.Zone_names.objects.create(
+                        zone_no=zone_no, zone_name=defaults.get('zone_name', f'Zone {zone_no}'),
+                        latitude=latitude, longitude=longitude)
+        # update() above skips the Zone_names receivers, which move both versions
+        zones.bump_version()
+        api_docs.bump_version()
+        return len(rows)
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from property.search import rebuild_portion_facets, sweep_empty_facets
+
+
+class Command(BaseCommand):
+    help = 'Recreate the PortionFacet and PortionFacetCell search counts from Portions with one aggregate query'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sweep', action='store_true',
+                            help='Only drop the rows counted down to zero, e.g. nightly')
+
+    def handle(self, *args, **options):
+        if options['sweep']:
+            rows = sweep_empty_facets()
+            self.stdout.write(self.style.SUCCESS(f'Dropped {rows} empty portion facet counts'))
+            return
+        rows = rebuild_portion_facets()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} portion facet counts'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from property.fulltext import create_text_index, rebuild_text_index
+
+
+class Command(BaseCommand):
+    help = 'Reindex the full-text search documents of every portion'
+
+    def handle(self, *args, **options):
+        create_text_index()
+        rebuild_text_index()
+        self.stdout.write(self.style.SUCCESS('Rebuilt the portion text index'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from property import models as property_models
+
+
+class Command(BaseCommand):
+    help = 'Repair Property_data.portion_count drift with one aggregate UPDATE'
+
+    def add_arguments(self, parser):
+        parser.add_argument('property_ids', nargs='*', type=int,
+                            help='Limit the recount to these buildings (default: all)')
+
+    def handle(self, *args, **options):
+        updated = property_models.recount_portion_counts(options['property_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f'Recounted portions on {updated} buildings'))
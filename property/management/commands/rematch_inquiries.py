@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from property import matching
+from property import models as property_models
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored InquiryMatch rows for every inquiry'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        ids = list(property_models.Inquire.objects.order_by('id').values_list('id', flat=True))
+        for start in range(0, len(ids), options['chunk_size']):
+            matching.rematch_inquiries(ids[start:start + options['chunk_size']])
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(ids)} inquiries, {property_models.InquiryMatch.objects.count()} matches'))
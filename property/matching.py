@@ -0,0 +1,206 @@
+import datetime
+import heapq
+import re
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from property import models as property_models
+
+
+# inquiry / vacancy matching .......................................................
+# Vacant and vacant-soon portions are looked up through portion_match_idx
+# (status, type, furnishing, price) and the best
+# MATCHES_PER_INQUIRY per inquiry are stored in InquiryMatch, so listing an
+# inquiry's matches is a single indexed read. Status, price and type changes
+# re-rank only the inquiries the changed portions can reach.
+
+MATCHABLE_STATUSES = ('VACANT', 'VACANT_SOON')
+MATCHES_PER_INQUIRY = 20
+PRICE_TOLERANCE = 0.10  # portions up to 10% outside the budget still match, with a lower score
+AVAILABILITY_WINDOW_DAYS = 60  # vacant-soon portions free this long after date_from score zero
+PRICE_WEIGHT = 60
+AVAILABILITY_WEIGHT = 40
+
+PORTION_SCORE_FIELDS = ('id', 'price', 'current_status', 'current_vacant_date')
+PORTION_MATCH_FIELDS = PORTION_SCORE_FIELDS + ('portion_type', 'furnished_type', 'property_data__zone_no')
+INQUIRE_MATCH_FIELDS = ('id', 'locations', 'date_from', 'price_from', 'price_to', 'furnished_type',
+                        'property_type')
+
+ZONE_TOKEN = re.compile(r'(?:zone\s*)?(\d+)')
+
+
+def zones_by_name():
+    return {
+        zone_name.strip().lower(): zone_no
+        for zone_name, zone_no in property_models.Zone_names.objects.values_list('zone_name', 'zone_no')
+    }
+
+
+def zone_numbers(locations, zone_names):
+    """Zone numbers named in an inquiry's free-text locations, e.g. '38, Al Sadd / zone 55'"""
+    zones = set()
+    for token in re.split(r'[,/;|\n]+', locations or ''):
+        token = token.strip().lower()
+        number = ZONE_TOKEN.fullmatch(token)
+        if number:
+            zones.add(int(number.group(1)))
+        elif token in zone_names:
+            zones.add(zone_names[token])
+    return zones
+
+
+def price_window(inquiry):
+    low, high = sorted((inquiry.price_from, inquiry.price_to))
+    return low * (1 - PRICE_TOLERANCE), high * (1 + PRICE_TOLERANCE)
+
+
+def wanted_from(inquiry):
+    if isinstance(inquiry.date_from, datetime.datetime):
+        if timezone.is_aware(inquiry.date_from):
+            return timezone.localtime(inquiry.date_from).date()
+        return inquiry.date_from.date()
+    return inquiry.date_from
+
+
+def accepts(inquiry, zones, portion):
+    """Hard filters: status, type, furnishing, price window and (if any were named) zone"""
+    low, high = price_window(inquiry)
+    return (
+        portion['current_status'] in MATCHABLE_STATUSES
+        and (not inquiry.property_type or inquiry.property_type == portion['portion_type'])
+        and (inquiry.furnished_type == 'Any' or inquiry.furnished_type == portion['furnished_type'])
+        and low <= portion['price'] <= high
+        and (not zones or portion['property_data__zone_no'] in zones)
+    )
+
+
+def scorer(inquiry):
+    """
+    Score function for one inquiry, 0-100: price inside the budget, then how
+    soon the portion is free after date_from.
+    """
+    low, high = sorted((inquiry.price_from, inquiry.price_to))
+    wanted = wanted_from(inquiry)
+
+    def score(portion):
+        price = portion['price']
+        if low <= price <= high:
+            price_score = PRICE_WEIGHT
+        else:
+            edge = low if price < low else high
+            slack = edge * PRICE_TOLERANCE or 1
+            price_score = PRICE_WEIGHT * max(0.0, 1 - abs(price - edge) / slack)
+
+        available = portion['current_vacant_date']
+        late = (available - wanted).days if available else 0
+        if portion['current_status'] == 'VACANT' or late <= 0:
+            availability_score = AVAILABILITY_WEIGHT
+        else:
+            availability_score = AVAILABILITY_WEIGHT * max(0.0, 1 - late / AVAILABILITY_WINDOW_DAYS)
+        return round(price_score + availability_score, 2)
+
+    return score
+
+
+def rank_key(scored):
+    score_value, portion_id = scored
+    return -score_value, portion_id
+
+
+def candidate_portions(inquiry, zones):
+    low, high = price_window(inquiry)
+    portions = property_models.Portions.objects.filter(
+        current_status__in=MATCHABLE_STATUSES, price__gte=low, price__lte=high)
+    if inquiry.property_type:
+        portions = portions.filter(portion_type=inquiry.property_type)
+    if inquiry.furnished_type != 'Any':
+        portions = portions.filter(furnished_type=inquiry.furnished_type)
+    if zones:
+        # a subquery rather than a join keeps the planner on portion_match_idx
+        portions = portions.filter(property_data_id__in=property_models.Property_data.objects.filter(
+            zone_no__in=zones).values('id'))
+    return portions.order_by().values(*PORTION_SCORE_FIELDS)
+
+
+def candidate_inquiries(portion):
+    """Inquiries whose type, furnishing and price window can take this portion"""
+    price = portion['price']
+    return property_models.Inquire.objects.filter(
+        Q(property_type=portion['portion_type']) | Q(property_type=''),
+        Q(furnished_type=portion['furnished_type']) | Q(furnished_type='Any'),
+        price_from__lte=price / (1 - PRICE_TOLERANCE),
+        price_to__gte=price / (1 + PRICE_TOLERANCE),
+    ).order_by().only(*INQUIRE_MATCH_FIELDS)
+
+
+def rank_matches(inquiry, zone_names=None, limit=MATCHES_PER_INQUIRY):
+    """Best (score, portion_id) pairs for one inquiry, computed live"""
+    if zone_names is None:
+        zone_names = zones_by_name()
+    zones = zone_numbers(inquiry.locations, zone_names)
+    score = scorer(inquiry)
+    scored = ((score(portion), portion['id']) for portion in candidate_portions(inquiry, zones))
+    return heapq.nsmallest(limit, scored, key=rank_key)
+
+
+def rematch_inquiries(inquiry_ids):
+    """Rebuild the stored matches of the given inquiries from scratch"""
+    inquiry_ids = list(inquiry_ids)
+    zone_names = zones_by_name()
+    rows = []
+    for inquiry in property_models.Inquire.objects.filter(id__in=inquiry_ids).only(*INQUIRE_MATCH_FIELDS):
+        rows.extend(
+            property_models.InquiryMatch(inquire_id=inquiry.id, portion_id=portion_id, score=score_value)
+            for score_value, portion_id in rank_matches(inquiry, zone_names))
+    with transaction.atomic():
+        property_models.InquiryMatch.objects.filter(inquire_id__in=inquiry_ids).delete()
+        property_models.InquiryMatch.objects.bulk_create(rows, batch_size=1000)
+
+
+def rematch_portions(portion_ids):
+    """
+    Re-rank after portions changed status, price, type or furnishing. Each
+    portion is scored only against the inquiries it can reach and merged into
+    their stored top list; inquiries that lost one of these portions are
+    rebuilt so the freed slot is refilled.
+    """
+    portion_ids = list(portion_ids)
+    zone_names = zones_by_name()
+    portions = property_models.Portions.objects.filter(
+        id__in=portion_ids, current_status__in=MATCHABLE_STATUSES).values(*PORTION_MATCH_FIELDS)
+
+    with transaction.atomic():
+        stored = property_models.InquiryMatch.objects.filter(portion_id__in=portion_ids)
+        rebuild = set(stored.values_list('inquire_id', flat=True))
+        stored.delete()
+
+        scored = defaultdict(list)
+        for portion in portions:
+            for inquiry in candidate_inquiries(portion):
+                if inquiry.id in rebuild:
+                    continue
+                if accepts(inquiry, zone_numbers(inquiry.locations, zone_names), portion):
+                    scored[inquiry.id].append((scorer(inquiry)(portion), portion['id']))
+
+        current = defaultdict(dict)
+        for match_id, inquiry_id, portion_id, score_value in property_models.InquiryMatch.objects.filter(
+                inquire_id__in=list(scored)).values_list('id', 'inquire_id', 'portion_id', 'score'):
+            current[inquiry_id][(score_value, portion_id)] = match_id
+
+        added, displaced = [], []
+        for inquiry_id, new in scored.items():
+            ranked = sorted(new + list(current[inquiry_id]), key=rank_key)
+            for score_value, portion_id in ranked[:MATCHES_PER_INQUIRY]:
+                if (score_value, portion_id) not in current[inquiry_id]:
+                    added.append(property_models.InquiryMatch(
+                        inquire_id=inquiry_id, portion_id=portion_id, score=score_value))
+            displaced.extend(
+                current[inquiry_id][key] for key in ranked[MATCHES_PER_INQUIRY:] if key in current[inquiry_id])
+
+        property_models.InquiryMatch.objects.filter(id__in=displaced).delete()
+        property_models.InquiryMatch.objects.bulk_create(added, batch_size=1000)
+        if rebuild:
+            rematch_inquiries(rebuild)
@@ -1,29 +1,43 @@
+from collections import Counter
+from contextvars import ContextVar
+
 from django.conf import settings
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils.text import slugify
 # Create your models here.
 
 
 def portion_image_location(instance, filename):
-    print('portion_image_location')
-    print(instance.property_data.user.id,)
-    print(instance.property_data.client_code)
-    print(instance.unit_no)
-    print(filename)
-    return 'property/{0}/{1}/{2}/portion-{3}'.format(instance.property_data.user.id, instance.property_data.client_code, instance.unit_no, filename)
+    return 'property/{0}/{1}/{2}/portion-{3}'.format(instance.property_data.user_id, instance.property_data.client_code, instance.unit_no, filename)
 
 
 def property_image_location(instance, filename):
-    print('property_image_location')
-    print(instance.user.id)
-    print(instance.client_code)
-    print(filename)
-    url = 'property/{0}/{1}/Building-{2}'.format(instance.user.id,
+    url = 'property/{0}/{1}/Building-{2}'.format(instance.user_id,
                                                  instance.client_code, filename)
-    print(url)
     return url
 
 
+PORTION_STATUS_CHOICES = (
+    ('OCCUPIED', 'Occupied'),
+    ('VACANT', 'Vacant'),
+    ('BOOKED', 'Booked'),
+    ('VACANT_SOON', 'Vacant soon'),
+    ('CLOSED', 'Closed'),
+    ('NOT_SET', 'Not Set'),
+)
+
+LOCATION_SOURCE_CHOICES = (
+    ('', 'Unknown'),
+    ('CAPTURED', 'Captured'),
+    ('STREET', 'Street average'),
+    ('ZONE', 'Zone centroid'),
+)
+
+
 class Property_data(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
                              on_delete=models.CASCADE, related_name='property_data')
@@ -41,10 +55,126 @@ class Property_data(models.Model):
     photo_main = models.ImageField(upload_to=property_image_location, default='property/property_default.png',
                                    help_text='Upload a Featured outside photo', blank=True)
     portion_count = models.IntegerField(default=0) 
+    # entered with the building, or derived by property.geo from its zone and street
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    location_source = models.CharField(max_length=10, choices=LOCATION_SOURCE_CHOICES, blank=True, default='')
+    geo_cell = models.BigIntegerField(null=True, blank=True)  # grid cell of property.geo
 
     def __str__(self):
         return f'{self.zone_no}, {self.property_no}'
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-date_created'], name='property_user_created_idx'),
+            models.Index(fields=['-date_created', '-id'], name='property_created_idx'),
+            models.Index(fields=['zone_no'], name='property_zone_idx'),
+            models.Index(fields=['geo_cell'], name='property_geo_cell_idx'),
+        ]
+
+
+# set while the caller maintains portion_count, the vacancy calendar, the search facets and
+# the text index itself (bulk deletes, bulk imports), so the receivers in property.signals
+# and bulk_create stand aside
+portion_count_suspended = ContextVar('portion_count_suspended', default=False)
+
+
+def adjust_portion_counts(deltas):
+    """Apply {property_id: delta} with atomic F() updates that touch only portion_count"""
+    for property_id, delta in deltas.items():
+        if delta:
+            Property_data.objects.filter(id=property_id).update(portion_count=F('portion_count') + delta)
+
+
+def recount_portion_counts(property_ids=None):
+    """Reset portion_count from the Portions table in one aggregate UPDATE"""
+    total = (Portions.objects.filter(property_data=OuterRef('pk')).order_by()
+             .values('property_data').annotate(total=Count('id')).values('total'))
+    buildings = Property_data.objects.all()
+    if property_ids is not None:
+        buildings = buildings.filter(id__in=property_ids)
+    return buildings.update(portion_count=Coalesce(Subquery(total), 0))
+
+
+class PortionQuerySet(models.QuerySet):
+    """Composable querysets for portion listings and cards"""
+
+    def for_listing(self):
+        """Join everything a portion card renders so the page costs a fixed number of queries"""
+        return self.select_related(
+            'property_data', 'user', 'user__profile', 'user__profile_picture')
+
+    def for_owner(self, user):
+        return self.filter(user=user)
+
+    def with_status(self, *statuses):
+        """Filter on the current status snapshot; '' selects portions with no status yet"""
+        return self.filter(current_status__in=statuses)
+
+    def with_zone_name(self):
+        """zone_name of the building's zone, to sort, filter or serialize by; one lookup per row"""
+        return self.annotate(zone_name=zone_name_of('property_data__zone_no'))
+
+    # bulk writes skip post_save and adjust Property_data.portion_count once per building
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from property.fulltext import index_portions
+        from property.search import count_new_facets, rebuild_portion_facets
+        from property.vacancy import rebuild_vacancy_calendar
+        from webpages.sitemaps import invalidate_portion_sitemap
+
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            invalidate_portion_sitemap(obj.id for obj in objs)
+            if portion_count_suspended.get():
+                return objs
+            if kwargs.get('ignore_conflicts') or kwargs.get('update_conflicts'):
+                # inserted rows are unknown, count the touched buildings from scratch
+                buildings = {obj.property_data_id for obj in objs}
+                recount_portion_counts(buildings)
+                rebuild_portion_facets()
+                index_portions(self.filter(property_data_id__in=buildings).values_list('id', flat=True))
+            else:
+                adjust_portion_counts(Counter(obj.property_data_id for obj in objs))
+                count_new_facets(objs).apply()
+                index_portions(obj.id for obj in objs)
+            calendar_owners = {obj.user_id for obj in objs if obj.current_status}
+            if calendar_owners:
+                rebuild_vacancy_calendar(calendar_owners)
+        return objs
+
+    def delete(self):
+        from property.fulltext import remove_portions
+        from property.search import count_facets
+        from property.vacancy import CALENDAR_STATUSES, vacancy_key, apply_vacancy_deltas
+
+        with transaction.atomic(using=self.db):
+            deleted = {
+                row['property_data_id']: -row['total']
+                for row in self.order_by().values('property_data_id').annotate(total=Count('id'))
+            }
+            calendar = Counter()
+            for row in (self.filter(current_status__in=CALENDAR_STATUSES).order_by()
+                        .values('user_id', 'property_data__zone_no', 'portion_type', 'current_status',
+                                'current_vacant_date').annotate(total=Count('id'))):
+                calendar[vacancy_key(row['user_id'], row['property_data__zone_no'], row['portion_type'],
+                                     row['current_status'], row['current_vacant_date'])] -= row['total']
+            facets = count_facets(self, sign=-1)
+            portion_ids = list(self.values_list('id', flat=True))
+            token = portion_count_suspended.set(True)
+            try:
+                result = super().delete()
+            finally:
+                portion_count_suspended.reset(token)
+            adjust_portion_counts(deleted)
+            apply_vacancy_deltas(calendar)
+            facets.apply()
+            remove_portions(portion_ids)
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
 
 class Portions(models.Model):
     CHOICES = (
@@ -100,9 +230,16 @@ class Portions(models.Model):
 
     # slug = AutoSlugField(populate_from='title')
 
+    # snapshot of the latest Portions_status row, kept in sync by property.signals
+    current_status = models.CharField(
+        max_length=100, choices=PORTION_STATUS_CHOICES, blank=True, default='')
+    current_vacant_date = models.DateField(null=True, blank=True)
+
     date_created = models.DateTimeField(auto_now_add=True)
     date_updated = models.DateTimeField(auto_now=True)
 
+    objects = PortionQuerySet.as_manager()
+
     def __str__(self):
         return f'Unit No: {self.unit_no}, Code: {self.portion_code}'
 
@@ -110,30 +247,29 @@ class Portions(models.Model):
         """Return the URL for this portion's detail page"""
         from django.urls import reverse
         return reverse('property:portion_single_details', kwargs={
-            'pk': self.user.id,
-            'property_id': self.property_data.id,
+            'pk': self.user_id,
+            'property_id': self.property_data_id,
             'portion_id': self.id
         })
 
-    meta = {
-        'indexes': ['-date_created', '-date_updated'],
-        'ordering': ['-date_created', '-date_updated']
-    }
-
     class Meta:
         verbose_name = "Portion"
         verbose_name_plural = "Portions"
+        ordering = ['-date_created', '-id']
+        indexes = [
+            models.Index(fields=['user', 'property_data'], name='portion_user_property_idx'),
+            models.Index(fields=['user', 'current_status'], name='portion_user_status_idx'),
+            models.Index(fields=['current_status', 'current_vacant_date'], name='portion_status_vacant_idx'),
+            models.Index(fields=['-date_created', '-id'], name='portion_created_idx'),
+            models.Index(fields=['current_status', '-date_created', '-id'], name='portion_status_created_idx'),
+            # candidate lookup for property.matching
+            models.Index(fields=['current_status', 'portion_type', 'furnished_type', 'price'],
+                         name='portion_match_idx'),
+        ]
 
 
 class Portions_status(models.Model):
-    CHOICES = (
-        ('OCCUPIED', 'Occupied'),
-        ('VACANT', 'Vacant'),
-        ('BOOKED', 'Booked'),
-        ('VACANT_SOON', 'Vacant soon'),
-        ('CLOSED', 'Closed'),
-        ('NOT_SET', 'Not Set'),
-    )
+    CHOICES = PORTION_STATUS_CHOICES
     portions = models.ForeignKey(
         Portions, on_delete=models.CASCADE, related_name='portions_status')
     vacant_date = models.DateField(help_text='Enter date upcoming vacant')
@@ -143,26 +279,36 @@ class Portions_status(models.Model):
     def __str__(self):
         return f'Portion id: {self.portions_id}, Status: {self.status}'
 
-    meta = {
-        'indexes': ['-status'],
-        'ordering': ['-vacant_date']
-    }
+    class Meta:
+        ordering = ['-vacant_date']
+        indexes = [
+            models.Index(fields=['portions', 'status'], name='status_portion_status_idx'),
+            models.Index(fields=['status', 'vacant_date'], name='status_vacant_date_idx'),
+        ]
 
 
 class Zone_names(models.Model):
     zone_name = models.CharField(max_length=100)
     zone_no = models.IntegerField(default=0)
+    # the zone's centroid, which buildings without coordinates of their own are placed at
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
 
     def __str__(self):
         return self.zone_name
-    meta = {
-        'indexes': ['-zone_no'],
-        'ordering': ['-zone_no']
-    }
 
     class Meta:
         verbose_name = "Zone Name"
         verbose_name_plural = "Zone Names"
+        ordering = ['-zone_no']
+        indexes = [
+            models.Index(fields=['zone_no'], name='zone_no_idx'),
+        ]
+
+
+def zone_name_of(zone_no_field):
+    """Annotation naming the zone in `zone_no_field`; pages render names with property.zones instead"""
+    return Subquery(Zone_names.objects.filter(zone_no=OuterRef(zone_no_field)).order_by('id').values('zone_name')[:1])
 
 
 class Inquire(models.Model):
@@ -204,7 +350,121 @@ class Inquire(models.Model):
 
     def __str__(self):
         return str(self.mobile_no)
-    meta = {
-        'indexes': ['-mobile_no', 'date_from'],
-        'ordering': ['-mobile_no', 'property_type', 'date_from']
-    }
+
+    class Meta:
+        ordering = ['-date_created', '-id']
+        indexes = [
+            models.Index(fields=['property_type', 'price_from', 'price_to'], name='inquire_type_price_idx'),
+            models.Index(fields=['-date_created', '-id'], name='inquire_created_idx'),
+        ]
+
+
+class InquiryMatch(models.Model):
+    # best portions for an inquiry, written by property.matching
+    inquire = models.ForeignKey(Inquire, on_delete=models.CASCADE, related_name='matches')
+    portion = models.ForeignKey(Portions, on_delete=models.CASCADE, related_name='inquiry_matches')
+    score = models.FloatField()
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.inquire_id} -> {self.portion_id} ({self.score})'
+
+    class Meta:
+        ordering = ['-score', 'portion_id']
+        constraints = [
+            models.UniqueConstraint(fields=['inquire', 'portion'], name='inquiry_match_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['inquire', '-score'], name='inquiry_match_rank_idx'),
+        ]
+
+
+class VacancyWeek(models.Model):
+    # vacant / vacant-soon portions per owner, zone, type and week, maintained by property.vacancy
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='vacancy_weeks')
+    zone_no = models.IntegerField()
+    portion_type = models.CharField(max_length=100)
+    status = models.CharField(max_length=100, choices=PORTION_STATUS_CHOICES)
+    week = models.DateField(help_text='Monday of the week the portions free up')
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.week} zone {self.zone_no} {self.portion_type} {self.status}: {self.count}'
+
+    class Meta:
+        ordering = ['week', 'zone_no', 'portion_type']
+        constraints = [
+            # also the index the realtor timeline reads: status, then a range of weeks
+            models.UniqueConstraint(fields=['status', 'week', 'zone_no', 'portion_type', 'user'],
+                                    name='vacancy_week_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'status', 'week'], name='vacancy_week_owner_idx'),
+        ]
+
+
+class PortionFacet(models.Model):
+    # portions per search facet value, overall (given '') and among the portions holding
+    # one value of another facet (given 'zone_no=38'); maintained by property.search
+    given = models.CharField(max_length=150, blank=True)
+    facet = models.CharField(max_length=50)
+    value = models.CharField(max_length=100)
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.given or "all"}: {self.facet}={self.value} {self.count}'
+
+    class Meta:
+        ordering = ['given', 'facet', 'value']
+        constraints = [
+            # also the index searches read: every facet row for a few given values
+            models.UniqueConstraint(fields=['given', 'facet', 'value'], name='portion_facet_unique'),
+        ]
+
+
+class PortionFacetCell(models.Model):
+    # portions per combination of all search facet values (price and sqft as band floors),
+    # counted for searches selecting several facets; zone_no -1 rows sum every zone.
+    # Maintained by property.search
+    portion_type = models.CharField(max_length=100)
+    furnished_type = models.CharField(max_length=100)
+    bedrooms = models.IntegerField()
+    bathrooms = models.IntegerField()
+    price = models.IntegerField()
+    sqft = models.IntegerField()
+    zone_no = models.IntegerField()
+    status = models.CharField(max_length=100)
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.zone_no} {self.portion_type} {self.status} {self.price}+: {self.count}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['zone_no', 'portion_type', 'furnished_type', 'bedrooms', 'bathrooms',
+                                            'status', 'price', 'sqft'], name='portion_facet_cell_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['portion_type', 'status'], name='portion_facet_cell_type_idx'),
+            models.Index(fields=['status', 'price'], name='portion_facet_cell_status_idx'),
+        ]
+
+
+class PortionDocument(models.Model):
+    # the searchable text of a portion and its weighted English + Arabic tsvector, for
+    # full-text search on PostgreSQL; other databases use property.fulltext's own index
+    portion = models.OneToOneField(Portions, on_delete=models.DO_NOTHING, primary_key=True,
+                                   db_constraint=False, related_name='document')
+    heading = models.TextField(blank=True)  # building title and landmark
+    body = models.TextField(blank=True)  # description
+    extra = models.TextField(blank=True)  # furnished_extra_info
+    vector = SearchVectorField(null=True)
+
+    def __str__(self):
+        return f'document of portion {self.portion_id}'
+
+    class Meta:
+        required_db_vendor = 'postgresql'
+        indexes = [
+            GinIndex(fields=['vector'], name='portion_document_vector_idx'),
+        ]
@@ -0,0 +1,127 @@
+import base64
+import datetime
+
+from django.db.models import Q
+from django.http import JsonResponse
+
+
+# keyset (cursor) pagination on (date_created, id) ...............................
+# Each page is one indexed range scan, so page N costs the same as page 1.
+
+PAGE_SIZE = 24
+
+PROPERTY_JSON_FIELDS = ('id', 'title', 'client_code', 'property_code', 'landmark', 'zone_no',
+                        'street_no', 'property_no', 'portion_count', 'date_created')
+PORTION_JSON_FIELDS = ('id', 'property_data_id', 'portion_code', 'unit_no', 'floor_no', 'price',
+                       'bedrooms', 'bathrooms', 'portion_type', 'furnished_type', 'sqft',
+                       'current_status', 'current_vacant_date', 'date_created')
+INQUIRE_JSON_FIELDS = ('id', 'name', 'locations', 'date_from', 'duration', 'price_from', 'price_to',
+                       'furnished_type', 'property_type', 'date_created')
+
+
+def encode_cursor(obj):
+    raw = f'{obj.date_created.isoformat()}|{obj.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (date_created, pk) for a cursor, or None when it is missing or malformed"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        date_created, pk = raw.split('|')
+        return datetime.datetime.fromisoformat(date_created), int(pk)
+    except ValueError:
+        return None
+
+
+class KeysetPage:
+    """One page of rows plus the cursors pointing either side of it"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def json_response(self, fields, **extra):
+        results = [{field: getattr(obj, field) for field in fields} for obj in self.object_list]
+        return JsonResponse({
+            'results': results,
+            'next': self.next_cursor,
+            'previous': self.previous_cursor,
+            **extra,
+        })
+
+
+def keyset_window(request, queryset, per_page=PAGE_SIZE):
+    """The sliced queryset for the requested page, plus the decoded (before, after) cursors"""
+    before = decode_cursor(request.GET.get('before'))
+    after = decode_cursor(request.GET.get('after'))
+
+    if before:
+        date_created, pk = before
+        queryset = queryset.filter(
+            Q(date_created__gt=date_created) | Q(date_created=date_created, pk__gt=pk)
+        ).order_by('date_created', 'pk')
+    else:
+        queryset = queryset.order_by('-date_created', '-pk')
+        if after:
+            date_created, pk = after
+            queryset = queryset.filter(
+                Q(date_created__lt=date_created) | Q(date_created=date_created, pk__lt=pk))
+    return queryset[:per_page + 1], before, after
+
+
+def keyset_page(rows, before, after, per_page=PAGE_SIZE):
+    if before:
+        has_previous = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        has_next = True
+    else:
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_previous = after is not None
+
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(rows[-1]) if has_next and rows else None,
+        previous_cursor=encode_cursor(rows[0]) if has_previous and rows else None,
+    )
+
+
+def keyset_paginate(request, queryset, per_page=PAGE_SIZE):
+    """Paginate newest first; ?after=<cursor> moves forward, ?before=<cursor> moves back"""
+    window, before, after = keyset_window(request, queryset, per_page)
+    return keyset_page(list(window), before, after, per_page)
+
+
+async def akeyset_paginate(request, queryset, per_page=PAGE_SIZE):
+    """keyset_paginate for async views; prefetch_related lookups are fetched with the page"""
+    window, before, after = keyset_window(request, queryset, per_page)
+    return keyset_page([obj async for obj in window], before, after, per_page)
+
+
+def wants_json(request):
+    return request.GET.get('format') == 'json'
@@ -0,0 +1,407 @@
+import bisect
+from collections import Counter, defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db import connections, router, transaction
+from django.db.models import Case, CharField, Count, F, Q, Sum, Value, When
+from django.db.models.functions import Cast
+from django.http import QueryDict
+
+from property import models as property_models
+from property.inventory import bump_inventory_version
+from property.zones import zone_label
+
+
+# faceted portion search ..........................................................
+# Eight facets narrow Portions down, and each facet lists its values with how
+# many portions match the selections made on the other facets. Those numbers
+# come from two tables that status changes and edits move with upserts:
+# PortionFacet holds them per value, overall and among the portions holding
+# each value of one other facet, so a search with at most one facet selected
+# reads a few hundred rows. PortionFacetCell counts portions per combination of
+# all eight values, plus the same per combination over all zones, and answers
+# searches combining facets. Price and size are searched in bands; a min / max
+# range selects the bands it overlaps. Every search is counted in one query.
+
+PRICE_BANDS = (0, 2000, 3000, 4000, 5000, 6000, 8000, 10000, 15000, 20000, 30000)
+SQFT_BANDS = (0, 500, 750, 1000, 1500, 2000, 3000, 5000)
+RANGES = {'price': ('price_min', 'price_max'), 'sqft': ('sqft_min', 'sqft_max')}
+UNLISTED = 'UNLISTED'  # facet value of portions without a status, which '' cannot carry in a url
+ALL_ZONES = '-1'  # zone_no of the PortionFacetCell rows counting every zone
+
+UPSERT_CHUNK = 100  # rows per INSERT, under SQLite's 999 parameters at nine columns
+
+
+class Facet:
+    """One searchable dimension; facet values are strings, as stored in PortionFacet"""
+
+    def __init__(self, name, title, field, choices=None, bands=None, empty=None, labels=None):
+        self.name = name
+        self.title = title
+        self.field = field
+        self.choices = dict(choices) if choices else None  # None: any whole number
+        self.bands = bands
+        self.empty = empty  # value standing for '' in the field
+        self.labels = labels  # label of a value without choices, e.g. a zone's name
+        self.alias = f'facet_{name}'
+
+    def expression(self):
+        if not self.bands:
+            return F(self.field)
+        return Case(*[When(**{f'{self.field}__gte': low}, then=Value(low)) for low in reversed(self.bands[1:])],
+                    default=Value(self.bands[0]))
+
+    def value_of(self, raw):
+        """Facet value of a field value, or of a band's lower bound"""
+        if self.bands:
+            return str(self.bands[max(bisect.bisect_right(self.bands, raw or 0) - 1, 0)])
+        if raw == '' and self.empty:
+            return self.empty
+        return str(raw)
+
+    def parse(self, values):
+        """The valid facet values among request parameters, in display order"""
+        if self.choices is not None:
+            valid = {value for value in values if value in self.choices}
+        else:
+            valid = {value for value in values if value.isdigit()}
+            if self.bands:
+                valid = {value for value in valid if int(value) in self.bands}
+        return tuple(sorted(valid, key=self.sort_key))
+
+    def q(self, values):
+        if self.bands:
+            # neighbouring bands make one range, which an index can walk once
+            runs = []
+            for index in sorted(self.bands.index(int(value)) for value in values):
+                if runs and runs[-1][1] == index:
+                    runs[-1][1] = index + 1
+                else:
+                    runs.append([index, index + 1])
+            return reduce(or_, (self.band_q(first, end) for first, end in runs))
+        if self.choices is None:
+            return Q(**{f'{self.field}__in': [int(value) for value in values]})
+        return Q(**{f'{self.field}__in': ['' if value == self.empty else value for value in values]})
+
+    def bands_between(self, low, high):
+        """Facet values of the bands overlapping low..high, either of which may be None"""
+        return tuple(str(band) for index, band in enumerate(self.bands)
+                     if (high is None or band <= high)
+                     and (low is None or index + 1 == len(self.bands) or self.bands[index + 1] > low))
+
+    def band_q(self, first, end):
+        """Bands first up to (not including) end"""
+        q = Q(**{f'{self.field}__gte': self.bands[first]}) if first else Q()  # the first band takes anything below
+        if end < len(self.bands):
+            q &= Q(**{f'{self.field}__lt': self.bands[end]})
+        return q
+
+    def label(self, value):
+        if self.bands:
+            index = self.bands.index(int(value))
+            if index + 1 == len(self.bands):
+                return f'{int(value):,}+'
+            return f'{int(value):,} - {self.bands[index + 1] - 1:,}'
+        if self.choices is not None:
+            return self.choices.get(value, value)
+        if self.labels is not None:
+            return self.labels(value)
+        return value
+
+    def sort_key(self, value):
+        if self.choices is not None:
+            return list(self.choices).index(value) if value in self.choices else len(self.choices)
+        return int(value)
+
+
+STATUS_CHOICES = property_models.PORTION_STATUS_CHOICES + ((UNLISTED, 'Unlisted'),)
+
+FACETS = (
+    Facet('portion_type', 'Type', 'portion_type', choices=property_models.Portions.PORTION_CHOICES),
+    Facet('furnished_type', 'Furnishing', 'furnished_type', choices=property_models.Portions.CHOICES),
+    Facet('bedrooms', 'Bedrooms', 'bedrooms'),
+    Facet('bathrooms', 'Bathrooms', 'bathrooms'),
+    Facet('price', 'Price', 'price', bands=PRICE_BANDS),
+    Facet('sqft', 'Sqft', 'sqft', bands=SQFT_BANDS),
+    Facet('zone_no', 'Zone', 'property_data__zone_no', labels=zone_label),
+    Facet('status', 'Status', 'current_status', choices=STATUS_CHOICES, empty=UNLISTED),
+)
+PAIR_FIELDS = ('given', 'facet', 'value')
+CELL_FIELDS = tuple(facet.name for facet in FACETS)
+ZONE = CELL_FIELDS.index('zone_no')
+FACET_FIELDS = {'property_data', 'portion_type', 'furnished_type', 'bedrooms', 'bathrooms', 'price', 'sqft',
+                'current_status'}
+
+
+# counts kept in PortionFacet and PortionFacetCell
+
+def facet_keys(values):
+    """PortionFacet keys a portion with these ((facet, value), ...) is counted under"""
+    for name, value in values:
+        yield '', name, value
+        for given_name, given_value in values:
+            if given_name != name:
+                yield f'{given_name}={given_value}', name, value
+
+
+class FacetDeltas:
+    """Changes to both count tables, collected and then applied together"""
+
+    def __init__(self):
+        self.pairs = Counter()  # PortionFacet (given, facet, value)
+        self.cells = Counter()  # PortionFacetCell, one value per facet
+
+    def add(self, values, count=1):
+        for key in facet_keys(values):
+            self.pairs[key] += count
+        cell = tuple(value for _, value in values)
+        self.cells[cell] += count
+        self.cells[cell[:ZONE] + (ALL_ZONES,) + cell[ZONE + 1:]] += count
+
+    def update(self, other):
+        self.pairs.update(other.pairs)
+        self.cells.update(other.cells)
+
+    def apply(self):
+        apply_deltas(property_models.PortionFacet, PAIR_FIELDS, self.pairs)
+        apply_deltas(property_models.PortionFacetCell, CELL_FIELDS, self.cells)
+
+
+def apply_deltas(model, fields, deltas):
+    """
+    Add {key: delta} to a count table with one upsert per chunk, so a row another
+    transaction is moving is added to rather than missed. Rows counted down to
+    zero stay for the next change of that value; sweep_empty_facets drops them.
+    """
+    # sorted so concurrent writers take the row locks in the same order
+    deltas = sorted(((key, delta) for key, delta in deltas.items() if delta), key=lambda item: tuple(map(str, item[0])))
+    if not deltas:
+        return
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    columns = ', '.join(quote(model._meta.get_field(field).column) for field in fields)
+    row = '(' + ', '.join(['%s'] * (len(fields) + 1)) + ')'
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        for start in range(0, len(deltas), UPSERT_CHUNK):
+            chunk = deltas[start:start + UPSERT_CHUNK]
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}, count) VALUES {", ".join([row] * len(chunk))} '
+                f'ON CONFLICT ({columns}) DO UPDATE SET count = {table}.count + EXCLUDED.count',
+                [value for key, delta in chunk for value in (*key, delta)])
+        if model is property_models.PortionFacet:
+            transaction.on_commit(bump_inventory_version)  # the dashboard counters read PortionFacet
+
+
+def sweep_empty_facets():
+    """Drop the facet rows counted down to zero; returns how many went"""
+    return sum(model.objects.filter(count=0).delete()[0]
+               for model in (property_models.PortionFacet, property_models.PortionFacetCell))
+
+
+def facet_rows(portions):
+    """((facet, value), ...) and the number of portions, per combination found in a queryset"""
+    rows = (portions.order_by().values(**{facet.alias: facet.expression() for facet in FACETS})
+            .annotate(total=Count('id')))
+    for row in rows:
+        yield tuple((facet.name, facet.value_of(row[facet.alias])) for facet in FACETS), row['total']
+
+
+def stored_facet_values(portion_id):
+    """((facet, value), ...) of one portion as saved, or None once it is gone"""
+    for values, _ in facet_rows(property_models.Portions.objects.filter(id=portion_id)):
+        return values
+    return None
+
+
+def portion_facet_values(portion, zone_no):
+    raw = {facet.field: getattr(portion, facet.field) for facet in FACETS if '__' not in facet.field}
+    raw['property_data__zone_no'] = zone_no
+    return tuple((facet.name, facet.value_of(raw[facet.field])) for facet in FACETS)
+
+
+def count_facets(portions, sign=1):
+    """FacetDeltas adding a queryset, or taking it away with sign=-1"""
+    deltas = FacetDeltas()
+    for values, total in facet_rows(portions):
+        deltas.add(values, sign * total)
+    return deltas
+
+
+def count_new_facets(portions):
+    """count_facets for just bulk-created instances, with one zone lookup"""
+    zones = dict(property_models.Property_data.objects.filter(
+        id__in={portion.property_data_id for portion in portions}).values_list('id', 'zone_no'))
+    deltas = FacetDeltas()
+    for portion in portions:
+        deltas.add(portion_facet_values(portion, zones.get(portion.property_data_id, 0)))
+    return deltas
+
+
+def move_facets(old_values, new_values):
+    """Move one portion from its old facet values to its new ones"""
+    deltas = FacetDeltas()
+    if old_values:
+        deltas.add(old_values, -1)
+    if new_values:
+        deltas.add(new_values)
+    deltas.apply()
+
+
+def rebuild_portion_facets():
+    """Recreate PortionFacet and PortionFacetCell from Portions"""
+    deltas = count_facets(property_models.Portions.objects.all())
+    with transaction.atomic():
+        for model, fields, counts in ((property_models.PortionFacet, PAIR_FIELDS, deltas.pairs),
+                                      (property_models.PortionFacetCell, CELL_FIELDS, deltas.cells)):
+            model.objects.all().delete()
+            model.objects.bulk_create([
+                model(**dict(zip(fields, key)), count=total) for key, total in counts.items() if total
+            ], batch_size=1000)
+        transaction.on_commit(bump_inventory_version)
+    return len(deltas.pairs) + len(deltas.cells)
+
+
+# searching
+
+class PortionSearch:
+    """
+    The facet values picked in a request, e.g. ?portion_type=2BHK&zone_no=38&price_max=6000;
+    a price or sqft range replaces the bands picked for it in the counts, and the
+    portions listed are held to its exact bounds
+    """
+
+    def __init__(self, params):
+        self.selected = {}
+        self.ranges = {}  # facet name -> (low, high), either may be None
+        for facet in FACETS:
+            values = facet.parse(value for value in params.getlist(facet.name) if value)
+            if facet.name in RANGES:
+                low, high = (int(params[name]) if params.get(name, '').isdigit() else None
+                             for name in RANGES[facet.name])
+                if low is not None and high is not None and low > high:
+                    low, high = high, low
+                if low is not None or high is not None:
+                    values = facet.bands_between(low, high)
+                    self.ranges[facet.name] = (low, high)
+            if values:
+                self.selected[facet.name] = values
+
+    def q(self, exclude=None):
+        q = Q()
+        for facet in FACETS:
+            if facet.name != exclude and facet.name in self.selected:
+                q &= facet.q(self.selected[facet.name])
+        return q
+
+    def portions(self):
+        portions = property_models.Portions.objects.filter(self.q())
+        for name, (low, high) in self.ranges.items():
+            if low is not None:
+                portions = portions.filter(**{f'{name}__gte': low})
+            if high is not None:
+                portions = portions.filter(**{f'{name}__lte': high})
+        return portions
+
+    def counts(self):
+        """{facet: Counter(value: portions matching the other facets)} in one query"""
+        if len(self.selected) <= 1:
+            return self.stored_counts()
+        return self.cell_counts()
+
+    def stored_counts(self):
+        selected = next(iter(self.selected), None)
+        if selected is None:
+            rows = Q(given='')
+        else:
+            # the selected facet keeps its overall counts, the others count within the selection
+            given = [f'{selected}={value}' for value in self.selected[selected]]
+            rows = Q(given='', facet=selected) | Q(given__in=given)
+        counts = defaultdict(Counter)
+        for name, value, count in property_models.PortionFacet.objects.filter(rows).values_list(
+                'facet', 'value', 'count'):
+            counts[name][value] += count
+        return counts
+
+    def cell_counts(self):
+        cells = property_models.PortionFacetCell.objects.order_by()
+        return self.union_counts([
+            self.cells_for(cells, facet.name)
+            .annotate(facet=Value(facet.name, output_field=CharField()),
+                      value=Cast(facet.name, output_field=CharField()))
+            .values('facet', 'value').annotate(total=Sum('count'))
+            for facet in FACETS
+        ])
+
+    def cells_for(self, cells, name):
+        """Cells matching the selections on every facet but `name`, counted once"""
+        cells = cells.filter(**{f'{other}__in': values for other, values in self.selected.items() if other != name})
+        if name == 'zone_no':
+            return cells.exclude(zone_no=ALL_ZONES)
+        if 'zone_no' not in self.selected:
+            return cells.filter(zone_no=ALL_ZONES)  # a few thousand rows instead of every zone's
+        return cells
+
+    def live_counts(self):
+        """The same counts computed on Portions, far slower; for checking the stored ones"""
+        portions = property_models.Portions.objects.order_by()
+        return self.union_counts([
+            portions.filter(self.q(exclude=facet.name))
+            .annotate(facet=Value(facet.name, output_field=CharField()),
+                      value=Cast(facet.expression(), output_field=CharField()))
+            .values('facet', 'value').annotate(total=Count('id'))
+            for facet in FACETS
+        ])
+
+    def union_counts(self, parts):
+        """Read one (facet, value, total) query per facet as a single UNION"""
+        counts = defaultdict(Counter)
+        by_name = {facet.name: facet for facet in FACETS}
+        for row in parts[0].union(*parts[1:], all=True):
+            facet = by_name[row['facet']]
+            value = str(row['value'])
+            value = facet.empty if value == '' and facet.empty else value
+            counts[row['facet']][value] += row['total']
+        return counts
+
+    def facets(self):
+        """
+        The number of portions matching, and per facet its name, title and
+        values, each with label, count, selected and the query toggling it
+        """
+        counts = self.counts()
+        first = FACETS[0].name
+        total = sum(count for value, count in counts[first].items()
+                    if first not in self.selected or value in self.selected[first])
+        if self.ranges:
+            total = self.portions().count()  # the bands counted above reach past the bounds
+        facets = []
+        for facet in FACETS:
+            selected = self.selected.get(facet.name, ())
+            values = set(selected) | {value for value, count in counts[facet.name].items() if count > 0}
+            facets.append({'name': facet.name, 'title': facet.title, 'values': [{
+                'value': value,
+                'label': facet.label(value),
+                'count': counts[facet.name][value],
+                'selected': value in selected,
+                'query': self.query_string(toggle=(facet.name, value)),
+            } for value in sorted(values, key=facet.sort_key)]})
+        return total, facets
+
+    def query_string(self, toggle=None):
+        """The search as url parameters, optionally with one facet value switched on or off"""
+        query = QueryDict(mutable=True)
+        for facet in FACETS:
+            values = list(self.selected.get(facet.name, ()))
+            if toggle and toggle[0] == facet.name:
+                values = [value for value in values if value != toggle[1]] if toggle[1] in values \
+                    else values + [toggle[1]]
+            if facet.name in self.ranges and not (toggle and toggle[0] == facet.name):
+                # picking a band of a ranged facet goes back to bands, other links keep the range
+                for param, bound in zip(RANGES[facet.name], self.ranges[facet.name]):
+                    if bound is not None:
+                        query[param] = str(bound)
+            elif values:
+                query.setlist(facet.name, values)
+        return query.urlencode()
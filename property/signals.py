@@ -1,25 +1,243 @@
-
-from django.db.models.signals import post_save, post_delete
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
+from django.db import transaction
 from django.dispatch import receiver
-from .models import Portions
+from .models import (Inquire, Portions, Portions_status, Property_data, Zone_names, adjust_portion_counts,
+                     portion_count_suspended)
+from .fulltext import TEXT_FIELDS, index_portions, remove_portions
+from .geo import LOCATION_FIELDS, locate
+from .search import FACET_FIELDS, FacetDeltas, facet_rows, move_facets, stored_facet_values
+from .tasks import PHOTO_FIELDS, enqueue, rematch_inquiries, rematch_portions, render_photos
+from .vacancy import move_portion, portion_key, rebuild_vacancy_calendar
+from . import zones
+from .inventory import bump_inventory_version
+
+
+# portion_count on Property_data ...............................................
 
+@receiver(post_save, sender=Portions)
+def update_portion_count_on_save(sender, instance, created, **kwargs):
+    if created and not portion_count_suspended.get():
+        adjust_portion_counts({instance.property_data_id: 1})
+
+
+@receiver(post_delete, sender=Portions)
+def update_portion_count_on_delete(sender, instance, **kwargs):
+    if not portion_count_suspended.get():
+        adjust_portion_counts({instance.property_data_id: -1})
 
 
+# current status snapshot on Portions ...........................................
 
+@receiver(post_save, sender=Portions_status)
+def update_current_status_on_save(sender, instance, **kwargs):
+    # the snapshot follows the newest row, as on delete; editing an older row changes nothing
+    latest = Portions_status.objects.filter(
+        portions_id=instance.portions_id).order_by('-id').values_list('id', flat=True).first()
+    if latest != instance.id:
+        return
+    old_key = portion_key(instance.portions_id)
+    old_facets = stored_facet_values(instance.portions_id)
+    # queryset update: no Portions post_save, date_updated left untouched
+    Portions.objects.filter(id=instance.portions_id).update(
+        current_status=instance.status,
+        current_vacant_date=instance.vacant_date,
+    )
+    move_portion(old_key, portion_key(instance.portions_id))
+    move_facets(old_facets, stored_facet_values(instance.portions_id))
+    enqueue(rematch_portions, [instance.portions_id])
+
+
+def deleted_with_portion(origin):
+    """True when a status row goes because its portion does, deleted itself or with its building or owner"""
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return origin is not None and model is not Portions_status
+
+
+@receiver(post_delete, sender=Portions_status)
+def update_current_status_on_delete(sender, instance, origin=None, **kwargs):
+    # the Portions receivers below, or PortionQuerySet.delete, take the portion out of
+    # the calendar and facets; moving it here as well would count it out twice
+    if deleted_with_portion(origin):
+        return
+    latest = Portions_status.objects.filter(
+        portions_id=instance.portions_id).order_by('-id').first()
+    old_key = portion_key(instance.portions_id)
+    old_facets = stored_facet_values(instance.portions_id)
+    Portions.objects.filter(id=instance.portions_id).update(
+        current_status=latest.status if latest else '',
+        current_vacant_date=latest.vacant_date if latest else None,
+    )
+    move_portion(old_key, portion_key(instance.portions_id))
+    move_facets(old_facets, stored_facet_values(instance.portions_id))
+    enqueue(rematch_portions, [instance.portions_id])
+
+
+# photo renditions ..............................................................
 
 @receiver(post_save, sender=Portions)
-def update_portion_count_on_save(sender, instance, created, **kwargs):
-    print('update_portion_count_on_save')
-    print(instance)
-    print(created)
+@receiver(post_save, sender=Property_data)
+def render_photos_on_save(sender, instance, update_fields=None, **kwargs):
+    fields = PHOTO_FIELDS[sender._meta.label]
+    if update_fields is not None and not set(fields) & set(update_fields):
+        return
+    if any(getattr(instance, field) for field in fields):
+        enqueue(render_photos, sender._meta.label, instance.pk)
+
+
+# inquiry matches ...............................................................
+
+MATCH_FIELDS = {'price', 'portion_type', 'furnished_type', 'property_data'}
+
+
+@receiver(post_save, sender=Portions)
+def rematch_portion_on_save(sender, instance, created, update_fields=None, **kwargs):
+    # a new portion has no status yet; the Portions_status receiver picks it up
+    if created or (update_fields is not None and not MATCH_FIELDS & set(update_fields)):
+        return
+    enqueue(rematch_portions, [instance.id])
+
+
+@receiver(post_save, sender=Inquire)
+def rematch_inquiry_on_save(sender, instance, **kwargs):
+    enqueue(rematch_inquiries, [instance.id])
+
+
+# vacancy calendar ..............................................................
+# status changes are handled with the snapshot above; these cover edits that move
+# a portion between zones or types, and portions created or deleted with a status
+
+CALENDAR_FIELDS = {'user', 'property_data', 'portion_type', 'current_status', 'current_vacant_date'}
+
+
+@receiver(post_save, sender=Portions)
+def update_vacancy_calendar_on_save(sender, instance, created, update_fields=None, **kwargs):
     if created:
-        instance.property_data.portion_count += 1
-        instance.property_data.save()
+        if instance.current_status:
+            move_portion(None, portion_key(instance.id))
+    elif update_fields is None or CALENDAR_FIELDS & set(update_fields):
+        # the previous zone and type are gone by post_save, so recount this owner
+        rebuild_vacancy_calendar([instance.user_id])
+
+
+@receiver(pre_delete, sender=Portions)
+def remember_portion_before_delete(sender, instance, **kwargs):
+    # read before the cascade removes the status rows, and whatever an instance held
+    # in memory is stale once a status was saved since it was loaded
+    if not portion_count_suspended.get():
+        instance._stored_key = portion_key(instance.pk)
+        instance._stored_facets = stored_facet_values(instance.pk)
 
 
 @receiver(post_delete, sender=Portions)
-def update_portion_count_on_delete(sender, instance, **kwargs):
-    print('update_portion_count_on_delete   ')
-    print(instance)
-    instance.property_data.portion_count -= 1
-    instance.property_data.save()
\ No newline at end of file
+def update_vacancy_calendar_on_delete(sender, instance, **kwargs):
+    if not portion_count_suspended.get():
+        move_portion(instance.__dict__.pop('_stored_key', None), None)
+
+
+@receiver(post_save, sender=Property_data)
+def update_vacancy_calendar_on_zone_change(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and 'zone_no' not in update_fields):
+        return
+    owners = set(instance.portions.filter(current_status__in=('VACANT', 'VACANT_SOON'))
+                 .values_list('user_id', flat=True))
+    if owners:
+        rebuild_vacancy_calendar(owners)
+
+
+# search facets .................................................................
+# status changes are moved with the snapshot above; edits are diffed against the
+# row read just before the save, since post_save only sees the new values
+
+@receiver(pre_save, sender=Portions)
+def remember_facets_before_save(sender, instance, update_fields=None, **kwargs):
+    if not instance._state.adding and (update_fields is None or FACET_FIELDS & set(update_fields)):
+        instance._stored_facets = stored_facet_values(instance.pk)
+
+
+@receiver(post_save, sender=Portions)
+def update_facets_on_save(sender, instance, created, **kwargs):
+    if created:
+        if not portion_count_suspended.get():
+            move_facets(None, stored_facet_values(instance.pk))
+    elif hasattr(instance, '_stored_facets'):
+        move_facets(instance.__dict__.pop('_stored_facets'), stored_facet_values(instance.pk))
+
+
+@receiver(post_delete, sender=Portions)
+def update_facets_on_delete(sender, instance, **kwargs):
+    if not portion_count_suspended.get():
+        move_facets(instance.__dict__.pop('_stored_facets', None), None)
+
+
+@receiver(pre_save, sender=Property_data)
+def remember_building_before_save(sender, instance, update_fields=None, **kwargs):
+    instance._stored_building = None
+    if not instance._state.adding and (update_fields is None or {'zone_no', 'title', 'landmark'} & set(update_fields)):
+        instance._stored_building = (Property_data.objects.filter(id=instance.pk)
+                                     .values('zone_no', 'title', 'landmark').first())
+
+
+@receiver(post_save, sender=Property_data)
+def update_facets_on_zone_change(sender, instance, **kwargs):
+    stored = instance.__dict__.get('_stored_building')
+    if stored is None or stored['zone_no'] == instance.zone_no:
+        return
+    old_zone_no = stored['zone_no']
+    deltas = FacetDeltas()
+    for values, total in facet_rows(instance.portions.all()):
+        deltas.add(values, total)
+        deltas.add(tuple((name, str(old_zone_no) if name == 'zone_no' else value) for name, value in values), -total)
+    deltas.apply()
+
+
+# full-text index .................................................................
+# a portion is reindexed when it is saved, and all of a building's portions when
+# its title or landmark change; bulk paths index and remove in batches themselves
+
+@receiver(post_save, sender=Portions)
+def index_text_on_save(sender, instance, created, update_fields=None, **kwargs):
+    if created and portion_count_suspended.get():
+        return
+    if update_fields is None or TEXT_FIELDS & set(update_fields):
+        index_portions([instance.pk])
+
+
+@receiver(post_delete, sender=Portions)
+def remove_text_on_delete(sender, instance, **kwargs):
+    if not portion_count_suspended.get():
+        remove_portions([instance.pk])
+
+
+@receiver(post_save, sender=Property_data)
+def index_text_on_building_change(sender, instance, **kwargs):
+    stored = instance.__dict__.pop('_stored_building', None)
+    if stored is not None and (stored['title'], stored['landmark']) != (instance.title, instance.landmark):
+        index_portions(instance.portions.values_list('id', flat=True))
+
+
+# building locations ..............................................................
+# coordinates typed in are kept and filed under their grid cell; a building without
+# them is placed at its street's captured buildings, else at its zone's centroid
+
+@receiver(pre_save, sender=Property_data)
+def locate_building_before_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or LOCATION_FIELDS <= set(update_fields):
+        locate(instance)
+
+
+# zone names ......................................................................
+
+@receiver(post_save, sender=Zone_names)
+@receiver(post_delete, sender=Zone_names)
+def invalidate_zone_names(sender, **kwargs):
+    zones.bump_version()
+
+
+# inventory counters ..............................................................
+# portion changes move them through PortionFacet (property.search); inquiries here
+
+@receiver(post_save, sender=Inquire)
+@receiver(post_delete, sender=Inquire)
+def invalidate_inventory_counts(sender, **kwargs):
+    transaction.on_commit(bump_inventory_version)
@@ -0,0 +1,64 @@
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+
+from property import matching
+from property.images import generate_renditions
+from yk.log import get_logger
+
+try:
+    from celery import shared_task
+except ImportError:  # celery is optional; without it tasks run in-process after commit
+    shared_task = None
+
+
+logger = get_logger(__name__)
+
+PHOTO_FIELDS = {
+    'property.Portions': ['photo_main', 'photo_1', 'photo_2', 'photo_3'],
+    'property.Property_data': ['photo_main'],
+}
+
+
+def enqueue(task, *args):
+    """Run a task after the current transaction commits: on the Celery queue when a broker is configured, inline otherwise"""
+    if shared_task is not None and settings.CELERY_BROKER_URL:
+        transaction.on_commit(lambda: task.delay(*args))
+    else:
+        transaction.on_commit(lambda: task(*args))
+
+
+def background_task(func):
+    """Register func as a Celery task when celery is installed, leave it a plain function otherwise"""
+    if shared_task is None:
+        return func
+    return shared_task(ignore_result=True)(func)
+
+
+@background_task
+def render_photos(model_label, pk, overwrite=False):
+    """Generate the card/detail/full renditions of every photo on one row"""
+    instance = apps.get_model(model_label)._default_manager.filter(pk=pk).first()
+    if instance is None:
+        return
+    for field_name in PHOTO_FIELDS[model_label]:
+        field_file = getattr(instance, field_name)
+        if not field_file:
+            continue
+        try:
+            generate_renditions(field_file, overwrite=overwrite)
+        except OSError:
+            # missing or unreadable upload: keep serving the original
+            logger.warning('photo_render_failed', model=model_label, pk=pk, field=field_name,
+                           name=field_file.name, exc_info=True)
+
+
+
+@background_task
+def rematch_portions(portion_ids):
+    matching.rematch_portions(portion_ids)
+
+
+@background_task
+def rematch_inquiries(inquiry_ids):
+    matching.rematch_inquiries(inquiry_ids)
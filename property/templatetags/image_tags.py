@@ -0,0 +1,11 @@
+from django import template
+
+from property.images import rendition_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def rendition(field_file, size='card', fmt='jpeg'):
+    """URL of a resized photo, e.g. {% rendition portion.photo_main 'card' 'webp' %}; falls back to the original"""
+    return rendition_url(field_file, size, fmt)
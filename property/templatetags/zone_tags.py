@@ -0,0 +1,17 @@
+from django import template
+
+from property import zones
+
+register = template.Library()
+
+
+@register.filter
+def zone_name(zone_no):
+    """Name of a zone number, e.g. {{ building.zone_no|zone_name }}; '' when Zone_names has none"""
+    return zones.zone_name(zone_no)
+
+
+@register.filter
+def zone_label(zone_no):
+    """'38 · Al Sadd', or the bare number of an unnamed zone"""
+    return zones.zone_label(zone_no)
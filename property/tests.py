@@ -1,3 +1,922 @@
-from django.test import TestCase
+import datetime
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.http import QueryDict
+from django.template import Context, Template
+from django.test import AsyncClient, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import Workbook
+from PIL import Image
+
+from accounts.models import Profile
+from property.bulk_import import import_portions
+from property.fulltext import SQLiteEngine, index_portions, search_portions
+from property import zones
+from property.geo import distance_km, nearest_portions, portions_within
+from property.inventory import count_inventory, inventory_counts
+from property.images import generate_renditions, rendition_name, rendition_url
+from property.matching import rank_matches
+from property.models import (Inquire, InquiryMatch, PortionFacet, PortionFacetCell, Property_data, Portions,
+                             Portions_status, VacancyWeek, Zone_names)
+from property.pagination import akeyset_paginate, keyset_paginate
+from property.search import PortionSearch, rebuild_portion_facets
+from property.vacancy import rebuild_vacancy_calendar, vacancy_timeline, week_start
+from webpages import api_docs
+
+
+class PortionListingQueryCountTests(TestCase):
+    """Portion listings must cost the same number of queries whatever the row count"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='testpass123')
+        Profile.objects.create(user=self.user, username='owner', is_business=True, is_realtor=True)
+        self.building = Property_data.objects.create(
+            user=self.user, title='Tower', client_code='T1', property_code='P1',
+            landmark='Al Sadd', zone_no=38)
+        self.client.force_login(self.user)
+
+    def add_portions(self, count):
+        for unit_no in range(count):
+            portion = Portions.objects.create(
+                property_data=self.building, user=self.user, unit_no=unit_no,
+                price=5000, photo_main='property/test.jpg')
+            Portions_status.objects.create(
+                portions=portion, status='VACANT', vacant_date='2026-01-01')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertConstantQueries(self, url):
+        self.add_portions(2)
+        small = self.count_queries(url)
+        self.add_portions(10)
+        self.assertEqual(self.count_queries(url), small)
+
+    def test_portions_list_all(self):
+        self.assertConstantQueries(reverse('property:portions_list_all', args=[self.user.id]))
+
+    def test_portions_of_property(self):
+        self.assertConstantQueries(
+            reverse('property:portions_of_property', args=[self.user.id, self.building.id]))
+
+    def test_clients_portions_all_list(self):
+        self.assertConstantQueries(reverse('clients:portions_all_list'))
+
+    def test_clients_portions_a_building(self):
+        self.assertConstantQueries(reverse('clients:portions_a_building', args=[self.building.id]))
+
+    def test_clients_portions_vacants(self):
+        self.assertConstantQueries(reverse('clients:portions_vacants'))
+
+    def test_clients_portion_status_management(self):
+        self.assertConstantQueries(reverse('clients:portion_status_management'))
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='realtor', password='testpass123')
+        building = Property_data.objects.create(
+            user=self.user, title='Tower', client_code='T1', property_code='P1',
+            landmark='Al Sadd', zone_no=38)
+        portions = [
+            Portions.objects.create(property_data=building, user=self.user, unit_no=unit_no, price=5000)
+            for unit_no in range(5)]
+        self.newest_first = [portion.id for portion in reversed(portions)]
+        self.factory = RequestFactory()
+
+    def page(self, **params):
+        return keyset_paginate(self.factory.get('/', params), Portions.objects.all(), per_page=2)
+
+    def ids(self, page):
+        return [portion.id for portion in page]
+
+    def test_cursors_walk_forward_and_back(self):
+        first = self.page()
+        self.assertEqual(self.ids(first), self.newest_first[:2])
+        self.assertFalse(first.has_previous)
+
+        second = self.page(after=first.next_cursor)
+        self.assertEqual(self.ids(second), self.newest_first[2:4])
+
+        last = self.page(after=second.next_cursor)
+        self.assertEqual(self.ids(last), self.newest_first[4:])
+        self.assertFalse(last.has_next)
+
+        back = self.page(before=second.previous_cursor)
+        self.assertEqual(self.ids(back), self.newest_first[:2])
+        self.assertFalse(back.has_previous)
+
+    def test_malformed_cursor_falls_back_to_first_page(self):
+        self.assertEqual(self.ids(self.page(after='not-a-cursor')), self.newest_first[:2])
+
+    async def test_async_pages_match_sync_pages(self):
+        first = await akeyset_paginate(self.factory.get('/'), Portions.objects.all(), per_page=2)
+        self.assertEqual(self.ids(first), self.newest_first[:2])
+        second = await akeyset_paginate(
+            self.factory.get('/', {'after': first.next_cursor}), Portions.objects.all(), per_page=2)
+        self.assertEqual(self.ids(second), self.newest_first[2:4])
+
+
+class AsyncDashboardTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='testpass123')
+        self.profile = Profile.objects.create(user=self.user, username='owner', is_business=True, is_realtor=True)
+        building = Property_data.objects.create(
+            user=self.user, title='Tower', client_code='T1', property_code='P1', landmark='Pearl', zone_no=66)
+        Portions.objects.create(property_data=building, user=self.user, unit_no=1, price=5000,
+                                current_status='VACANT', current_vacant_date=datetime.date.today())
+        self.client = AsyncClient()
+
+    async def test_dashboards_render_under_asgi(self):
+        await self.client.aforce_login(self.user)
+        for name in ('clients:dashboard', 'clients:property_all_list', 'clients:portions_vacants',
+                     'clients:portions_vacant_soon', 'clients:portions_occupied', 'clients:portions_unlisted',
+                     'property:property_all', 'property:inquire_lists'):
+            response = await self.client.get(reverse(name))
+            self.assertEqual(response.status_code, 200, name)
+        response = await self.client.get(reverse('clients:portions_vacants'), {'format': 'json'})
+        self.assertEqual(len(response.json()['results']), 1)
+
+    async def test_vacancy_lists_keep_the_horizon_across_pages(self):
+        await self.client.aforce_login(self.user)
+        for name in ('clients:portions_vacants', 'clients:portions_vacant_soon'):
+            response = await self.client.get(reverse(name), {'days': 60})
+            self.assertEqual(response.context['query'], 'days=60', name)
+
+    async def test_non_business_users_are_redirected(self):
+        self.profile.is_business = False
+        await self.profile.asave()
+        await self.client.aforce_login(self.user)
+        response = await self.client.get(reverse('clients:dashboard'))
+        self.assertRedirects(response, reverse('accounts:profile'), fetch_redirect_response=False)
+
+
+class PortionCountTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='testpass123')
+        self.building = Property_data.objects.create(
+            user=self.user, title='Tower', client_code='T1', property_code='P1',
+            landmark='Al Sadd', zone_no=38)
+
+    def portion_count(self):
+        self.building.refresh_from_db()
+        return self.building.portion_count
+
+    def new_portion(self, unit_no):
+        return Portions(property_data=self.building, user=self.user, unit_no=unit_no, price=5000)
+
+    def test_save_and_delete(self):
+        portion = self.new_portion(1)
+        portion.save()
+        self.assertEqual(self.portion_count(), 1)
+        portion.delete()
+        self.assertEqual(self.portion_count(), 0)
+
+    def test_bulk_create_and_queryset_delete(self):
+        Portions.objects.bulk_create([self.new_portion(unit_no) for unit_no in range(30)])
+        self.assertEqual(self.portion_count(), 30)
+        Portions.objects.filter(unit_no__lt=10).delete()
+        self.assertEqual(self.portion_count(), 20)
+
+    def test_count_update_leaves_date_updated_alone(self):
+        date_updated = self.building.date_updated
+        self.new_portion(1).save()
+        self.building.refresh_from_db()
+        self.assertEqual(self.building.date_updated, date_updated)
+
+    def test_recount_portions_repairs_drift(self):
+        Portions.objects.bulk_create([self.new_portion(unit_no) for unit_no in range(3)])
+        Property_data.objects.update(portion_count=99)
+        call_command('recount_portions', stdout=StringIO())
+        self.assertEqual(self.portion_count(), 3)
+
+
+class BulkImportTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='testpass123')
+        self.building = Property_data.objects.create(
+            user=self.user, title='Tower', client_code='T1', property_code='P1',
+            landmark='Al Sadd', zone_no=38)
+
+    def test_csv_import_reports_row_errors(self):
+        upload = SimpleUploadedFile('units.csv', (
+            'Unit No,Floor No,Price,Portion Type,Furnished Type,Status,Vacant Date\n'
+            '101,1,5000,2BHK,Furnished,VACANT,2026-01-01\n'
+            '102,1,not-a-price,2BHK,Furnished,,\n'
+            '103,1,6000,STUDIO,UnFurnished,,\n'
+        ).encode())
+        result = import_portions(self.building, self.user, upload, batch_size=1)
+
+        self.assertEqual(result.created, 2)
+        self.assertEqual([row_no for row_no, _ in result.errors], [3])
+        self.assertIn('price', result.errors[0][1])
+        self.building.refresh_from_db()
+        self.assertEqual(self.building.portion_count, 2)
+        vacant = Portions.objects.get(unit_no=101)
+        self.assertEqual(vacant.current_status, 'VACANT')
+        self.assertEqual(vacant.portions_status.get().status, 'VACANT')
+
+    def test_blank_cells_use_only_valid_defaults(self):
+        upload = SimpleUploadedFile('units.csv', (
+            'Unit No,Price,Portion Type,Furnished Type,Bedrooms\n'
+            '101,5000,,Furnished,\n'
+            '102,5000,2BHK,,2\n'
+        ).encode())
+        result = import_portions(self.building, self.user, upload)
+
+        self.assertEqual(result.created, 1)
+        self.assertEqual(Portions.objects.values_list('portion_type', 'bedrooms').get(), ('STUDIO', 1))
+        (row_no, errors), = result.errors
+        self.assertEqual((row_no, list(errors)), (3, ['furnished_type']))
+        self.assertIn('required', str(errors['furnished_type']))  # not "'No' is not one of the choices"
+
+    def test_non_utf8_csv_stops_with_a_file_error(self):
+        rows = ''.join(f'{unit_no},5000,2BHK,Furnished\n' for unit_no in range(2000))  # past the decoder's first chunk
+        upload = SimpleUploadedFile('units.csv', (
+            'Unit No,Price,Portion Type,Furnished Type\n' + rows + '2000,5000,2BHK,Caf\u00e9\n'
+        ).encode('latin-1'))
+        result = import_portions(self.building, self.user, upload)
+
+        self.assertIn('UTF-8', result.file_error)
+        self.assertGreater(result.created, 0)
+        self.building.refresh_from_db()
+        self.assertEqual(self.building.portion_count, result.created)
+
+    def test_corrupt_xlsx_is_a_file_error(self):
+        for content in (b'not a zip file', b'PK\x05\x06' + bytes(18)):  # the second is an empty zip
+            result = import_portions(self.building, self.user, SimpleUploadedFile('units.xlsx', content))
+            self.assertIn('.xlsx', result.file_error)
+            self.assertEqual(result.created, 0)
+
+    def test_import_view_reports_an_unreadable_file(self):
+        Profile.objects.create(user=self.user, username='owner', is_business=True)
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('clients:portions_import', args=[self.building.id]),
+                                    {'file': SimpleUploadedFile('units.xlsx', b'not a zip file')})
+        self.assertContains(response, 'not a readable .xlsx workbook')
+
+    def test_xlsx_import(self):
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(['unit_no', 'price', 'portion_type', 'furnished_type'])
+        for unit_no in range(1, 6):
+            sheet.append([unit_no, 4000 + unit_no, '1BHK', 'Semi-Furnished'])
+        content = BytesIO()
+        workbook.save(content)
+
+        result = import_portions(
+            self.building, self.user, SimpleUploadedFile('units.xlsx', content.getvalue()))
+
+        self.assertEqual((result.created, result.failed), (5, 0))
+        self.assertEqual(Portions.objects.filter(property_data=self.building).count(), 5)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class PhotoRenditionTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='testpass123')
+        content = BytesIO()
+        Image.new('RGB', (3000, 2000), 'teal').save(content, 'JPEG')
+        self.building = Property_data.objects.create(
+            user=self.user, title='Tower', client_code='T1', property_code='P1', landmark='Al Sadd',
+            zone_no=38, photo_main=SimpleUploadedFile('tower.jpg', content.getvalue()))
+
+    def test_renditions_are_resized_and_served(self):
+        photo = self.building.photo_main
+        self.assertEqual(rendition_url(photo, 'card', 'webp'), photo.url)
+        with mock.patch.object(photo.storage, 'exists', side_effect=AssertionError('storage asked again')):
+            self.assertEqual(rendition_url(photo, 'card', 'webp'), photo.url)  # the miss is cached too
+
+        generate_renditions(photo)
+
+        with Image.open(photo.storage.path(rendition_name(photo.name, 'card', 'webp'))) as card:
+            self.assertEqual(card.size, (480, 320))
+        with Image.open(photo.storage.path(rendition_name(photo.name, 'full'))) as full:
+            self.assertEqual(full.size, (1920, 1280))
+        self.assertEqual(rendition_url(photo, 'card', 'webp'),
+                         photo.storage.url(rendition_name(photo.name, 'card', 'webp')))
+
+    def test_backfill_command(self):
+        call_command('backfill_renditions', stdout=StringIO())
+        photo = self.building.photo_main
+        self.assertTrue(photo.storage.exists(rendition_name(photo.name, 'detail')))
+
+
+class InquiryMatchingTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='testpass123')
+        Zone_names.objects.create(zone_name='Al Sadd', zone_no=38)
+        self.building = Property_data.objects.create(
+            user=self.user, title='Tower', client_code='T1', property_code='P1',
+            landmark='Al Sadd', zone_no=38)
+        self.other_zone = Property_data.objects.create(
+            user=self.user, title='Villa', client_code='V1', property_code='P2',
+            landmark='Wakra', zone_no=90)
+        self.today = timezone.localdate()
+
+    def portion(self, building=None, status='VACANT', vacant_in=0, **fields):
+        fields = {'portion_type': '2BHK', 'furnished_type': 'Furnished', 'price': 5500, **fields}
+        portion = Portions.objects.create(
+            property_data=building or self.building, user=self.user, unit_no=Portions.objects.count(),
+            **fields)
+        with self.captureOnCommitCallbacks(execute=True):
+            Portions_status.objects.create(
+                portions=portion, status=status, vacant_date=self.today + datetime.timedelta(days=vacant_in))
+        return portion
+
+    def inquiry(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Inquire.objects.create(
+                name='Tenant', locations='Al Sadd', date_from=timezone.now(), duration=12,
+                price_from=5000, price_to=6000, furnished_type='Furnished', property_type='2BHK', notes='-')
+
+    def matched(self, inquiry):
+        return list(InquiryMatch.objects.filter(inquire=inquiry).values_list('portion_id', flat=True))
+
+    def test_ranking_and_hard_filters(self):
+        best = self.portion()
+        soon = self.portion(status='VACANT_SOON', vacant_in=30)
+        over_budget = self.portion(price=6300)
+        self.portion(price=9000)
+        self.portion(portion_type='1BHK')
+        self.portion(furnished_type='UnFurnished')
+        self.portion(status='OCCUPIED')
+        self.portion(building=self.other_zone)
+
+        inquiry = self.inquiry()
+
+        self.assertEqual(self.matched(inquiry), [best.id, soon.id, over_budget.id])
+        self.assertEqual([portion_id for _, portion_id in rank_matches(inquiry)], self.matched(inquiry))
+
+    def test_public_inquiry_form_returns_to_a_public_page(self):
+        response = self.client.post(reverse('property:inquire_create'), {
+            'name': 'Tenant', 'mobile_no': 55555555, 'whatsapp_no': 97455555555, 'locations': 'Al Sadd',
+            'date_from': '2026-01-01 10:00', 'duration': 12, 'price_from': 5000, 'price_to': 6000,
+            'furnished_type': 'Furnished', 'property_type': '2BHK', 'notes': '-'}, follow=True)
+        self.assertEqual(response.redirect_chain, [(reverse('webpages:services'), 302)])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Inquire.objects.filter(name='Tenant').exists())
+
+    def test_status_change_rematches_incrementally(self):
+        inquiry = self.inquiry()
+        portion = self.portion(status='OCCUPIED')
+        self.assertEqual(self.matched(inquiry), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Portions_status.objects.create(portions=portion, status='VACANT', vacant_date=self.today)
+        self.assertEqual(self.matched(inquiry), [portion.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Portions_status.objects.create(portions=portion, status='BOOKED', vacant_date=self.today)
+        self.assertEqual(self.matched(inquiry), [])
+
+
+class VacancyCalendarTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='testpass123')
+        self.building = Property_data.objects.create(
+            user=self.user, title='Tower', client_code='T1', property_code='P1',
+            landmark='Al Sadd', zone_no=38)
+        self.today = timezone.localdate()
+
+    def portion(self, status, days, portion_type='2BHK'):
+        portion = Portions.objects.create(
+            property_data=self.building, user=self.user, unit_no=Portions.objects.count(),
+            price=5000, portion_type=portion_type)
+        Portions_status.objects.create(
+            portions=portion, status=status, vacant_date=self.today + datetime.timedelta(days=days))
+        return portion
+
+    def buckets(self):
+        return sorted(VacancyWeek.objects.values_list('zone_no', 'portion_type', 'status', 'week', 'count'))
+
+    def test_status_changes_move_portions_between_weeks(self):
+        first = self.portion('VACANT_SOON', 10)
+        self.portion('VACANT_SOON', 10)
+        self.portion('VACANT_SOON', 75, portion_type='STUDIO')
+        self.portion('OCCUPIED', 0)
+        week = week_start(self.today + datetime.timedelta(days=10))
+
+        with self.assertNumQueries(1):
+            timeline = vacancy_timeline('VACANT_SOON', 30, user=self.user)
+        self.assertEqual(timeline, [{'week': week, 'zone_no': 38, 'portion_type': '2BHK', 'total': 2}])
+        self.assertEqual(len(vacancy_timeline('VACANT_SOON', 90)), 2)
+
+        Portions_status.objects.create(portions=first, status='VACANT', vacant_date=self.today)
+        self.assertEqual(vacancy_timeline('VACANT_SOON', 30)[0]['total'], 1)
+        self.assertEqual(vacancy_timeline('VACANT', 30)[0]['total'], 1)
+
+        incremental = self.buckets()
+        rebuild_vacancy_calendar()
+        self.assertEqual(self.buckets(), incremental)
+
+    def test_undated_portions_keep_one_bucket_whatever_the_day(self):
+        with mock.patch('django.utils.timezone.localdate', return_value=datetime.date(2026, 3, 2)):
+            portion = Portions.objects.create(property_data=self.building, user=self.user, price=5000,
+                                              portion_type='2BHK', current_status='VACANT')
+            self.assertEqual(vacancy_timeline('VACANT', 30), [
+                {'week': None, 'zone_no': 38, 'portion_type': '2BHK', 'total': 1}])
+        with mock.patch('django.utils.timezone.localdate', return_value=datetime.date(2026, 3, 9)):
+            portion.portion_type = 'STUDIO'
+            portion.save()
+            self.assertEqual([(row['week'], row['portion_type']) for row in vacancy_timeline('VACANT', 30)],
+                             [(None, 'STUDIO')])
+        with mock.patch('django.utils.timezone.localdate', return_value=datetime.date(2026, 3, 16)):
+            Portions.objects.get(id=portion.id).delete()
+        self.assertEqual(self.buckets(), [])
+
+    def test_editing_an_older_status_row_keeps_the_snapshot(self):
+        portion = self.portion('VACANT_SOON', 10)
+        older = portion.portions_status.get()
+        Portions_status.objects.create(portions=portion, status='BOOKED', vacant_date=self.today)
+        older.status = 'VACANT'
+        older.save()
+        portion.refresh_from_db()
+        self.assertEqual(portion.current_status, 'BOOKED')
+        incremental = self.buckets()
+        rebuild_vacancy_calendar()
+        self.assertEqual(self.buckets(), incremental)
+
+    def test_deletes_leave_no_empty_buckets(self):
+        self.portion('VACANT', 0).delete()
+        self.portion('VACANT_SOON', 5)
+        self.portion('VACANT_SOON', 5)
+        Portions.objects.all().delete()
+        self.assertEqual(VacancyWeek.objects.count(), 0)
+
+    def test_deleting_portions_with_status_counts_them_out_once(self):
+        self.portion('VACANT', 0)
+        self.portion('VACANT_SOON', 10)
+        for delete in (lambda portion: portion.delete(),
+                       lambda portion: Portions.objects.filter(id=portion.id).delete(),
+                       lambda portion: portion.property_data.delete()):
+            for status in ('VACANT_SOON', 'VACANT'):
+                self.building = Property_data.objects.create(
+                    user=self.user, title='Annex', client_code='T2', property_code='P2', landmark='Al Sadd', zone_no=38)
+                portion = self.portion('VACANT_SOON', 10)
+                if status == 'VACANT':  # deleted after a second status row
+                    Portions_status.objects.create(portions=portion, status=status, vacant_date=self.today)
+                delete(portion)
+                incremental = self.buckets()
+                rebuild_vacancy_calendar()
+                self.assertEqual(self.buckets(), incremental)
+        self.assertEqual(sum(count for *_, count in self.buckets()), 2)
+
+
+class PortionSearchTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='realtor', password='testpass123')
+        Profile.objects.create(user=self.user, username='realtor', is_realtor=True)
+        self.pearl = Property_data.objects.create(
+            user=self.user, title='Tower', client_code='T1', property_code='P1', landmark='Pearl', zone_no=66)
+        self.sadd = Property_data.objects.create(
+            user=self.user, title='Villa', client_code='T2', property_code='P2', landmark='Al Sadd', zone_no=38)
+
+    def portion(self, building, portion_type, price, status=None, **fields):
+        portion = Portions.objects.create(property_data=building, user=self.user, unit_no=Portions.objects.count(),
+                                          price=price, portion_type=portion_type, **fields)
+        if status:
+            Portions_status.objects.create(portions=portion, status=status, vacant_date=timezone.localdate())
+        return portion
+
+    def stored(self):
+        # rows counted down to zero stay until sweep_empty_facets, a rebuild leaves them out
+        return (sorted(PortionFacet.objects.exclude(count=0).values_list('given', 'facet', 'value', 'count')),
+                sorted(PortionFacetCell.objects.exclude(count=0).values_list(
+                    'portion_type', 'furnished_type', 'bedrooms', 'bathrooms', 'price', 'sqft', 'zone_no', 'status',
+                    'count')))
+
+    def assertFacetsMatchRebuild(self):
+        incremental = self.stored()
+        rebuild_portion_facets()
+        self.assertEqual(self.stored(), incremental)
+
+    def search(self, **params):
+        query = QueryDict(mutable=True)
+        for name, value in params.items():
+            query.setlist(name, value if isinstance(value, list) else [value])
+        return PortionSearch(query)
+
+    def test_changes_are_counted_incrementally(self):
+        first = self.portion(self.pearl, '2BHK', 5500, 'VACANT', bedrooms=2)
+        self.portion(self.pearl, 'STUDIO', 3200, 'OCCUPIED', sqft=450)
+        self.portion(self.sadd, '2BHK', 7000)
+        self.assertFacetsMatchRebuild()
+
+        Portions_status.objects.create(portions=first, status='BOOKED', vacant_date=timezone.localdate())
+        first.price = 12000
+        first.property_data = self.sadd
+        first.save()
+        self.sadd.zone_no = 40
+        self.sadd.save()
+        self.assertFacetsMatchRebuild()
+
+        Portions.objects.bulk_create([Portions(property_data=self.pearl, user=self.user, price=2500, unit_no=unit_no)
+                                      for unit_no in range(50, 55)])
+        first.delete()
+        Portions.objects.filter(unit_no__gte=53).delete()
+        self.assertFacetsMatchRebuild()
+        self.assertFalse(PortionFacet.objects.filter(count__lt=0).exists())
+        self.assertFalse(PortionFacetCell.objects.filter(count__lt=0).exists())
+
+    def test_rows_counted_down_to_zero_wait_for_the_sweep(self):
+        self.portion(self.pearl, '2BHK', 5500, 'VACANT')
+        self.portion(self.sadd, 'STUDIO', 3200, 'VACANT').delete()
+        self.assertTrue(PortionFacetCell.objects.filter(count=0).exists())
+        self.assertEqual([zone['zone_no'] for zone in count_inventory(timezone.localdate())['zones']], [66])
+        call_command('rebuild_portion_facets', sweep=True, stdout=StringIO())
+        self.assertFalse(PortionFacet.objects.filter(count=0).exists())
+        self.assertFalse(PortionFacetCell.objects.filter(count=0).exists())
+        self.assertFacetsMatchRebuild()
+
+    def test_stored_counts_agree_with_live_counts(self):
+        self.portion(self.pearl, '2BHK', 5500, 'VACANT')
+        self.portion(self.pearl, '2BHK', 6500, 'VACANT_SOON')
+        self.portion(self.pearl, 'STUDIO', 3200, 'OCCUPIED')
+        self.portion(self.sadd, '2BHK', 7000)
+        for params in ({}, {'zone_no': '66'}, {'status': ['VACANT', 'UNLISTED']}, {'price': ['5000', '6000']}):
+            search = self.search(**params)
+            with self.assertNumQueries(1):
+                stored = search.stored_counts()
+            self.assertEqual(stored, search.live_counts(), params)
+
+    def test_stored_counts_agree_with_live_counts_after_deletes(self):
+        for building in (self.pearl, self.sadd):
+            self.portion(building, '2BHK', 5500, 'VACANT')
+            self.portion(building, 'STUDIO', 3200)
+        self.portion(self.pearl, '2BHK', 6500, 'VACANT_SOON').delete()
+        Portions.objects.filter(id=self.portion(self.pearl, 'STUDIO', 3200, 'OCCUPIED').id).delete()
+        booked = self.portion(self.sadd, '2BHK', 7000, 'VACANT')
+        Portions_status.objects.create(portions=booked, status='BOOKED', vacant_date=timezone.localdate())
+        booked.delete()
+        self.sadd.delete()
+        for params in ({}, {'zone_no': '66'}, {'status': ['VACANT', 'UNLISTED']}, {'price': ['5000', '6000']}):
+            search = self.search(**params)
+            self.assertEqual(search.stored_counts(), search.live_counts(), params)
+            self.assertEqual(search.cell_counts(), search.live_counts(), params)
+        self.assertFalse(PortionFacetCell.objects.filter(count__lt=0).exists())
+
+    def test_cell_counts_agree_with_live_counts(self):
+        self.portion(self.pearl, '2BHK', 5500, 'VACANT', bedrooms=2)
+        self.portion(self.pearl, '2BHK', 6500, 'VACANT_SOON', bedrooms=2)
+        self.portion(self.pearl, 'STUDIO', 3200, 'OCCUPIED')
+        self.portion(self.sadd, '2BHK', 7000)
+        for params in ({'zone_no': '66', 'portion_type': '2BHK'},
+                       {'status': ['VACANT', 'UNLISTED'], 'price': ['5000', '6000'], 'bedrooms': '2'}):
+            search = self.search(**params)
+            with self.assertNumQueries(1):
+                cells = search.cell_counts()
+            self.assertEqual(cells, search.live_counts(), params)
+
+    def test_facets_count_the_other_selections(self):
+        self.portion(self.pearl, '2BHK', 5500, 'VACANT')
+        self.portion(self.pearl, 'STUDIO', 3200, 'VACANT')
+        self.portion(self.sadd, '2BHK', 7000, 'OCCUPIED')
+        total, facets = self.search(portion_type='2BHK', zone_no=['66', 'x']).facets()
+        self.assertEqual(total, 1)
+        facets = {facet['name']: {value['value']: value['count'] for value in facet['values']} for facet in facets}
+        self.assertEqual(facets['portion_type'], {'2BHK': 1, 'STUDIO': 1})
+        self.assertEqual(facets['zone_no'], {'38': 1, '66': 1})
+        self.assertEqual(facets['status'], {'VACANT': 1})
+
+    def test_ranges_select_the_bands_they_overlap(self):
+        search = self.search(price_min='4500', price_max='9000')
+        self.assertEqual(search.selected['price'], ('4000', '5000', '6000', '8000'))
+        self.assertEqual(search.ranges, {'price': (4500, 9000)})
+        search = self.search(price='2000', price_max='2500', sqft_min='6000')
+        self.assertEqual(search.selected, {'price': ('0', '2000'), 'sqft': ('5000',)})
+        self.assertEqual(search.ranges, {'price': (None, 2500), 'sqft': (6000, None)})
+
+    def test_ranges_list_portions_within_their_exact_bounds(self):
+        inside = self.portion(self.pearl, '2BHK', 5500, 'VACANT')
+        self.portion(self.pearl, '2BHK', 4200, 'VACANT')  # in the 4000 band, under the bound
+        self.portion(self.pearl, '2BHK', 5900, 'VACANT', sqft=900)
+        search = self.search(price_min='4500', price_max='5999', sqft_max='800')
+        self.assertEqual(list(search.portions()), [inside])
+        self.assertEqual(search.facets()[0], 1)
+        self.assertIn('price_min=4500', search.query_string(toggle=('status', 'VACANT')))
+        self.assertNotIn('price_min', search.query_string(toggle=('price', '4000')))
+
+    def test_search_view(self):
+        self.portion(self.pearl, '2BHK', 5500, 'VACANT')
+        self.portion(self.sadd, '2BHK', 7000)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('property:portion_search'), {'status': 'UNLISTED', 'format': 'json'})
+        data = response.json()
+        self.assertEqual((data['total'], len(data['results'])), (1, 1))
+        self.assertEqual(data['results'][0]['price'], 7000)
+        response = self.client.get(reverse('property:portion_search'), {'price_min': 5000})
+        self.assertContains(response, '<b>2</b> Portions.', html=False)
+
+
+class FullTextSearchTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='realtor', password='testpass123')
+        Profile.objects.create(user=self.user, username='realtor', is_realtor=True)
+        self.building = Property_data.objects.create(
+            user=self.user, title='Pearl Tower', client_code='T1', property_code='P1', landmark='Porto Arabia')
+
+    def portion(self, description, **fields):
+        return Portions.objects.create(property_data=self.building, user=self.user, price=5000,
+                                       unit_no=Portions.objects.count(), description=description, **fields)
+
+    def found(self, text):
+        return [hit.portion_id for hit in search_portions(text)]
+
+    def test_index_follows_saves_and_deletes(self):
+        flat = self.portion('Bright flat with a sea view')
+        studio = self.portion('Studio near the metro', furnished_extra_info='Sea facing balcony')
+        self.assertEqual(self.found('sea'), [flat.id, studio.id])  # description outranks notes
+        self.assertEqual(sorted(self.found('porto')), [flat.id, studio.id])
+
+        studio.description = 'Studio near the mall'
+        studio.save()
+        self.building.landmark = 'Al Sadd'
+        self.building.save()
+        self.assertEqual(self.found('metro'), [])
+        self.assertEqual(self.found('porto'), [])
+        self.assertEqual(len(self.found('sadd')), 2)
+
+        flat.delete()
+        Portions.objects.bulk_create([
+            Portions(property_data=self.building, user=self.user, unit_no=unit_no, price=5000,
+                     description='Sea view penthouse') for unit_no in (50, 51)])
+        self.assertEqual(len(self.found('penthouse sea')), 2)
+        Portions.objects.filter(unit_no__gte=50).delete()
+        self.assertEqual(self.found('sea'), [studio.id])
+
+    @skipUnless(connection.vendor == 'sqlite', 'the FTS5 table is SQLite only')
+    def test_fts_rows_are_keyed_by_portion_id(self):
+        flat = self.portion('Bright flat with a sea view')
+        engine = SQLiteEngine('default')
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE {engine.table}')
+            cursor.execute(f'CREATE VIRTUAL TABLE {engine.table} USING fts5(portion_id UNINDEXED, heading, body, extra)')
+            engine.create()  # the unkeyed layout is replaced and refilled
+            self.assertEqual(self.found('sea'), [flat.id])
+            cursor.execute(f'EXPLAIN QUERY PLAN DELETE FROM {engine.table} WHERE rowid IN (%s)', [flat.id])
+            self.assertIn('INDEX 0:=', cursor.fetchall()[-1][-1])  # a rowid lookup, not a full scan
+        index_portions([flat.id])
+        index_portions([flat.id])
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT rowid FROM {engine.table}')
+            self.assertEqual(cursor.fetchall(), [(flat.id,)])
+
+    def test_arabic_is_matched_however_it_is_written(self):
+        portion = self.portion('شقّة واسعة بإطلالة بحرية قريبة من المترو')
+        self.assertEqual(self.found('شقه'), [portion.id])
+        self.assertEqual(self.found('اطلالة'), [portion.id])
+        self.assertEqual(self.found('المترو'), [portion.id])
+
+    def test_snippets_highlight_and_escape(self):
+        self.portion('<b>Sea</b> view "special" OR NOT')
+        hit, = search_portions('sea "special" OR')
+        self.assertIn('&lt;b&gt;<mark>Sea</mark>&lt;/b&gt;', hit.snippet)
+
+    def test_text_search_view(self):
+        portion = self.portion('Bright flat with a sea view')
+        self.client.force_login(self.user)
+        data = self.client.get(reverse('property:portion_text_search'), {'q': 'sea', 'format': 'json'}).json()
+        self.assertEqual([result['id'] for result in data['results']], [portion.id])
+        self.assertIn('<mark>sea</mark>', data['results'][0]['snippet'])
+        response = self.client.get(reverse('property:portion_text_search'), {'q': 'sea'})
+        self.assertContains(response, '<mark>sea</mark>')
+
+    def test_admin_search_uses_the_index(self):
+        flat = self.portion('Bright flat with a sea view')
+        other = self.portion('Studio near the metro')
+        admin_user = User.objects.create_superuser(username='admin', password='testpass123')
+        self.client.force_login(admin_user)
+        url = reverse('admin:property_portions_changelist')
+        for term, expected in (('sea', flat), (str(other.unit_no), other)):
+            response = self.client.get(url, {'q': term})
+            self.assertEqual(list(response.context['cl'].result_list), [expected], term)
+
+
+class NearPropertiesTests(TestCase):
+    # around Doha: (km north, km east) of the search point
+    OFFSETS = ((0.2, 0.1), (-1.5, 0.8), (3.0, -2.5), (0.0, 7.0), (-12.0, 4.0), (40.0, 10.0), (-90.0, -60.0))
+    LAT, LNG = 25.2854, 51.5310
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='realtor', password='testpass123')
+        Profile.objects.create(user=self.user, username='realtor', is_realtor=True)
+        self.vacant = []
+        for number, (north, east) in enumerate(self.OFFSETS):
+            building = self.building(latitude=self.LAT + north / 111.2, longitude=self.LNG + east / 100.9,
+                                     zone_no=number + 1)
+            self.vacant.append(self.portion(building, 'VACANT'))
+            self.portion(building, 'OCCUPIED')
+
+    def building(self, **fields):
+        return Property_data.objects.create(user=self.user, client_code='C', property_code='P', **fields)
+
+    def portion(self, building, status):
+        return Portions.objects.create(property_data=building, user=self.user, price=5000,
+                                       unit_no=Portions.objects.count(), current_status=status)
+
+    def by_distance(self, portions):
+        return sorted(portions, key=lambda portion: distance_km(
+            self.LAT, self.LNG, portion.property_data.latitude, portion.property_data.longitude))
+
+    def test_nearest_and_within_match_a_full_scan(self):
+        expected = self.by_distance(self.vacant)
+        for limit in (1, 3, 5, 7, 50):
+            found = nearest_portions(self.LAT, self.LNG, limit)
+            self.assertEqual([portion for _, portion in found], expected[:limit], limit)
+            self.assertEqual([distance for distance, _ in found], sorted(distance for distance, _ in found))
+        within = portions_within(self.LAT, self.LNG, 10)
+        self.assertEqual([portion for _, portion in within], expected[:4])
+        self.assertTrue(all(distance <= 10 for distance, _ in within))
+        occupied = nearest_portions(self.LAT, self.LNG, 2, statuses=('OCCUPIED',))
+        self.assertTrue(all(portion.current_status == 'OCCUPIED' for _, portion in occupied))
+        self.assertEqual(len(occupied), 2)
+
+    def test_buildings_without_coordinates_are_placed(self):
+        Zone_names.objects.create(zone_no=38, zone_name='Al Sadd', latitude=25.28, longitude=51.49)
+        self.building(zone_no=38, street_no=5, latitude=25.2861, longitude=51.5012)
+        self.building(zone_no=38, street_no=5, latitude=25.2863, longitude=51.5016)
+        on_street = self.building(zone_no=38, street_no=5)
+        in_zone = self.building(zone_no=38, street_no=9)
+        unknown = self.building(zone_no=99, street_no=1)
+        self.assertEqual(on_street.location_source, 'STREET')
+        self.assertAlmostEqual(on_street.latitude, 25.2862)
+        self.assertEqual((in_zone.location_source, in_zone.latitude), ('ZONE', 25.28))
+        self.assertEqual((unknown.location_source, unknown.geo_cell), ('', None))
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as centroids:
+            centroids.write('zone_no,latitude,longitude,zone_name\n99,25.30,51.45,Ras Abu Aboud\n')
+        call_command('geocode_buildings', centroids=centroids.name, stdout=StringIO())
+        unknown.refresh_from_db()
+        self.assertEqual((unknown.location_source, unknown.latitude), ('ZONE', 25.30))
+        self.assertIsNotNone(unknown.geo_cell)
+        self.assertEqual(Zone_names.objects.get(zone_no=99).zone_name, 'Ras Abu Aboud')
+
+        docs_version = api_docs.current_version()
+        with open(centroids.name, 'w') as renamed:
+            renamed.write('38,25.28,51.49,Al Sadd North\n')  # an existing zone, updated in place
+        call_command('geocode_buildings', centroids=centroids.name, stdout=StringIO())
+        self.assertNotEqual(api_docs.current_version(), docs_version)
+        self.assertEqual(zones.zone_name(38), 'Al Sadd North')
+
+        # captured coordinates, as PropertyForm marks them, replace derived ones and stay when the street changes
+        in_zone.latitude, in_zone.longitude, in_zone.location_source = 25.2901, 51.4955, 'CAPTURED'
+        in_zone.save()
+        in_zone.street_no = 5
+        in_zone.save()
+        in_zone.refresh_from_db()
+        self.assertEqual((in_zone.location_source, in_zone.latitude), ('CAPTURED', 25.2901))
+
+    def test_near_properties_view(self):
+        self.client.force_login(self.user)
+        url = reverse('realtor:realtor_near_properties')
+        origin = self.vacant[0].property_data
+        data = self.client.get(url, {'property': origin.id, 'k': 3, 'format': 'json'}).json()
+        self.assertEqual([result['id'] for result in data['results']],
+                         [portion.id for portion in self.by_distance(self.vacant)[:3]])
+        self.assertEqual(data['results'][0]['distance_km'], 0)
+        data = self.client.get(url, {'lat': self.LAT, 'lng': self.LNG, 'radius_km': 2,
+                                     'status': 'OCCUPIED', 'format': 'json'}).json()
+        self.assertEqual(len(data['results']), 2)
+        self.assertEqual(self.client.get(url, {'lat': 'x', 'format': 'json'}).json()['results'], [])
+        response = self.client.get(url, {'lat': self.LAT, 'lng': self.LNG})
+        self.assertContains(response, 'Near this building', count=len(self.vacant))
+
+
+class ZoneNameTests(TestCase):
+
+    def setUp(self):
+        Zone_names.objects.create(zone_no=38, zone_name='Al Sadd')
+        Zone_names.objects.create(zone_no=55, zone_name='Al Waab')
+        zones.bump_version()
+
+    def render(self, source, **context):
+        return Template('{% load zone_tags %}' + source).render(Context(context))
+
+    def test_names_are_read_once_and_reloaded_on_change(self):
+        zones.zone_names()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.render('{{ 38|zone_name }}/{{ 38|zone_label }}/{{ 7|zone_label }}/{{ x|zone_name }}',
+                                         x='abc'), 'Al Sadd/38 · Al Sadd/7/')
+        zone = Zone_names.objects.get(zone_no=38)
+        zone.zone_name = 'Al Sadd North'
+        zone.save()
+        self.assertEqual(zones.zone_name(38), 'Al Sadd North')
+        zone.delete()
+        self.assertEqual(zones.zone_name(38), '')
+
+    def test_other_processes_see_a_change_after_checking_the_version(self):
+        zones.zone_names()
+        Zone_names.objects.filter(zone_no=55).update(zone_name='Al Waab City')  # no receivers run
+        zones._zones.version = 0  # as if another process had saved since this one loaded
+        self.assertEqual(zones.zone_name(55), 'Al Waab')  # within VERSION_CHECK_SECONDS
+        self.assertEqual(zones.zone_names(recheck=True)[55], 'Al Waab City')
+
+    def test_annotation_and_facet_labels(self):
+        user = User.objects.create_user(username='realtor', password='testpass123')
+        building = Property_data.objects.create(user=user, zone_no=38, client_code='C', property_code='P')
+        portion = Portions.objects.create(property_data=building, user=user, price=5000, current_status='VACANT')
+        self.assertEqual(Portions.objects.with_zone_name().get(id=portion.id).zone_name, 'Al Sadd')
+        _, facets = PortionSearch(QueryDict('')).facets()
+        zone_facet = next(facet for facet in facets if facet['name'] == 'zone_no')
+        self.assertEqual([value['label'] for value in zone_facet['values']], ['38 · Al Sadd'])
+
+
+class InventoryCountTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='realtor', password='testpass123')
+        Profile.objects.create(user=self.user, username='realtor', is_realtor=True)
+        self.building = Property_data.objects.create(user=self.user, zone_no=38, client_code='C', property_code='P')
+        other = Property_data.objects.create(user=self.user, zone_no=55, client_code='D', property_code='Q')
+        with self.captureOnCommitCallbacks(execute=True):
+            for building, status in ((self.building, 'VACANT'), (self.building, 'VACANT'), (other, 'VACANT_SOON'),
+                                     (other, 'BOOKED'), (other, 'OCCUPIED')):
+                self.portion(building, status)
+
+    def portion(self, building, status):
+        portion = Portions.objects.create(property_data=building, user=self.user, price=5000,
+                                          unit_no=Portions.objects.count())
+        Portions_status.objects.create(portions=portion, status=status, vacant_date=timezone.localdate())
+        return portion
+
+    def inquire(self):
+        return Inquire.objects.create(name='Tenant', date_from=timezone.now(), duration=12, price_from=3000,
+                                      price_to=6000, notes='')
+
+    def test_counts_by_status_and_zone(self):
+        counts = inventory_counts()
+        self.assertEqual((counts['status']['VACANT'], counts['status']['VACANT_SOON'], counts['status']['BOOKED']),
+                         (2, 1, 1))
+        self.assertEqual(counts['total'], 5)
+        self.assertEqual(counts['zones'], [
+            {'zone_no': 38, 'VACANT': 2, 'VACANT_SOON': 0, 'BOOKED': 0},
+            {'zone_no': 55, 'VACANT': 0, 'VACANT_SOON': 1, 'BOOKED': 1},
+        ])
+        self.assertEqual(counts['inquiries_today'], 0)
+
+    def test_counts_are_cached_until_the_inventory_changes(self):
+        inventory_counts()
+        with self.assertNumQueries(0):
+            inventory_counts()
+        with self.captureOnCommitCallbacks(execute=True):
+            vacant = self.portion(self.building, 'VACANT')
+        self.assertEqual(inventory_counts()['status']['VACANT'], 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            Portions_status.objects.create(portions=vacant, status='BOOKED', vacant_date=timezone.localdate())
+        self.assertEqual(inventory_counts()['zones'][0], {'zone_no': 38, 'VACANT': 2, 'VACANT_SOON': 0, 'BOOKED': 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.inquire()
+        self.assertEqual(inventory_counts()['inquiries_today'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            vacant.delete()
+        self.assertEqual(inventory_counts()['status']['BOOKED'], 1)
+
+    def test_dashboard_cost_does_not_grow_with_the_inventory(self):
+        self.client.force_login(self.user)
+        url = reverse('realtor:dashboard')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as before:
+            response = self.client.get(url)
+        self.assertContains(response, 'New Inquiries Today')
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(10):
+                self.portion(self.building, 'VACANT')
+                self.inquire()
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as after:
+            response = self.client.get(url)
+        self.assertEqual(len(after), len(before))
+        self.assertEqual(response.context['counts']['status']['VACANT'], 12)
+        self.assertEqual(len(response.context['new_vacants']), 4)
+
+    def test_vacant_and_booked_lists(self):
+        self.client.force_login(self.user)
+        data = self.client.get(reverse('realtor:realtor_vacant_portions'), {'format': 'json'}).json()
+        self.assertEqual({result['current_status'] for result in data['results']}, {'VACANT'})
+        self.assertEqual(len(data['results']), 2)
+        data = self.client.get(reverse('realtor:realtor_booked_properties'), {'format': 'json'}).json()
+        self.assertEqual(len(data['results']), 1)
+        self.assertContains(self.client.get(reverse('realtor:realtor_reports')), 'Inventory by Zone')
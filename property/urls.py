@@ -18,6 +18,8 @@ urlpatterns = [
 
 
      # portions list for realtor
+    path('search/', views.portion_search, name='portion_search'),
+    path('search/text/', views.portion_text_search, name='portion_text_search'),
     path('<int:pk>/portions_list_all/',
          views.portions_list_all, name='portions_list_all'),
     path('<int:pk>/<int:property_id>/<int:portion_id>/details/',
@@ -0,0 +1,121 @@
+import datetime
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from property import models as property_models
+
+
+# vacancy calendar ................................................................
+# VacancyWeek holds how many VACANT / VACANT_SOON portions each owner has per
+# (zone, portion_type, week the portion frees up). Status changes move one
+# portion between buckets with F() updates; the dashboards read a horizon of
+# weeks in a single indexed query instead of scanning Portions.
+
+CALENDAR_STATUSES = ('VACANT', 'VACANT_SOON')
+HORIZONS = (30, 60, 90)
+DEFAULT_HORIZON = 30
+
+KEY_FIELDS = ('user_id', 'zone_no', 'portion_type', 'status', 'week')
+# the bucket of portions without a vacant date: one fixed past Monday, so their +1 and -1
+# meet whatever day they are counted, and undated VACANT portions read as free now
+UNDATED_WEEK = datetime.date(1970, 1, 5)
+
+
+def week_start(date):
+    """Monday of the week a date falls in"""
+    return date - datetime.timedelta(days=date.weekday())
+
+
+def vacancy_key(user_id, zone_no, portion_type, status, vacant_date):
+    """Calendar bucket of one portion, or None when its status is not on the calendar"""
+    if status not in CALENDAR_STATUSES:
+        return None
+    return (user_id, zone_no, portion_type, status, week_start(vacant_date) if vacant_date else UNDATED_WEEK)
+
+
+def portion_key(portion_id):
+    row = property_models.Portions.objects.filter(id=portion_id).values(
+        'user_id', 'property_data__zone_no', 'portion_type', 'current_status', 'current_vacant_date').first()
+    if row is None:
+        return None
+    return vacancy_key(row['user_id'], row['property_data__zone_no'], row['portion_type'],
+                       row['current_status'], row['current_vacant_date'])
+
+
+def apply_vacancy_deltas(deltas):
+    """Apply {key: delta} to VacancyWeek, creating and dropping buckets as needed"""
+    deltas = {key: delta for key, delta in deltas.items() if key is not None and delta}
+    if not deltas:
+        return
+    with transaction.atomic():
+        property_models.VacancyWeek.objects.bulk_create([
+            property_models.VacancyWeek(**dict(zip(KEY_FIELDS, key)), count=0)
+            for key, delta in deltas.items() if delta > 0
+        ], ignore_conflicts=True)
+        for key, delta in deltas.items():
+            bucket = property_models.VacancyWeek.objects.filter(**dict(zip(KEY_FIELDS, key)))
+            bucket.update(count=F('count') + delta)
+            if delta < 0:
+                bucket.filter(count__lte=0).delete()
+
+
+def move_portion(old_key, new_key):
+    if old_key != new_key:
+        apply_vacancy_deltas({old_key: -1, new_key: 1})
+
+
+def rebuild_vacancy_calendar(user_ids=None):
+    """Recreate VacancyWeek from Portions, for everyone or for the given owners"""
+    portions = property_models.Portions.objects.filter(current_status__in=CALENDAR_STATUSES)
+    buckets = property_models.VacancyWeek.objects.all()
+    if user_ids is not None:
+        portions = portions.filter(user_id__in=user_ids)
+        buckets = buckets.filter(user_id__in=user_ids)
+    rows = (portions.order_by()
+            .values('user_id', 'property_data__zone_no', 'portion_type', 'current_status', 'current_vacant_date')
+            .annotate(total=Count('id')))
+    counts = Counter()
+    for row in rows:
+        counts[vacancy_key(row['user_id'], row['property_data__zone_no'], row['portion_type'],
+                           row['current_status'], row['current_vacant_date'])] += row['total']
+    with transaction.atomic():
+        buckets.delete()
+        property_models.VacancyWeek.objects.bulk_create([
+            property_models.VacancyWeek(**dict(zip(KEY_FIELDS, key)), count=total)
+            for key, total in counts.items()
+        ], batch_size=1000)
+    return len(counts)
+
+
+def horizon_days(request):
+    """?days=30|60|90, anything else falls back to DEFAULT_HORIZON"""
+    try:
+        days = int(request.GET.get('days', DEFAULT_HORIZON))
+    except ValueError:
+        return DEFAULT_HORIZON
+    return days if days in HORIZONS else DEFAULT_HORIZON
+
+
+def vacancy_timeline(status, days, user=None):
+    """
+    Portions per (week, zone, portion_type) freeing up within the horizon.
+    VACANT rows include every past week too, since those portions are free now,
+    and VACANT portions without a date first, under week None.
+    """
+    today = timezone.localdate()
+    weeks = property_models.VacancyWeek.objects.filter(
+        status=status, week__lte=today + datetime.timedelta(days=days))
+    if status == 'VACANT_SOON':
+        weeks = weeks.filter(week__gte=week_start(today))
+    if user is not None:
+        weeks = weeks.filter(user=user)
+    rows = list(weeks.values('week', 'zone_no', 'portion_type')
+                .annotate(total=Sum('count'))
+                .order_by('week', 'zone_no', 'portion_type'))
+    for row in rows:
+        if row['week'] == UNDATED_WEEK:
+            row['week'] = None
+    return rows
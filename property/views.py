@@ -1,47 +1,53 @@
 import datetime
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib.auth.decorators import login_required
-from django.contrib.auth.models import User
-from django.db.models import Count, Q
+from django.db.models import Q
+from accounts.roles import role_required
 from property import forms as property_forms
 from property import models as property_models
+from property.pagination import (INQUIRE_JSON_FIELDS, PORTION_JSON_FIELDS, PROPERTY_JSON_FIELDS,
+                                 akeyset_paginate, keyset_paginate, wants_json)
+from property.fulltext import search_portions
+from property.search import PortionSearch
 from PIL import Image
 from django.contrib import messages
 from dateutil.relativedelta import relativedelta
 # Create your views here.
 
+# templates read request.user and lazy relations, so async views render in a thread
+arender = sync_to_async(render)
 
-# propertiess for realtor*********************************************************************
+business_required = role_required('is_business', 'You are not authorized to access Property Dashboard.')
+realtor_required = role_required('is_realtor', 'This page is restricted to realtors only.',
+                                 redirect_to='webpages:home')
 
 
-@login_required(login_url='account_login')
-def property_all(request):
-    if User:
-        pk = request.user.id
-        properties = property_models.Property_data.objects.all()
-        print(properties)
-        portions_count = properties.annotate(number_of_portions=Count('portions')).values('id', 'number_of_portions')
-        print('portions_count')
-        print(portions_count)
-        portions_status = property_models.Portions.objects.all().annotate(status=Count('portions_status')).values('id', 'status')
-        print('portions_status')
-        print(portions_status)
+# propertiess for realtor*********************************************************************
 
 
+@realtor_required
+async def property_all(request):
+    # portion cards read the denormalized Portions.current_status, so one prefetch covers them
+    properties = await akeyset_paginate(
+        request, property_models.Property_data.objects.prefetch_related('portions'))
+    if wants_json(request):
+        return properties.json_response(PROPERTY_JSON_FIELDS)
 
-        
-        context = {
-            'properties': properties,
-            'portions_count': portions_count,
-        }
-        return render(request,  'property/property_all.html', context)
-    return render(request, "property/")
+    context = {
+        'properties': properties,
+    }
+    return await arender(request,  'property/property_all.html', context)
 
 
 # propertiess *********************************************************************
-@ login_required(login_url='account_login')
+@business_required
 def property_own(request, pk):
-    property_own = property_models.Property_data.objects.filter(user_id=pk)
+    property_own = keyset_paginate(
+        request, property_models.Property_data.objects.filter(user_id=pk).prefetch_related('portions'))
+    if wants_json(request):
+        return property_own.json_response(PROPERTY_JSON_FIELDS)
 
     context = {
         'property_own': property_own,
@@ -51,7 +57,7 @@ def property_own(request, pk):
 
 
 
-@ login_required(login_url='account_login')
+@business_required
 def property_plus_portion_create(request, pk):
     property_form = property_forms.PropertyForm()
     portion_form = property_forms.PortionsForm()
@@ -83,7 +89,9 @@ def property_plus_portion_create(request, pk):
 def portions_list_all(request, pk):
     pk = pk
     user_id = request.user.id
-    portions_list_all = property_models.Portions.objects.all()
+    portions_list_all = keyset_paginate(request, property_models.Portions.objects.for_listing())
+    if wants_json(request):
+        return portions_list_all.json_response(PORTION_JSON_FIELDS)
 
     context = {
         'portions': portions_list_all,
@@ -93,12 +101,59 @@ def portions_list_all(request, pk):
     return render(request, 'property/portions_list_all.html', context)
 
 
+@realtor_required
+def portion_search(request):
+    # facet counts come from PortionFacet and PortionFacetCell, see property.search
+    search = PortionSearch(request.GET)
+    portions = keyset_paginate(request, search.portions().select_related('property_data'))
+    total, facets = search.facets()
+    if wants_json(request):
+        return portions.json_response(PORTION_JSON_FIELDS, total=total, facets=[{
+            'name': facet['name'],
+            'title': facet['title'],
+            'values': [{key: value[key] for key in ('value', 'label', 'count', 'selected')}
+                       for value in facet['values']],
+        } for facet in facets])
+
+    context = {
+        'portions': portions,
+        'total': total,
+        'facets': facets,
+        'query': search.query_string(),
+    }
+    return render(request, 'property/portion_search.html', context)
+
+
+@realtor_required
+def portion_text_search(request):
+    # ranked hits and snippets come from the full-text index, see property.fulltext
+    text = request.GET.get('q', '').strip()
+    hits = search_portions(text)
+    portions = property_models.Portions.objects.select_related('property_data').in_bulk(
+        [hit.portion_id for hit in hits])
+    results = [(portions[hit.portion_id], hit) for hit in hits if hit.portion_id in portions]
+    if wants_json(request):
+        return JsonResponse({'q': text, 'results': [
+            {**{field: getattr(portion, field) for field in PORTION_JSON_FIELDS},
+             'rank': hit.rank, 'snippet': hit.snippet}
+            for portion, hit in results
+        ]})
+
+    context = {
+        'q': text,
+        'results': results,
+    }
+    return render(request, 'property/portion_text_search.html', context)
+
+
 @ login_required(login_url='account_login')
 def portions_of_property(request, pk, property_id):
     pk = pk
     user_id = request.user.id
-    portions_of_property = property_models.Portions.objects.filter(
-        Q(property_data_id=property_id) & Q(user_id=pk))
+    portions_of_property = keyset_paginate(request, property_models.Portions.objects.for_listing().filter(
+        Q(property_data_id=property_id) & Q(user_id=pk)))
+    if wants_json(request):
+        return portions_of_property.json_response(PORTION_JSON_FIELDS)
 
     context = {
         'portions': portions_of_property,
@@ -109,11 +164,12 @@ def portions_of_property(request, pk, property_id):
     return render(request, 'property/portions_of_property.html', context)
 
 
-@ login_required(login_url='account_login')
+@business_required
 def portions_own_properties(request, pk):
     user_id = request.user.id
-    portion_all = property_models.Portions.objects.all().filter(user_id=pk)
-    print(portion_all)
+    portion_all = keyset_paginate(request, property_models.Portions.objects.for_listing().filter(user_id=pk))
+    if wants_json(request):
+        return portion_all.json_response(PORTION_JSON_FIELDS)
 
 
     context = {
@@ -126,11 +182,8 @@ def portions_own_properties(request, pk):
 @ login_required(login_url='account_login')
 def portion_single_details(request, pk, property_id, portion_id):
     pk = request.user.id
-    print(pk)
 
-    print(portion_id)
-    portion = property_models.Portions.objects.get(id=portion_id)
-    print(portion)
+    portion = property_models.Portions.objects.for_listing().get(id=portion_id)
 
     context = {
         'portion': portion
@@ -139,16 +192,15 @@ def portion_single_details(request, pk, property_id, portion_id):
 
 
 
-@login_required(login_url='account_login')
+@business_required
 def portion_status_list(request, pk, property_id):
 
     building = property_models.Property_data.objects.get(id=property_id)
 
-    print(pk)
-    print(property_id)
-    portion_all = property_models.Portions.objects.filter(
-        Q(property_data_id=property_id) & Q(user_id=pk)).all()
-    print(portion_all)
+    portion_all = keyset_paginate(request, property_models.Portions.objects.for_listing().filter(
+        Q(property_data_id=property_id) & Q(user_id=pk)))
+    if wants_json(request):
+        return portion_all.json_response(PORTION_JSON_FIELDS)
 
     context = {
         'portion_all': portion_all,
@@ -159,7 +211,7 @@ def portion_status_list(request, pk, property_id):
      
     return render(request, 'property/portion_status_list.html', context )
 
-@login_required(login_url='account_login')
+@business_required
 def vacant_status_update(request, portion_id):
     pk = request.user.id
     # Get the parent Portions instance to link and to get property_id
@@ -209,22 +261,20 @@ def inquire_create(request):
         form = property_forms.InquireForm(request.POST)
         if form.is_valid():
             form = form.save(commit=False)
-            print(form)
             form.save()
-            return redirect('property:property_all')
+            messages.success(request, 'Thank you, we have received your inquiry.')
+            # property_all is for realtors; the public form returns to a public page
+            return redirect('webpages:services')
     context = {'form': form}
     return render(request, 'property/inquire_add.html', context)
 
 
-@login_required(login_url='account_login')
-def inquire_lists(request):
-    pk = request.user.id
-    inquires = property_models.Inquire.objects.all()
-    if not request.user.profile.is_realtor:
-        print('not realtor')
-        messages.info(request, 'Access to the inquiries list is restricted to realtors only.')
-        return redirect('webpages:home')
+@realtor_required
+async def inquire_lists(request):
+    inquires = await akeyset_paginate(request, property_models.Inquire.objects.all())
+    if wants_json(request):
+        return inquires.json_response(INQUIRE_JSON_FIELDS)
     data = {
         'inquires': inquires,
     }
-    return render(request,  'property/inquire_lists.html', data)
+    return await arender(request,  'property/inquire_lists.html', data)
@@ -0,0 +1,76 @@
+import re
+import time
+
+from django.core.cache import cache
+
+from property import models as property_models
+
+
+# zone names ......................................................................
+# Buildings store a bare zone_no; Zone_names maps numbers to names. The map is
+# read once per process into a dict and reused until the version in the shared
+# cache moves, which saving or deleting a Zone_names row does (property.signals).
+# Lookups compare that version at most every VERSION_CHECK_SECONDS, so a page
+# naming fifty zones reads the cache once at most; the process that saved the
+# row drops its dict at once. Templates use the zone_name / zone_label filters,
+# querysets that sort or filter by name the Zone_names subquery in models.
+
+VERSION_KEY = 'property:zone-names-version'
+VERSION_CHECK_SECONDS = 5
+
+_zones = None  # ZoneNames of this process
+
+
+class ZoneNames:
+
+    def __init__(self, version):
+        self.version = version
+        self.checked = time.monotonic()
+        rows = property_models.Zone_names.objects.order_by('-id').values_list('zone_no', 'zone_name')
+        # where a number is named twice the first row wins, as in zone_name_of()
+        self.names = {zone_no: zone_name.strip() for zone_no, zone_name in rows if zone_name.strip()}
+
+
+def current_version():
+    return cache.get_or_set(VERSION_KEY, time.time(), None)
+
+
+def bump_version():
+    global _zones
+    _zones = None
+    cache.set(VERSION_KEY, time.time(), None)
+
+
+def zone_names(recheck=False):
+    """{zone_no: zone_name}; recheck=True compares the shared version now, for builds cached by version"""
+    global _zones
+    if _zones is None or recheck or time.monotonic() - _zones.checked >= VERSION_CHECK_SECONDS:
+        version = current_version()
+        if _zones is None or _zones.version != version:
+            _zones = ZoneNames(version)
+        _zones.checked = time.monotonic()
+    return _zones.names
+
+
+def zone_name(zone_no):
+    """The zone's name, or '' for numbers Zone_names does not name"""
+    try:
+        return zone_names().get(int(zone_no), '')
+    except (TypeError, ValueError):
+        return ''
+
+
+def zone_label(zone_no):
+    """'38 · Al Sadd', or just '38' for an unnamed zone"""
+    name = zone_name(zone_no)
+    return f'{zone_no} · {name}' if name else str(zone_no)
+
+
+def name_key(name):
+    return re.sub(r'[\s\-_]+', ' ', name).strip().lower()
+
+
+def zones_named(name, recheck=False):
+    """Zone numbers Zone_names gives this name, ignoring case and spacing"""
+    key = name_key(name)
+    return sorted(zone_no for zone_no, zone_name in zone_names(recheck).items() if name_key(zone_name) == key)
@@ -12,6 +12,7 @@ urlpatterns = [
     path('vacants/', realtor_views.vacants, name='realtor_vacants'),
     path('booked-properties/', realtor_views.booked_properties, name='realtor_booked_properties'),
     path('inquiries/', realtor_views.inquiries, name='realtor_inquiries'),
+    path('inquiries/<int:inquiry_id>/matches/', realtor_views.inquiry_matches, name='realtor_inquiry_matches'),
     path('tenant-calls/', realtor_views.tenant_calls, name='realtor_tenant_calls'),
     path('visit-requests/', realtor_views.visit_requests, name='realtor_visit_requests'),
     path('followups/', realtor_views.followups, name='realtor_followups'),
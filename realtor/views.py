@@ -1,70 +1,153 @@
-from django.shortcuts import render
-from django.contrib.auth.decorators import login_required
-
-@login_required
+from django.db.models import Prefetch
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404, render
+from django.utils import timezone
+from accounts.roles import role_required
+from property import models as property_models
+from property.geo import nearest_portions, portions_within, search_options, search_point
+from property.inventory import inventory_counts
+from property.pagination import PORTION_JSON_FIELDS, keyset_paginate, wants_json
+from property.vacancy import HORIZONS, horizon_days, vacancy_timeline
+
+realtor_required = role_required('is_realtor', 'You are not authorized to access Realtor Dashboard.')
+
+DASHBOARD_CARDS = 4  # inquiries and portions listed per dashboard section
+
+@realtor_required
 def dashboard(request):
-    return render(request, 'realtor/dashboard.html')
-
-@login_required
+    # counters come cached from property.inventory; each list below is a short index range
+    portions = property_models.Portions.objects.select_related('property_data')
+    data = {
+        'counts': inventory_counts(),
+        'today': timezone.localdate(),
+        'inquiries': property_models.Inquire.objects.order_by('-date_created', '-id')[:DASHBOARD_CARDS],
+        'new_vacants': portions.with_status('VACANT').order_by('-date_created', '-id')[:DASHBOARD_CARDS],
+        'vacant_soon': portions.with_status('VACANT_SOON').filter(
+            current_vacant_date__gte=timezone.localdate()).order_by('current_vacant_date', 'id')[:DASHBOARD_CARDS],
+    }
+    return render(request, 'realtor/dashboard.html', data)
+
+@realtor_required
 def near_properties(request):
-    return render(request, 'realtor/near_properties.html')
-
-@login_required
+    # ?property=<id> or ?lat=&lng=, nearest first; ?radius_km= for everything within it, see property.geo
+    point = search_point(request)
+    statuses, limit, radius_km = search_options(request)
+    results = []
+    if point is not None:
+        latitude, longitude, _ = point
+        if radius_km is None:
+            results = nearest_portions(latitude, longitude, limit, statuses)
+        else:
+            results = portions_within(latitude, longitude, radius_km, statuses, limit)
+    if wants_json(request):
+        return JsonResponse({
+            'point': point and {'latitude': point[0], 'longitude': point[1], 'property': point[2] and point[2].id},
+            'results': [{
+                **{field: getattr(portion, field) for field in PORTION_JSON_FIELDS},
+                'distance_km': distance,
+                'zone_no': portion.property_data.zone_no,
+                'zone_name': portion.zone_name,
+                'latitude': portion.property_data.latitude,
+                'longitude': portion.property_data.longitude,
+                'location_source': portion.property_data.location_source,
+            } for distance, portion in results],
+        })
+    context = {
+        'point': point,
+        'results': results,
+        'statuses': statuses,
+        'limit': limit,
+        'radius_km': radius_km,
+        'status_choices': property_models.PORTION_STATUS_CHOICES,
+    }
+    return render(request, 'realtor/near_properties.html', context)
+
+@realtor_required
 def vacant_portions(request):
-    return render(request, 'realtor/vacant_portions.html')
+    portions = keyset_paginate(request, property_models.Portions.objects.for_listing().with_status('VACANT'))
+    if wants_json(request):
+        return portions.json_response(PORTION_JSON_FIELDS)
+    return render(request, 'realtor/vacant_portions.html', {'portions': portions})
 
-@login_required
+@realtor_required
 def vacant_soon(request):
-    return render(request, 'realtor/vacant_soon.html')
+    days = horizon_days(request)
+    data = {'timeline': vacancy_timeline('VACANT_SOON', days), 'days': days, 'horizons': HORIZONS}
+    return render(request, 'realtor/vacant_soon.html', data)
 
-@login_required
+@realtor_required
 def vacants(request):
-    return render(request, 'realtor/vacants.html')
+    days = horizon_days(request)
+    data = {'timeline': vacancy_timeline('VACANT', days), 'days': days, 'horizons': HORIZONS}
+    return render(request, 'realtor/vacants.html', data)
 
-@login_required
+@realtor_required
 def booked_properties(request):
-    return render(request, 'realtor/booked_properties.html')
+    portions = keyset_paginate(request, property_models.Portions.objects.for_listing().with_status('BOOKED'))
+    if wants_json(request):
+        return portions.json_response(PORTION_JSON_FIELDS)
+    return render(request, 'realtor/booked_properties.html', {'portions': portions})
 
-@login_required
+@realtor_required
 def inquiries(request):
-    return render(request, 'realtor/inquiries.html')
-
-@login_required
+    # matches are precomputed by property.matching, so each card is a prefetch away
+    matches = property_models.InquiryMatch.objects.select_related('portion__property_data')
+    inquires = keyset_paginate(
+        request, property_models.Inquire.objects.prefetch_related(Prefetch('matches', queryset=matches)))
+    return render(request, 'realtor/inquiries.html', {'inquires': inquires})
+
+@realtor_required
+def inquiry_matches(request, inquiry_id):
+    inquiry = get_object_or_404(property_models.Inquire, id=inquiry_id)
+    matches = inquiry.matches.select_related('portion__property_data')
+    if wants_json(request):
+        return JsonResponse({'inquiry': inquiry.id, 'results': [{
+            'portion_id': match.portion_id,
+            'score': match.score,
+            'price': match.portion.price,
+            'portion_type': match.portion.portion_type,
+            'furnished_type': match.portion.furnished_type,
+            'current_status': match.portion.current_status,
+            'current_vacant_date': match.portion.current_vacant_date,
+            'zone_no': match.portion.property_data.zone_no,
+        } for match in matches]})
+    return render(request, 'realtor/inquiry_matches.html', {'inquiry': inquiry, 'matches': matches})
+
+@realtor_required
 def tenant_calls(request):
     return render(request, 'realtor/tenant_calls.html')
 
-@login_required
+@realtor_required
 def visit_requests(request):
     return render(request, 'realtor/visit_requests.html')
 
-@login_required
+@realtor_required
 def followups(request):
     return render(request, 'realtor/followups.html')
 
-@login_required
+@realtor_required
 def tenant_docs(request):
     return render(request, 'realtor/tenant_docs.html')
 
-@login_required
+@realtor_required
 def deals_reports(request):
     return render(request, 'realtor/deals_reports.html')
 
-@login_required
+@realtor_required
 def pending_requests(request):
     return render(request, 'realtor/pending_requests.html')
 
-@login_required
+@realtor_required
 def reports(request):
-    return render(request, 'realtor/reports.html')
+    counts = inventory_counts()
+    if wants_json(request):
+        return JsonResponse(counts)
+    return render(request, 'realtor/reports.html', {'counts': counts})
 
-@login_required
+@realtor_required
 def contacts(request):
     return render(request, 'realtor/contacts.html')
 
-@login_required
+@realtor_required
 def services_list(request):
     return render(request, 'realtor/services_list.html')
-
-@login_required
-def dashboard(request):
-    return render(request, 'realtor/dashboard.html')
\ No newline at end of file
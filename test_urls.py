@@ -2,27 +2,87 @@
 """
 URL Testing Script for Yellow Key AMRC
 Tests all URLs for 404, 500, and other errors
+
+With --benchmark it seeds a synthetic dataset and measures latency percentiles
+and query counts per URL name instead, writes them as JSON and fails when a
+view regressed against a saved baseline:
+
+    python test_urls.py --benchmark --size 1k --output bench.json
+    python test_urls.py --benchmark --size 1k --baseline bench.json
+
+The dataset goes into a throwaway SQLite file (yk-bench.sqlite3 in the temp
+directory, or the one given with --sqlite); it is seeded once and topped up
+on later runs. --use-configured-db seeds the configured database instead (e.g.
+a local Postgres DB_NAME=yk_bench), and only when that database is empty.
 """
 
+import argparse
+import datetime
+import json
 import os
+import platform
+import random
+import statistics
 import sys
+import tempfile
+import time
 import django
 
+SIZES = {'1k': 1_000, '100k': 100_000, '1m': 1_000_000}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--benchmark', action='store_true', help='Measure latency and queries instead of status codes')
+    parser.add_argument('--size', choices=SIZES, default='1k', help='Synthetic portions to seed')
+    parser.add_argument('--requests', type=int, default=20, help='Timed requests per URL')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help='Earlier --output to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed p95 slowdown against the baseline (0.25 = 25%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                        help='Ignore p95 changes smaller than this, they are noise')
+    database = parser.add_mutually_exclusive_group()
+    database.add_argument('--sqlite', help='Run against this SQLite file instead of the configured database')
+    database.add_argument('--use-configured-db', action='store_true',
+                          help='Seed the configured database, which must be empty, instead of a SQLite file')
+    args = parser.parse_args(argv)
+    if args.benchmark and not args.use_configured_db and not args.sqlite:
+        # never seed up to a million rows into whatever DATABASES points at by accident
+        args.sqlite = os.path.join(tempfile.gettempdir(), 'yk-bench.sqlite3')
+    return args
+
+
+# the defaults when imported, e.g. by `manage.py test` discovery, whose own arguments these are not
+ARGS = parse_args() if __name__ == '__main__' else parse_args([])
+
 # Setup Django environment
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yk.settings')
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from django.conf import settings
+if ARGS.sqlite:
+    settings.DATABASES['default'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ARGS.sqlite}
 django.setup()
 
 # Add testserver to ALLOWED_HOSTS
-from django.conf import settings
 if 'testserver' not in settings.ALLOWED_HOSTS:
     settings.ALLOWED_HOSTS.append('testserver')
 
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import Client
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from accounts.models import Profile, Roles
-from property.models import Property_data, Zone_names, Portions, Portions_status
-from django.urls import reverse
+from property.models import (Inquire, Property_data, Zone_names, Portions, Portions_status,
+                             portion_count_suspended, recount_portion_counts)
+from property.fulltext import rebuild_text_index
+from property.geo import grid_cell
+from property.search import rebuild_portion_facets
+from property.vacancy import rebuild_vacancy_calendar
+from django.urls import Resolver404, resolve, reverse
 
 User = get_user_model()
 
@@ -142,15 +202,9 @@ class URLTester:
             })
             return 'ERROR'
 
-    def test_all_urls(self):
-        """Test all URLs from all apps"""
-
-        print("\n" + "="*80)
-        print("TESTING ALL URLS")
-        print("="*80 + "\n")
-
+    def url_groups(self):
+        """(label, requires_auth, [(url, name), ...]) for every URL we check"""
         # PUBLIC URLS (No authentication required)
-        print("Testing PUBLIC URLs...")
         public_urls = [
             ('/', 'home'),
             ('/about/', 'about'),
@@ -167,12 +221,7 @@ class URLTester:
             ('/api/health/', 'api_health'),
         ]
 
-        for url, name in public_urls:
-            status = self.test_url(url, name, requires_auth=False)
-            print(f"  {status} - {url} ({name})")
-
         # AUTHENTICATED URLS
-        print("\nTesting AUTHENTICATED URLs...")
         auth_urls = [
             # Accounts (mounted at root, not /accounts/)
             ('/profile/', 'profile'),
@@ -182,6 +231,13 @@ class URLTester:
             ('/property/', 'property_all'),
             (f'/property/{self.user.id}/', 'property_own'),
             ('/property/inquire/lists/', 'inquire_lists'),
+            ('/property/search/', 'portion_search'),
+            ('/property/search/?status=VACANT', 'portion_search_facet'),
+            ('/property/search/?portion_type=2BHK&zone_no=38', 'portion_search_facets'),
+            ('/property/search/?furnished_type=Furnished&price=4000&price=5000', 'portion_search_bands'),
+            ('/property/search/?furnished_type=Furnished&price_min=4000&price_max=9000', 'portion_search_range'),
+            ('/property/search/text/?q=sea+view', 'portion_text_search'),
+            ('/property/search/text/?q=%D9%85%D8%AA%D8%B1%D9%88', 'portion_text_search_arabic'),
 
             # Clients
             ('/clients/dashboard/', 'clients_dashboard'),
@@ -189,12 +245,18 @@ class URLTester:
             ('/clients/dashboard/property/own/', 'property_own_list'),
             ('/clients/dashboard/property/add/', 'property_create'),
             ('/clients/dashboard/portions/', 'portions_all_list'),
+            ('/clients/dashboard/portions/vacant-soon/', 'portions_vacant_soon'),
+            ('/clients/dashboard/portions/vacants/', 'portions_vacants'),
             (f'/clients/dashboard/{self.property.id}/portions/', 'portions_a_building'),
 
             # Realtor
             ('/realtor/', 'realtor_dashboard'),
+            ('/realtor/near-properties/?lat=25.2854&lng=51.5310', 'realtor_near_properties'),
+            ('/realtor/near-properties/?lat=25.2854&lng=51.5310&radius_km=3', 'realtor_near_properties_radius'),
             ('/realtor/vacant-portions/', 'realtor_vacant_portions'),
             ('/realtor/vacants/', 'realtor_vacants'),
+            ('/realtor/booked-properties/', 'realtor_booked_properties'),
+            ('/realtor/reports/', 'realtor_reports'),
             ('/realtor/inquiries/', 'realtor_inquiries'),
             ('/realtor/contacts/', 'realtor_contacts'),
 
@@ -211,12 +273,7 @@ class URLTester:
             ('/dashboard/', 'choose_dashboard'),
         ]
 
-        for url, name in auth_urls:
-            status = self.test_url(url, name, requires_auth=True)
-            print(f"  {status} - {url} ({name})")
-
         # PARAMETRIC URLS (URLs with dynamic parameters)
-        print("\nTesting PARAMETRIC URLs...")
         parametric_urls = [
             # Property with IDs
             (f'/property/{self.user.id}/{self.property.id}/all/', 'portions_of_property'),
@@ -228,9 +285,24 @@ class URLTester:
             (f'/clients/dashboard/portions/{self.portion.id}/update/', 'portions_update'),
         ]
 
-        for url, name in parametric_urls:
-            status = self.test_url(url, name, requires_auth=True)
-            print(f"  {status} - {url} ({name})")
+        return [
+            ('PUBLIC', False, public_urls),
+            ('AUTHENTICATED', True, auth_urls),
+            ('PARAMETRIC', True, parametric_urls),
+        ]
+
+    def test_all_urls(self):
+        """Test all URLs from all apps"""
+
+        print("\n" + "="*80)
+        print("TESTING ALL URLS")
+        print("="*80 + "\n")
+
+        for label, requires_auth, urls in self.url_groups():
+            print(f"\nTesting {label} URLs...")
+            for url, name in urls:
+                status = self.test_url(url, name, requires_auth=requires_auth)
+                print(f"  {status} - {url} ({name})")
 
     def print_summary(self):
         """Print test results summary"""
@@ -312,6 +384,200 @@ class URLTester:
 
         print(f"\n[OK] Detailed report saved to: {report_path}")
 
+class Benchmark(URLTester):
+    """Seed a synthetic dataset, then time every URL and count its queries"""
+
+    PORTIONS_PER_BUILDING = 200
+    BATCH_SIZE = 5000
+    DESCRIPTIONS = (
+        'Spacious flat with sea view and covered parking',
+        'Near Al Sadd metro, walking distance to the mall',
+        'Quiet compound villa with private garden and pool',
+        'Renovated studio close to schools and supermarkets',
+        'شقة واسعة بإطلالة بحرية قريبة من محطة المترو',
+        '',
+    )
+
+    def __init__(self, size, requests):
+        self.size = size
+        self.requests = requests
+        super().__init__()
+        self.client = Client(raise_request_exception=False)  # a 500 is a result, not a crash
+
+    def setup_test_data(self):
+        if ARGS.sqlite:
+            call_command('migrate', run_syncdb=True, verbosity=0)
+        super().setup_test_data()
+        # every role, so dashboards render instead of redirecting
+        Profile.objects.filter(user=self.user).update(is_business=True, is_realtor=True, is_workman=True)
+        self.seed(SIZES[self.size])
+
+    def seed(self, total):
+        """Top the benchmark user up to `total` portions; reruns reuse what is there"""
+        existing = Portions.objects.filter(user=self.user).count()
+        if existing >= total:
+            print(f"[OK] Dataset ready: {existing} portions")
+            return
+        print(f"Seeding {total - existing} portions...")
+        rng = random.Random(total)  # same dataset for the same size
+        portion_types = [choice for choice, _ in Portions.PORTION_CHOICES]
+        furnished = [choice for choice, _ in Portions.CHOICES]
+        statuses = ['VACANT', 'VACANT_SOON', 'OCCUPIED', '']
+        today = datetime.date.today()
+
+        buildings = []
+        token = portion_count_suspended.set(True)
+        try:
+            created = existing
+            while created < total:
+                size = min(self.BATCH_SIZE, total - created)
+                batch_buildings = Property_data.objects.bulk_create([
+                    Property_data(user=self.user, title=f'Bench {created + i}', client_code=f'B{created + i}',
+                                  property_code=f'B{created + i}', landmark='Bench', zone_no=rng.randint(1, 98),
+                                  location_source='CAPTURED', **self.location(created + i))
+                    for i in range(0, size, self.PORTIONS_PER_BUILDING)
+                ])
+                buildings += batch_buildings
+                portions = []
+                for i in range(size):
+                    status = rng.choice(statuses)
+                    portions.append(Portions(
+                        property_data=batch_buildings[i // self.PORTIONS_PER_BUILDING],
+                        user=self.user, unit_no=(created + i) % self.PORTIONS_PER_BUILDING,
+                        price=rng.randint(1500, 25000), portion_type=rng.choice(portion_types),
+                        furnished_type=rng.choice(furnished), current_status=status,
+                        description=self.DESCRIPTIONS[(created + i) % len(self.DESCRIPTIONS)],
+                        current_vacant_date=today + datetime.timedelta(days=rng.randint(-30, 120)) if status else None))
+                portions = Portions.objects.bulk_create(portions, batch_size=self.BATCH_SIZE)
+                Portions_status.objects.bulk_create([
+                    Portions_status(portions=portion, status=portion.current_status,
+                                    vacant_date=portion.current_vacant_date)
+                    for portion in portions if portion.current_status
+                ], batch_size=self.BATCH_SIZE)
+                Inquire.objects.bulk_create([
+                    Inquire(name=f'Bench {created + i}', date_from=datetime.datetime.now(datetime.timezone.utc),
+                            duration=12, price_from=rng.randint(1500, 10000), price_to=rng.randint(10000, 25000),
+                            property_type=rng.choice(portion_types[:3]), notes='bench')
+                    for i in range(size // 100)
+                ])
+                created += size
+                print(f"  seeded {created}/{total}")
+        finally:
+            portion_count_suspended.reset(token)
+        recount_portion_counts({building.id for building in buildings})
+        rebuild_vacancy_calendar([self.user.id])
+        rebuild_portion_facets()
+        rebuild_text_index()
+        if connection.vendor in ('postgresql', 'sqlite'):
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+    @staticmethod
+    def location(n):
+        """Spread buildings evenly over a 33 x 30 km box around Doha, without drawing from rng"""
+        latitude = 25.15 + (n * 0.6180339887 % 1) * 0.3
+        longitude = 51.35 + (n * 0.4142135624 % 1) * 0.3
+        return {'latitude': latitude, 'longitude': longitude, 'geo_cell': grid_cell(latitude, longitude)}
+
+    def measure(self, url, requires_auth):
+        self.client.logout()
+        if requires_auth:
+            self.client.force_login(self.user)
+        cache.clear()
+        status = self.client.get(url).status_code  # warm up: imports, template loading, page cache
+        timings, queries = [], []
+        for _ in range(self.requests):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = self.client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(captured))
+            status = response.status_code
+        quantiles = statistics.quantiles(timings, n=100) if len(timings) > 1 else timings * 99
+        return {
+            'url': url,
+            'status': status,
+            'p50_ms': round(quantiles[49], 3),
+            'p95_ms': round(quantiles[94], 3),
+            'p99_ms': round(quantiles[98], 3),
+            'mean_ms': round(statistics.fmean(timings), 3),
+            'queries': max(queries),
+        }
+
+    def run(self):
+        results = {}
+        for label, requires_auth, urls in self.url_groups():
+            for url, name in urls:
+                path, _, query = url.partition('?')
+                try:
+                    key = resolve(path).view_name + (f'?{query}' if query else '')
+                except Resolver404:
+                    key = name
+                results[key] = self.measure(url, requires_auth)
+                result = results[key]
+                print(f"  {result['status']} {key:<45} p50 {result['p50_ms']:>8.2f} ms  "
+                      f"p95 {result['p95_ms']:>8.2f} ms  {result['queries']:>4} queries")
+        return {
+            'meta': {
+                'size': self.size,
+                'portions': Portions.objects.filter(user=self.user).count(),
+                'database': connection.vendor,
+                'requests': self.requests,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            },
+            'urls': results,
+        }
+
+
+def regressions(current, baseline, threshold, min_delta_ms):
+    """Views that got slower than threshold allows, or now make more queries"""
+    found = []
+    if current['meta']['size'] != baseline['meta']['size']:
+        print(f"[!] Baseline was seeded with {baseline['meta']['size']}, this run with {current['meta']['size']}")
+    for key, result in current['urls'].items():
+        before = baseline['urls'].get(key)
+        if before is None:
+            continue
+        if result['queries'] > before['queries']:
+            found.append(f"{key}: {before['queries']} -> {result['queries']} queries")
+        delta = result['p95_ms'] - before['p95_ms']
+        if delta > min_delta_ms and result['p95_ms'] > before['p95_ms'] * (1 + threshold):
+            found.append(f"{key}: p95 {before['p95_ms']:.2f} -> {result['p95_ms']:.2f} ms")
+        if result['status'] >= 500 > before['status']:
+            found.append(f"{key}: now returns {result['status']}")
+    return found
+
+
+def benchmark():
+    print("="*80)
+    print(f"YELLOW KEY AMRC - BENCHMARK ({ARGS.size} portions, {ARGS.requests} requests per URL)")
+    print("="*80)
+
+    if ARGS.use_configured_db and (User.objects.exists() or Property_data.objects.exists()):
+        print(f"[XX] {settings.DATABASES['default']['NAME']} already has data; --use-configured-db "
+              f"only seeds an empty database. Create a fresh one or leave the flag off for SQLite.")
+        return 2
+
+    results = Benchmark(ARGS.size, ARGS.requests).run()
+    with open(ARGS.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"\n[OK] Results saved to: {ARGS.output}")
+
+    if ARGS.baseline:
+        with open(ARGS.baseline) as f:
+            baseline = json.load(f)
+        found = regressions(results, baseline, ARGS.threshold, ARGS.min_delta_ms)
+        if found:
+            print(f"\n[XX] {len(found)} regressions against {ARGS.baseline}:")
+            for line in found:
+                print(f"  - {line}")
+            return 1
+        print(f"[OK] No regressions against {ARGS.baseline}")
+    return 0
+
+
 def main():
     print("="*80)
     print("YELLOW KEY AMRC - URL TESTING TOOL")
@@ -325,4 +591,6 @@ def main():
     print("\nURL testing complete!")
 
 if __name__ == '__main__':
+    if ARGS.benchmark:
+        sys.exit(benchmark())
     main()
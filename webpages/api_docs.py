@@ -0,0 +1,330 @@
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+from django.utils.http import http_date
+
+from property import zones
+
+
+# /api/docs/ document ................................................................
+# Built and serialized once per process, then reused until the version in the
+# shared cache moves (a deploy clears it, Zone_names changes bump it). Requests
+# only compare the precomputed ETag or write the precomputed bytes.
+
+VERSION_KEY = 'webpages:api-docs-version'
+CACHE_CONTROL = 'public, max-age=3600'
+
+# areas always listed, with the zone number Zone_names gives the same name
+AREAS = (
+    ("Doha", "city"),
+    ("The Pearl Qatar", "district"),
+    ("West Bay", "district"),
+    ("Lusail", "city"),
+    ("Al Sadd", "district"),
+    ("Al Waab", "district"),
+    ("Al Rayyan", "district"),
+    ("Al Wakrah", "city"),
+    ("Bin Mahmood", "district"),
+    ("Old Airport", "district"),
+    ("Musherib", "district"),
+    ("Mansoura", "district"),
+    ("Ain Khaled", "district"),
+    ("Al Gharrafa", "district"),
+    ("Abu Hamour", "district"),
+    ("Al Thumama", "district"),
+)
+
+
+class Document:
+
+    def __init__(self, version):
+        self.version = version
+        self.body = json.dumps(build_documentation(), separators=(',', ':')).encode()
+        self.etag = '"%s"' % hashlib.sha256(self.body).hexdigest()[:32]
+        # the version is the time of the last change, identical across processes sharing the cache
+        self.last_modified = int(version)
+
+    def set_headers(self, response):
+        response['ETag'] = self.etag
+        response['Last-Modified'] = http_date(self.last_modified)
+        response['Cache-Control'] = CACHE_CONTROL
+        return response
+
+
+_document = None
+
+
+def current_version():
+    return cache.get_or_set(VERSION_KEY, time.time(), None)
+
+
+def bump_version():
+    cache.set(VERSION_KEY, time.time(), None)
+
+
+def current_document():
+    global _document
+    version = current_version()
+    if _document is None or _document.version != version:
+        _document = Document(version)
+    return _document
+
+
+def areas_served():
+    """AREAS with their zone numbers, then every other zone Zone_names names"""
+    numbers = {}
+    for zone_no, zone_name in sorted(zones.zone_names(recheck=True).items()):
+        numbers.setdefault(zones.name_key(zone_name), (zone_name, zone_no))
+    areas = []
+    for name, area_type in AREAS:
+        _, zone_no = numbers.pop(zones.name_key(name), (name, None))
+        areas.append({"name": name, "zone_number": zone_no, "type": area_type})
+    areas += [{"name": zone_name, "zone_number": zone_no, "type": "zone"}
+              for zone_name, zone_no in sorted(numbers.values(), key=lambda zone: zone[1])]
+    return areas
+
+
+def build_documentation():
+    return {
+        "api_version": "1.0",
+        "last_updated": "2025-01-07",
+        "platform": {
+            "name": "Yellowkey",
+            "full_name": "Yellowkey Holdings",
+            "website": "https://www.yellowkey.qa",
+            "description": "Qatar's complete real estate platform connecting property holders with management services, realtors with collaboration tools, and workmen with verified jobs",
+            "tagline": "All-in-One Real Estate Platform in Qatar",
+            "established": "2024",
+            "country": "Qatar"
+        },
+        "contact": {
+            "phone": "+974-33430001",
+            "email": "info@yellowkey.qa",
+            "support_email": "support@yellowkey.qa",
+            "address": {
+                "street": "534 alsadd",
+                "city": "Doha",
+                "region": "Doha",
+                "postal_code": "00000",
+                "country": "Qatar",
+                "country_code": "QA"
+            },
+            "location": {
+                "latitude": 25.276987,
+                "longitude": 51.520008
+            },
+            "social_media": {
+                "facebook": "https://www.facebook.com/yellowkey.qa",
+                "twitter": "https://www.twitter.com/yellowkey.qa",
+                "instagram": "https://www.instagram.com/yellowkey.qa"
+            },
+            "business_hours": {
+                "days": ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday"],
+                "opening_time": "07:00",
+                "closing_time": "17:00",
+                "timezone": "Asia/Qatar"
+            }
+        },
+        "platform_features": {
+            "user_roles": [
+                {
+                    "role": "property_holder",
+                    "name": "Property Holder / Landlord",
+                    "dashboard_url": "/clients/dashboard/",
+                    "description": "Property owners and landlords managing their real estate",
+                    "capabilities": [
+                        "Add and manage properties",
+                        "Manage multiple units per property",
+                        "Track tenant information",
+                        "Collect rent",
+                        "Request maintenance services",
+                        "View property analytics",
+                        "Upload property photos"
+                    ]
+                },
+                {
+                    "role": "realtor",
+                    "name": "Realtor / Real Estate Agent",
+                    "dashboard_url": "/realtor/dashboard/",
+                    "description": "Real estate agents and brokers",
+                    "capabilities": [
+                        "View vacant properties",
+                        "Access vacant soon listings",
+                        "Manage property inquiries",
+                        "Share leads with other agents",
+                        "Join agent community",
+                        "List properties for clients"
+                    ],
+                    "verification_required": True
+                },
+                {
+                    "role": "workman",
+                    "name": "Workman / Service Provider",
+                    "dashboard_url": "/workman/dashboard/",
+                    "description": "Maintenance workers and service providers",
+                    "capabilities": [
+                        "View service job listings",
+                        "Accept maintenance requests",
+                        "Location-based job matching",
+                        "Track service history",
+                        "Receive payments",
+                        "Build service team"
+                    ]
+                }
+            ],
+            "multi_role_support": True,
+            "authentication": {
+                "methods": ["email_password", "google_oauth"],
+                "email_verification_required": True,
+                "password_reset_available": True
+            }
+        },
+        "services": [
+            {
+                "id": "property_management",
+                "name": "Property Management Services",
+                "category": "For Property Holders",
+                "description": "Comprehensive property management solutions for landlords in Qatar",
+                "features": [
+                    "Property Management",
+                    "Tenant Relations",
+                    "Rent Collection",
+                    "Property Photography",
+                    "Property Maintenance Coordination"
+                ],
+                "url": "https://www.yellowkey.qa/property-services/",
+                "target_users": "Property holders and landlords",
+                "pricing_model": "Contact for details"
+            },
+            {
+                "id": "realtor_services",
+                "name": "Realtor Collaboration Platform",
+                "category": "For Realtors",
+                "description": "Tools and network for real estate agents in Qatar",
+                "features": [
+                    "Vacant Property Listings",
+                    "Vacant Soon Property Alerts",
+                    "Multiple Property Management",
+                    "Shared Property Enquiries",
+                    "Trusted Agents Community Network"
+                ],
+                "url": "https://www.yellowkey.qa/realtor-services/",
+                "target_users": "Real estate agents and realtors",
+                "pricing_model": "Subscription based"
+            },
+            {
+                "id": "workman_services",
+                "name": "Maintenance Services Platform",
+                "category": "For Service Providers",
+                "description": "Job platform for property maintenance professionals",
+                "features": [
+                    "Service Job Listings",
+                    "Direct Tenant Requests",
+                    "Secure Payment Collections",
+                    "Location-Based Job Matching",
+                    "Team Building Tools"
+                ],
+                "url": "https://www.yellowkey.qa/workman-services/",
+                "target_users": "Workmen, plumbers, electricians, cleaners",
+                "pricing_model": "Commission per job"
+            }
+        ],
+        "property_types_supported": [
+            "STUDIO",
+            "1BHK",
+            "2BHK",
+            "3BHK",
+            "4BHK",
+            "5BHK",
+            "5+BHK",
+            "VILLA",
+            "APARTMENT",
+            "OFFICE",
+            "SHOP",
+            "STORAGE",
+            "BACHELOR_BEDSPACE",
+            "SINGLE_ROOM",
+            "CAMPSITE"
+        ],
+        "areas_served": areas_served(),
+        "community_features": {
+            "whatsapp_groups": {
+                "available": True,
+                "categories": ["property_holders", "realtors", "workmen", "general"],
+                "description": "Join community groups for networking and opportunities",
+                "url": "https://www.yellowkey.qa/whatsapp_group/"
+            },
+            "careers": {
+                "job_categories": [
+                    "management",
+                    "accounting",
+                    "medical",
+                    "services",
+                    "technology",
+                    "maintenance"
+                ],
+                "url": "https://www.yellowkey.qa/careers/"
+            }
+        },
+        "technology": {
+            "framework": "Django",
+            "database": "PostgreSQL",
+            "frontend": "Bootstrap 5",
+            "authentication": "Django Allauth",
+            "languages_supported": ["English", "Arabic"],
+            "mobile_responsive": True
+        },
+        "api_endpoints": {
+            "documentation": {
+                "url": "/api/docs/",
+                "method": "GET",
+                "format": "JSON",
+                "description": "This endpoint - provides platform information"
+            },
+            "health_check": {
+                "url": "/api/health/",
+                "method": "GET",
+                "format": "JSON",
+                "description": "System health status"
+            },
+            "future_endpoints": {
+                "properties_list": "/api/properties/ (coming soon)",
+                "vacant_properties": "/api/properties/vacant/ (coming soon)",
+                "inquiries": "/api/inquiries/ (coming soon)",
+                "jobs": "/api/jobs/ (coming soon)"
+            }
+        },
+        "integration_guide": {
+            "description": "This API provides public information about Yellowkey platform for third-party integrations",
+            "use_cases": [
+                "Display Yellowkey services on partner websites",
+                "Integrate service areas into mapping applications",
+                "Link to specific dashboards for user onboarding",
+                "Embed property type information",
+                "Show available community groups"
+            ],
+            "data_format": "JSON",
+            "authentication": "None required for public endpoints",
+            "rate_limit": {
+                "requests_per_hour": 100,
+                "requests_per_day": 1000
+            },
+            "cors": "Enabled for approved domains",
+            "caching": "Recommended - data updates daily"
+        },
+        "support": {
+            "documentation_url": "https://www.yellowkey.qa/help/",
+            "contact_support": "support@yellowkey.qa",
+            "business_inquiries": "info@yellowkey.qa",
+            "report_issue": "Contact support team",
+            "api_questions": "developers@yellowkey.qa"
+        },
+        "legal": {
+            "terms_of_service": "https://www.yellowkey.qa/terms/",
+            "privacy_policy": "https://www.yellowkey.qa/privacy/",
+            "data_protection": "GDPR compliant",
+            "jurisdiction": "Qatar"
+        }
+    }
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class WebpagesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'webpages'
+
+    def ready(self):
+        from webpages import signals  # noqa: F401
@@ -0,0 +1,71 @@
+import re
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+
+# anonymous page cache ............................................................
+# Marketing pages are rendered once per version and served from the cache to
+# anonymous GETs. The CSRF token is swapped for a placeholder before storing and
+# a fresh token is put back on every hit, so cached forms still post. None of
+# these pages reads the query string, so only bare URLs are cached: a request
+# with one (?utm_source=, ?x=random) renders without touching the cache, and
+# cannot fill it with one copy of a page per made-up parameter.
+
+VERSION_KEY = 'webpages:page-version'
+CSRF_PLACEHOLDER = '__webpages_csrf_token__'
+CSRF_INPUT = re.compile(rb'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+def page_version():
+    return cache.get_or_set(VERSION_KEY, 1, None)
+
+
+def bump_page_version():
+    """Invalidate every cached page at once; old entries simply expire"""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, None)
+
+
+def page_cache_key(request):
+    return f'webpages:page:{page_version()}:{request.get_host()}:{request.path}'
+
+
+def cacheable(request):
+    return (
+        settings.PAGE_CACHE_TIMEOUT
+        and request.method in ('GET', 'HEAD')
+        and not request.META.get('QUERY_STRING')
+        and not request.user.is_authenticated
+        and not len(get_messages(request))
+    )
+
+
+def cache_anonymous_page(view):
+    """Serve anonymous GETs of a view from the cache, injecting the CSRF token after the lookup"""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not cacheable(request):
+            return view(request, *args, **kwargs)
+
+        key = page_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            token = get_token(request).encode()
+            return HttpResponse(content.replace(CSRF_PLACEHOLDER.encode(), token), content_type=content_type)
+
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming and not response.cookies:
+            content = CSRF_INPUT.sub(rb'\g<1>' + CSRF_PLACEHOLDER.encode() + rb'\g<2>', response.content)
+            cache.set(key, (content, response['Content-Type']), settings.PAGE_CACHE_TIMEOUT)
+        return response
+
+    return wrapper
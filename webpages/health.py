@@ -0,0 +1,128 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import connections
+
+
+# health probes ..................................................................
+# Readiness runs one probe per dependency in parallel, each bounded by
+# HEALTH_PROBE_TIMEOUT. The report is kept per process for HEALTH_CACHE_TTL and
+# only one request at a time refreshes it, so load balancer polling cannot pile
+# probes onto a struggling database. Liveness never touches a dependency.
+
+OPERATIONAL = 'operational'
+DOWN = 'down'
+SKIPPED = 'skipped'
+
+
+def probe_database():
+    # runs in a worker thread, which opens its own connection: close it afterwards
+    try:
+        with connections['default'].cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+    finally:
+        connections['default'].close()
+
+
+def probe_cache():
+    # django-redis ignores connection errors, so a failed round trip reads back None
+    key, token = 'health:probe', uuid.uuid4().hex
+    cache.set(key, token, 10)
+    if cache.get(key) != token:
+        raise RuntimeError('cache round trip failed')
+
+
+def probe_storage():
+    default_storage.exists('')
+
+
+def probe_task_queue():
+    from yk import celery_app
+
+    if celery_app is None or not settings.CELERY_BROKER_URL:
+        return SKIPPED  # tasks run inline
+    with celery_app.connection_for_write() as connection:
+        connection.ensure_connection(max_retries=1, timeout=probe_timeout())
+
+
+PROBES = {
+    'database': probe_database,
+    'cache': probe_cache,
+    'storage': probe_storage,
+    'task_queue': probe_task_queue,
+}
+
+
+def probe_timeout():
+    return getattr(settings, 'HEALTH_PROBE_TIMEOUT', 2.0)
+
+
+def timed(probe):
+    started = time.perf_counter()
+    try:
+        status, error = probe() or OPERATIONAL, None
+    except Exception as exc:
+        status, error = DOWN, f'{type(exc).__name__}: {exc}'
+    result = {'status': status, 'latency_ms': round((time.perf_counter() - started) * 1000, 2)}
+    if error:
+        result['error'] = error
+    return result
+
+
+def run_probes(probes=PROBES):
+    timeout = probe_timeout()
+    executor = ThreadPoolExecutor(max_workers=len(probes), thread_name_prefix='health')
+    futures = {name: executor.submit(timed, probe) for name, probe in probes.items()}
+    wait(futures.values(), timeout=timeout)
+    # a probe stuck past the timeout is reported down and left to finish in the background
+    executor.shutdown(wait=False, cancel_futures=True)
+    return {
+        name: future.result() if future.done() else {
+            'status': DOWN, 'latency_ms': round(timeout * 1000, 2), 'error': 'timed out'}
+        for name, future in futures.items()
+    }
+
+
+_lock = threading.Lock()  # guards the three below, never held while probing
+_report = None
+_checked_at = 0.0
+_refreshing = False
+
+
+def readiness():
+    """
+    (ready, services, age in seconds) from the per-process cached report. One
+    caller refreshes a stale report while the others answer with it; only
+    without any report do callers wait, each on probes of their own.
+    """
+    global _report, _checked_at, _refreshing
+    ttl = getattr(settings, 'HEALTH_CACHE_TTL', 5)
+    with _lock:
+        services, checked_at = _report, _checked_at
+        refresh = services is None or (time.monotonic() - checked_at >= ttl and not _refreshing)
+        if refresh:
+            _refreshing = True
+    if refresh:
+        fresh = None
+        try:
+            fresh = run_probes()
+        finally:
+            with _lock:
+                _refreshing = False
+                if fresh is not None:
+                    _report = services = fresh
+                    _checked_at = checked_at = time.monotonic()
+    ready = all(result['status'] != DOWN for result in services.values())
+    return ready, services, round(time.monotonic() - checked_at, 2)
+
+
+def reset():
+    global _report
+    with _lock:
+        _report = None
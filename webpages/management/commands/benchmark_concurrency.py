@@ -0,0 +1,48 @@
+import statistics
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ('Load test running servers with many concurrent users, e.g. the same dashboards under '
+            'gunicorn yk.wsgi and uvicorn yk.asgi. Pass a logged-in sessionid for dashboard urls.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help='Absolute urls, e.g. http://127.0.0.1:8000/clients/dashboard/')
+        parser.add_argument('--users', type=int, default=500, help='Concurrent users')
+        parser.add_argument('--requests', type=int, default=4, help='Requests per user and url')
+        parser.add_argument('--sessionid', default='', help='Session cookie of a business user')
+        parser.add_argument('--timeout', type=float, default=30.0)
+
+    def handle(self, *args, **options):
+        headers = {'Cookie': f'sessionid={options["sessionid"]}'} if options['sessionid'] else {}
+        self.stdout.write(f'{"url":<50}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"errors":>8}')
+        for url in options['urls']:
+            request = urllib.request.Request(url, headers=headers)
+            total = options['users'] * options['requests']
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['users']) as pool:
+                results = list(pool.map(lambda _: self.fetch(request, options['timeout']), range(total)))
+            elapsed = time.perf_counter() - started
+
+            timings = sorted(duration for ok, duration in results if ok)
+            errors = total - len(timings)
+            if len(timings) < 2:
+                self.stdout.write(f'{url:<50}{"-":>9}{"-":>9}{"-":>9}{"-":>9}{errors:>8}')
+                continue
+            p50, p95, p99 = (statistics.quantiles(timings, n=100)[i] * 1000 for i in (49, 94, 98))
+            self.stdout.write(f'{url:<50}{total / elapsed:>9.0f}{p50:>9.1f}{p95:>9.1f}{p99:>9.1f}{errors:>8}')
+
+    def fetch(self, request, timeout):
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                response.read()
+                ok = response.status == 200
+        except (urllib.error.URLError, OSError):
+            ok = False
+        return ok, time.perf_counter() - started
@@ -0,0 +1,55 @@
+import copy
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = ('Per-request database cost of a fresh connection versus the configured '
+            'persistent connections or pool (CONN_MAX_AGE / DB_POOL)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        alias, total = options['database'], options['requests']
+        configured = connections[alias]
+        mode = 'pool' if configured.settings_dict['OPTIONS'].get('pool') else (
+            f'CONN_MAX_AGE={configured.settings_dict["CONN_MAX_AGE"]}')
+
+        # a second wrapper with the same server but no reuse: connect, query, close every request
+        fresh = connections.create_connection(alias)
+        fresh.settings_dict = copy.deepcopy(fresh.settings_dict)
+        fresh.settings_dict['OPTIONS'].pop('pool', None)
+        fresh.settings_dict['CONN_MAX_AGE'] = 0
+
+        self.stdout.write(f'{"mode":<24}{"p50 ms":>10}{"p95 ms":>10}{"req/s":>10}')
+        self.report('new connection', self.measure(fresh, total, reuse=False))
+        self.report(mode, self.measure(configured, total, reuse=True))
+        fresh.close()
+
+    def measure(self, connection, total, reuse):
+        timings = []
+        for _ in range(total):
+            started = time.perf_counter()
+            if reuse:
+                # the same signals Django sends around a real request, which close or recycle connections
+                request_started.send(sender=self.__class__)
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+            if reuse:
+                request_finished.send(sender=self.__class__)
+            else:
+                connection.close()
+            timings.append(time.perf_counter() - started)
+        return timings
+
+    def report(self, label, timings):
+        p50 = statistics.median(timings) * 1000
+        p95 = statistics.quantiles(timings, n=20)[-1] * 1000
+        self.stdout.write(f'{label:<24}{p50:>10.2f}{p95:>10.2f}{len(timings) / sum(timings):>10.0f}')
@@ -0,0 +1,42 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from webpages.cache import bump_page_version
+
+
+PAGES = ('home', 'services', 'about', 'property_services', 'realtor_services', 'workman_services',
+         'careers_list')
+
+
+class Command(BaseCommand):
+    help = 'Requests per second of the anonymous marketing pages with and without the page cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per page and mode')
+
+    def handle(self, *args, **options):
+        hosts = [host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')]
+        client = Client(HTTP_HOST=hosts[0] if hosts else 'localhost')
+        total = options['requests']
+
+        self.stdout.write(f'{"page":<20}{"uncached req/s":>16}{"cached req/s":>16}{"speedup":>10}')
+        for name in PAGES:
+            url = reverse(f'webpages:{name}')
+            with override_settings(PAGE_CACHE_TIMEOUT=0):
+                uncached = self.requests_per_second(client, url, total)
+            bump_page_version()
+            client.get(url)  # warm the cache
+            cached = self.requests_per_second(client, url, total)
+            self.stdout.write(f'{name:<20}{uncached:>16.0f}{cached:>16.0f}{cached / uncached:>9.1f}x')
+
+    def requests_per_second(self, client, url, total):
+        started = time.perf_counter()
+        for _ in range(total):
+            response = client.get(url)
+            if response.status_code != 200:
+                raise RuntimeError(f'{url} returned {response.status_code}')
+        return total / (time.perf_counter() - started)
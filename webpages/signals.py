@@ -0,0 +1,42 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from property.models import Portions, Zone_names
+
+from . import api_docs
+from .cache import bump_page_version
+from .sitemaps import invalidate_portion_sitemap, sitemap_cache_key
+from .models import GroupList, JobList
+
+
+# cached marketing pages list jobs and groups, so any change starts a new page version
+
+@receiver(post_save, sender=JobList)
+@receiver(post_delete, sender=JobList)
+@receiver(post_save, sender=GroupList)
+@receiver(post_delete, sender=GroupList)
+def invalidate_cached_pages(sender, **kwargs):
+    bump_page_version()
+
+
+@receiver(post_save, sender=JobList)
+@receiver(post_delete, sender=JobList)
+def invalidate_job_sitemap(sender, **kwargs):
+    cache.delete_many([sitemap_cache_key(), sitemap_cache_key('jobs')])
+
+
+# sitemap pages are cached per id range; bulk writes go through PortionQuerySet
+
+@receiver(post_save, sender=Portions)
+@receiver(post_delete, sender=Portions)
+def invalidate_portion_sitemap_page(sender, instance, **kwargs):
+    invalidate_portion_sitemap([instance.id])
+
+
+# /api/docs/ lists the areas served
+
+@receiver(post_save, sender=Zone_names)
+@receiver(post_delete, sender=Zone_names)
+def invalidate_api_docs(sender, **kwargs):
+    api_docs.bump_version()
@@ -1,5 +1,14 @@
+import math
+from functools import wraps
+
+from django.conf import settings
 from django.contrib.sitemaps import Sitemap
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger
+from django.db.models import Max
+from django.http import HttpResponse
 from django.urls import reverse
+from django.utils.functional import cached_property
 from webpages.models import JobList
 from property.models import Portions
 
@@ -32,18 +41,123 @@ class JobListSitemap(Sitemap):
     priority = 0.7
 
     def items(self):
-        # Assuming JobList has a field to filter for active jobs
-        return JobList.objects.all()
+        return JobList.objects.order_by('id').only('id', 'job_post_date')
+
+    def location(self, item):
+        return reverse('webpages:careers_submit', args=[item.id])
+
+    def lastmod(self, item):
+        return item.job_post_date
+
+
+# portion sitemap ................................................................
+# Section page N lists the portions with ids ((N-1)*limit, N*limit], read as
+# plain rows through the primary key, so page 1000 costs the same as page 1 and
+# no page ever counts or offsets the whole table. Pages are cached and dropped
+# one by one when a portion in their id range is saved or deleted.
+
+class IdRangePaginator:
+    """Just enough of Paginator for Sitemap: fixed id windows instead of offsets"""
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    @cached_property
+    def num_pages(self):
+        last_id = self.queryset.aggregate(last_id=Max('id'))['last_id'] or 0
+        return max(1, math.ceil(last_id / self.per_page))
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1 or number > self.num_pages:
+            raise EmptyPage('That page contains no results')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        low, high = (number - 1) * self.per_page, number * self.per_page
+        return Page(self.queryset.filter(id__gt=low, id__lte=high), number, self)
+
+
+def sitemap_page(portion_id, per_page):
+    return (portion_id - 1) // per_page + 1
 
 
 class PortionSitemap(Sitemap):
-    """Sitemap for job listings."""
+    """Sitemap for portion detail pages."""
     changefreq = "daily"
     priority = 0.7
+    limit = 10000
 
     def items(self):
-        # Assuming JobList has a field to filter for active jobs
-        return Portions.objects.all()
-    
+        return Portions.objects.order_by('id').values('id', 'user_id', 'property_data_id', 'date_updated')
+
+    @cached_property
+    def paginator(self):
+        return IdRangePaginator(self.items(), self.limit)
+
+    @cached_property
+    def location_format(self):
+        # reverse() once per page, it costs more than the rest of the row. The stand-in
+        # ids are longer than all of the route's fixed text, so only they can match below.
+        args = {'pk': 'user_id', 'property_id': 'property_data_id', 'portion_id': 'id'}
+        length = len(reverse('property:portion_single_details', kwargs=dict.fromkeys(args, 1))) + 1
+        stand_ins = {kwarg: str(digit) * length for digit, kwarg in enumerate(args, start=1)}
+        url = reverse('property:portion_single_details', kwargs=stand_ins)
+        for kwarg, field in args.items():
+            url = url.replace(stand_ins[kwarg], f'{{{field}}}')
+        return url
+
+    def location(self, item):
+        return self.location_format.format(**item)
+
+    def lastmod(self, item):
+        return item['date_updated']
+
+    def get_latest_lastmod(self):
+        return Portions.objects.aggregate(latest=Max('date_updated'))['latest']
+
+
+def sitemap_cache_key(section=None, page=1):
+    return f'sitemap:{section or "index"}:{page}'
+
+
+def invalidate_portion_sitemap(portion_ids):
+    """Drop the cached index and the section pages holding these portions"""
+    pages = {sitemap_page(portion_id, PortionSitemap.limit) for portion_id in portion_ids if portion_id}
+    cache.delete_many([sitemap_cache_key()] + [sitemap_cache_key('portions', page) for page in pages])
+
+
+def cache_sitemap(view):
+    """
+    Keep rendered sitemap XML per (section, page) for SITEMAP_CACHE_TIMEOUT seconds.
+    The <loc> URLs carry the scheme and host, so one entry holds a copy per origin
+    and invalidating a page drops them all. Pages are keyed by number, p=01 and
+    p=1&x as p=1; a p that is not a number goes to the view, which answers 404.
+    """
 
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        section = kwargs.get('section')
+        page = request.GET.get('p', '1') if section else '1'  # the index is never paged
+        if not page.isdigit():
+            return view(request, *args, **kwargs)
+        key, origin = sitemap_cache_key(section, int(page)), f'{request.scheme}://{request.get_host()}'
+        copies = cache.get(key) or {}
+        if origin in copies:
+            content, headers = copies[origin]
+            return HttpResponse(content, headers=headers)
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200:
+            response.render()
+            headers = {name: response[name] for name in ('Content-Type', 'Last-Modified', 'X-Robots-Tag')
+                       if response.has_header(name)}
+            copies[origin] = (response.content, headers)
+            cache.set(key, copies, settings.SITEMAP_CACHE_TIMEOUT)
+        return response
 
+    return wrapper
@@ -1,3 +1,297 @@
-from django.test import TestCase
+import ast
+import threading
+import time
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.urls import include, path, reverse
+
+from property.models import Portions, Property_data, Zone_names
+from webpages import api_docs, health
+from webpages.cache import CSRF_PLACEHOLDER
+from webpages.sitemaps import PortionSitemap, sitemap_cache_key
+from yk import metrics
+from webpages.models import JobList
+
+
+class AnonymousPageCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client(enforce_csrf_checks=True)
+
+    def test_hits_get_a_fresh_csrf_token_that_posts(self):
+        url = reverse('webpages:about')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertNotIn(CSRF_PLACEHOLDER, response.content.decode())
+        token = response.content.decode().split('name="csrfmiddlewaretoken" value="')[1].split('"')[0]
+        self.assertIn('csrftoken', self.client.cookies)
+
+        response = self.client.post(url, {'csrfmiddlewaretoken': token})
+        self.assertEqual(response.status_code, 302)
+
+    def test_job_changes_invalidate_careers(self):
+        url = reverse('webpages:careers_list')
+        JobList.objects.create(job_title='Leasing agent', category='services')
+        self.assertContains(self.client.get(url), 'Leasing agent')
+        JobList.objects.create(job_title='Electrician', category='maintenance')
+        self.assertContains(self.client.get(url), 'Electrician')
+
+    def test_query_strings_bypass_the_cache(self):
+        url = reverse('webpages:careers_list')
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            for query in ('?utm_source=mail', '?x=1', '?x=2'):
+                self.assertEqual(self.client.get(url + query).status_code, 200)
+        self.assertFalse([call for call in cache_set.call_args_list if call.args[0].startswith('webpages:page:')])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+    def test_signed_in_users_are_not_cached(self):
+        url = reverse('webpages:careers_list')
+        self.client.get(url)
+        user = User.objects.create_user(username='visitor', password='testpass123')
+        self.client.force_login(user)
+        with self.assertNumQueries(3):
+            self.client.get(url)
+
+
+class ApiDocumentationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('webpages:api_documentation')
+
+    def test_conditional_get(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['platform']['name'], 'Yellowkey')
+        self.assertIn('public', response['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_zone_changes_rebuild_the_document(self):
+        document = api_docs.current_document()
+        self.assertIs(api_docs.current_document(), document)
+        Zone_names.objects.create(zone_no=38, zone_name='Al Sadd')
+        self.assertIsNot(api_docs.current_document(), document)
+
+    def test_areas_served_carry_zone_numbers(self):
+        Zone_names.objects.create(zone_no=38, zone_name='al sadd')
+        Zone_names.objects.create(zone_no=69, zone_name='Al Daayen')
+        areas = self.client.get(self.url).json()['areas_served']
+        self.assertIn({'name': 'Al Sadd', 'zone_number': 38, 'type': 'district'}, areas)
+        self.assertIn({'name': 'Doha', 'zone_number': None, 'type': 'city'}, areas)
+        self.assertEqual(areas[-1], {'name': 'Al Daayen', 'zone_number': 69, 'type': 'zone'})
+
+
+class HealthCheckTests(TransactionTestCase):
+
+    def setUp(self):
+        health.reset()
+        self.addCleanup(health.reset)
+
+    def test_liveness_touches_nothing(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('webpages:api_health_live'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_readiness_probes_every_dependency(self):
+        response = self.client.get(reverse('webpages:api_health_ready'))
+        self.assertEqual(response.status_code, 200)
+        services = response.json()['services']
+        self.assertEqual(set(services), set(health.PROBES))
+        self.assertEqual(services['database']['status'], health.OPERATIONAL)
+        self.assertIn('latency_ms', services['cache'])
+
+    @override_settings(HEALTH_PROBE_TIMEOUT=0.1)
+    def test_failed_and_slow_probes_make_the_worker_unready(self):
+        def broken():
+            raise ConnectionError('refused')
+
+        with mock.patch.dict(health.PROBES, {'database': broken, 'cache': lambda: time.sleep(1)}):
+            started = time.monotonic()
+            response = self.client.get(reverse('webpages:api_health'))
+        self.assertLess(time.monotonic() - started, 0.9)
+        self.assertEqual(response.status_code, 503)
+        services = response.json()['services']
+        self.assertIn('refused', services['database']['error'])
+        self.assertEqual(services['cache']['error'], 'timed out')
+
+    def test_reports_are_reused_within_the_ttl(self):
+        with mock.patch.object(health, 'run_probes', wraps=health.run_probes) as run_probes:
+            self.client.get(reverse('webpages:api_health'))
+            self.client.get(reverse('webpages:api_health'))
+        self.assertEqual(run_probes.call_count, 1)
+
+    @override_settings(HEALTH_CACHE_TTL=0)
+    def test_a_refresh_in_progress_does_not_block_other_callers(self):
+        health.readiness()
+        release = threading.Event()
+        slow = {'database': {'status': health.DOWN, 'latency_ms': 1.0}}
+        with mock.patch.object(health, 'run_probes', side_effect=lambda: release.wait(5) and slow):
+            refreshing = threading.Thread(target=health.readiness)
+            refreshing.start()
+            time.sleep(0.05)
+            started = time.monotonic()
+            ready, services, _ = health.readiness()  # the stale report, at once
+            self.assertLess(time.monotonic() - started, 0.5)
+            self.assertEqual(services['database']['status'], health.OPERATIONAL)
+            release.set()
+            refreshing.join()
+        self.assertIs(health._report, slow)  # the refresh swapped in its report
+
+
+@mock.patch.object(PortionSitemap, 'limit', 3)
+class SitemapTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='owner', password='testpass123')
+        building = Property_data.objects.create(
+            user=self.user, title='Sitemap Tower', client_code='C1', property_code='P1', landmark='Pearl')
+        self.portions = Portions.objects.bulk_create([
+            Portions(property_data=building, user=self.user, unit_no=unit_no, price=5000)
+            for unit_no in range(7)])
+        self.page = lambda portion: (portion.id - 1) // 3 + 1
+
+    def test_index_lists_one_page_per_id_range(self):
+        content = self.client.get('/sitemap.xml').content.decode()
+        last = self.page(self.portions[-1])
+        self.assertIn(f'/sitemap-portions.xml?p={last}<', content)
+        self.assertNotIn(f'/sitemap-portions.xml?p={last + 1}<', content)
+
+    def test_pages_cost_a_fixed_number_of_queries_and_are_cached(self):
+        page = self.page(self.portions[3])
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/sitemap-portions.xml?p={page}')
+        content = response.content.decode()
+        on_page = [portion for portion in self.portions if self.page(portion) == page]
+        self.assertEqual(content.count('<url>'), len(on_page))
+        self.assertIn(self.portions[3].get_absolute_url(), content)
+        self.assertIn('<lastmod>', content)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(f'/sitemap-portions.xml?p={page}').content, response.content)
+
+    def test_deleting_a_portion_drops_its_page(self):
+        portion = self.portions[0]
+        url, location = f'/sitemap-portions.xml?p={self.page(portion)}', portion.get_absolute_url()
+        self.assertIn(location, self.client.get(url).content.decode())
+        self.client.get(url, HTTP_HOST='www.example.com', secure=True)
+        portion.delete()
+        self.assertNotIn(location, self.client.get(url).content.decode())
+        self.assertNotIn(location, self.client.get(url, HTTP_HOST='www.example.com', secure=True).content.decode())
+
+    def test_pages_are_cached_per_origin_and_page_number(self):
+        self.client.get('/sitemap-portions.xml?p=1')
+        with self.assertNumQueries(0):
+            for query in ('p=01', 'p=1&x=2'):
+                self.assertIn('<loc>http://', self.client.get(f'/sitemap-portions.xml?{query}').content.decode())
+        response = self.client.get('/sitemap-portions.xml?p=1', HTTP_HOST='www.example.com', secure=True)
+        self.assertIn('<loc>https://', response.content.decode())
+        for query in ('p=abc', 'p=-1'):
+            self.assertEqual(self.client.get(f'/sitemap-portions.xml?{query}').status_code, 404)
+        self.assertEqual(len(cache.get(sitemap_cache_key('portions', 1))), 2)
+
+    def test_locations_survive_ids_in_the_route(self):
+        detail = path('<int:pk>/<int:property_id>/<int:portion_id>/details/', lambda request: None,
+                      name='portion_single_details')
+        urls = type('urls', (), {'urlpatterns': [path('units-101-202-303/', include(([detail], 'property')))]})
+        with override_settings(ROOT_URLCONF=urls):
+            location = PortionSitemap().location({'id': 3, 'user_id': 101, 'property_data_id': 22})
+        self.assertEqual(location, '/units-101-202-303/101/22/3/details/')
+
+
+class RequestLogTests(TestCase):
+
+    def test_request_id_is_echoed_or_generated(self):
+        response = self.client.get(reverse('webpages:api_health_live'), HTTP_X_REQUEST_ID='lb-1234')
+        self.assertEqual(response['X-Request-ID'], 'lb-1234')
+        response = self.client.get(reverse('webpages:api_health_live'), HTTP_X_REQUEST_ID='bad id\n')
+        self.assertRegex(response['X-Request-ID'], r'^[0-9a-f]{32}$')
+
+    def test_requests_are_sampled(self):
+        url = reverse('webpages:api_health_live')
+        with self.settings(LOG_REQUEST_SAMPLE_RATE=1.0), self.assertLogs('yk.request', 'INFO') as logs:
+            response = self.client.get(url)
+        event = logs.records[0].msg
+        self.assertEqual((event['event'], event['path'], event['request_id']), ('request', url, response['X-Request-ID']))
+
+        with self.settings(LOG_REQUEST_SAMPLE_RATE=0.0), self.assertNoLogs('yk.request'):
+            self.client.get(url)
+
+
+class NoPrintTests(TestCase):
+    """Lint check: app code logs through yk.log, print() is for scripts only"""
+
+    APPS = ('accounts', 'clients', 'help', 'property', 'realtor', 'webpages', 'workman', 'yk')
+
+    def test_no_print_calls_in_app_code(self):
+        offenders = []
+        for app in self.APPS:
+            for path in sorted((Path(settings.BASE_DIR) / app).rglob('*.py')):
+                if 'migrations' in path.parts:
+                    continue
+                for node in ast.walk(ast.parse(path.read_text(), str(path))):
+                    if isinstance(node, ast.Call) and getattr(node.func, 'id', None) == 'print':
+                        offenders.append(f'{path.relative_to(settings.BASE_DIR)}:{node.lineno}')
+        self.assertEqual(offenders, [])
+
+
+@override_settings(METRICS_SERVER_TIMING=True, METRICS_TOKEN='scrape-token')
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+
+    def test_requests_are_measured_per_view(self):
+        url = reverse('webpages:careers_list')
+        JobList.objects.create(job_title='Leasing agent', category='services')
+        first = self.client.get(url)
+        self.assertRegex(first['Server-Timing'], r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+        self.assertRegex(first['Server-Timing'], r'tpl;dur=[\d.]+')
+        second = self.client.get(url)
+        self.assertIn('desc="0 queries"', second['Server-Timing'])
+
+        body = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-token').content.decode()
+        self.assertIn('yk_http_requests_total{view="webpages:careers_list",method="GET",status="200"} 2', body)
+        self.assertIn('yk_http_request_duration_seconds_count{view="webpages:careers_list"} 2', body)
+        self.assertRegex(body, r'yk_http_request_cache_hits_total\{view="webpages:careers_list"\} [1-9]')
+
+    def test_metrics_are_internal(self):
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.9')
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 403)  # the default allowlist is empty, localhost included
+        with override_settings(METRICS_TOKEN='', METRICS_ALLOWED_IPS=['10.0.0.5']):
+            self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+            self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.5').status_code, 200)
+
+    def test_label_values_are_escaped(self):
+        metrics.registry.observe('odd"view\\\n', 'GET', 200, 0.01, metrics.RequestStats(0))
+        body = metrics.registry.exposition()
+        self.assertIn('yk_http_requests_total{view="odd\\"view\\\\\\n",method="GET",status="200"} 1', body)
+
+    @override_settings(METRICS_QUERY_LOG_THRESHOLD=1)
+    def test_views_over_the_query_threshold_are_logged(self):
+        with self.assertLogs('yk.metrics', 'WARNING') as logs:
+            self.client.get('/sitemap-portions.xml')  # at least the page count, then the page
+        event = logs.records[0].msg
+        self.assertEqual(event['view'], 'django.contrib.sitemaps.views.sitemap')
+        self.assertGreater(event['queries'], 1)
+        self.assertIn('sitemaps', event['stack'])
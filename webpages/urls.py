@@ -37,5 +37,7 @@ urlpatterns = [
      # API endpoints ----------------------------------------------------------------
      path('api/docs/', webpages_views.api_documentation, name='api_documentation'),
      path('api/health/', webpages_views.api_health, name='api_health'),
+    path('api/health/ready/', webpages_views.api_health, name='api_health_ready'),
+    path('api/health/live/', webpages_views.api_health_live, name='api_health_live'),
 
 ]
@@ -1,38 +1,25 @@
-from django.shortcuts import render , redirect
-from django.contrib.auth.decorators import login_required
-from django.contrib import messages
-from django.core.exceptions import ObjectDoesNotExist
+from django.shortcuts import render
 
+from accounts.roles import role_required
 
 
 # Create your views here.
-@login_required(login_url='account_login')
-def dashboard(request):
-    try:
-        profile = request.user.profile
-    except ObjectDoesNotExist:
-        print("profile is none")
-        return redirect('accounts:profile')
-    if request.user.profile.is_workman == False:
-        messages.error(request, 'You are not authorized to access Wrokman Dashboard.', extra_tags='danger')
-        return redirect('accounts:profile')
-    profile = request.user.profile
+workman_required = role_required('is_workman', 'You are not authorized to access Workman Dashboard.')
 
 
+@workman_required
+def dashboard(request):
     data = {
-        'profile': profile
+        'profile': request.profile
     }
 
     return render(request, 'workman/dashboard.html', data)
 
 
+@workman_required
 def workman_profile(request):
-    if request.user.profile.is_workman == False:
-        messages.error(request, 'You are not authorized to access Wrokman Dashboard.', extra_tags='danger')
-        return redirect('account_login')
-    profile = request.user.profile
     data = {
-        'profile': profile
+        'profile': request.profile
     }
 
-    return render(request, 'workman/profile.html', data)
\ No newline at end of file
+    return render(request, 'workman/profile.html', data)
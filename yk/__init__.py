@@ -0,0 +1,7 @@
+# Load the Celery app when Django starts so shared_task binds to it.
+try:
+    from .celery import app as celery_app
+except ImportError:  # celery not installed: property.tasks falls back to running inline
+    celery_app = None
+
+__all__ = ('celery_app',)
@@ -0,0 +1,105 @@
+import logging
+import random
+import re
+import time
+import uuid
+
+import structlog
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+
+# structured logging ..............................................................
+# Events go through structlog into the stdlib handlers from LOGGING. Loggers are
+# level-filtered at configuration time, so a disabled logger.debug() is a no-op
+# method call. Every record made while a request is handled carries its
+# request_id, which is also echoed in the X-Request-ID response header.
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+REQUEST_ID = re.compile(r'[A-Za-z0-9._-]{1,64}')
+
+get_logger = structlog.get_logger
+
+
+def configure_logging(level='INFO', json=True):
+    """Configure structlog and return the LOGGING dict that renders its events"""
+    shared = [
+        structlog.contextvars.merge_contextvars,
+        structlog.stdlib.add_logger_name,
+        structlog.processors.add_log_level,
+        structlog.processors.TimeStamper(fmt='iso'),
+    ]
+    structlog.configure(
+        processors=shared + [structlog.stdlib.ProcessorFormatter.wrap_for_formatter],
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        wrapper_class=structlog.make_filtering_bound_logger(logging.getLevelName(level)),
+        cache_logger_on_first_use=True,
+    )
+    renderer = structlog.processors.JSONRenderer() if json else structlog.dev.ConsoleRenderer()
+    return {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'formatters': {
+            'structured': {
+                '()': structlog.stdlib.ProcessorFormatter,
+                'processors': [structlog.stdlib.ProcessorFormatter.remove_processors_meta, renderer],
+                'foreign_pre_chain': shared,  # Django's own records get request_id too
+            },
+        },
+        'handlers': {
+            'console': {'class': 'logging.StreamHandler', 'formatter': 'structured'},
+        },
+        'root': {'handlers': ['console'], 'level': level},
+    }
+
+
+def request_id(request):
+    incoming = request.headers.get(REQUEST_ID_HEADER, '')
+    return incoming if REQUEST_ID.fullmatch(incoming) else uuid.uuid4().hex
+
+
+class RequestLogMiddleware:
+    """
+    Bind a correlation id for the request and log a sample of requests:
+    LOG_REQUEST_SAMPLE_RATE of them, plus every server error and every
+    request slower than LOG_SLOW_REQUEST_MS.
+    """
+    sync_capable = True
+    async_capable = True
+
+    logger = get_logger('yk.request')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = self.start(request)
+        try:
+            return self.finish(request, self.get_response(request), started)
+        finally:
+            structlog.contextvars.clear_contextvars()
+
+    async def __acall__(self, request):
+        started = self.start(request)
+        try:
+            return self.finish(request, await self.get_response(request), started)
+        finally:
+            structlog.contextvars.clear_contextvars()
+
+    def start(self, request):
+        request.id = request_id(request)
+        structlog.contextvars.bind_contextvars(request_id=request.id)
+        return time.perf_counter()
+
+    def finish(self, request, response, started):
+        response[REQUEST_ID_HEADER] = request.id
+        duration_ms = (time.perf_counter() - started) * 1000
+        if (response.status_code >= 500 or duration_ms >= settings.LOG_SLOW_REQUEST_MS
+                or random.random() < settings.LOG_REQUEST_SAMPLE_RATE):
+            self.logger.info('request', method=request.method, path=request.path,
+                             status=response.status_code, duration_ms=round(duration_ms, 2))
+        return response
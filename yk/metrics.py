@@ -0,0 +1,298 @@
+import hmac
+import threading
+import time
+import traceback
+from collections import defaultdict
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache as _LocMemCache
+from django.core.exceptions import PermissionDenied
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.template.backends import django as django_backend
+
+from yk.log import get_logger
+
+try:
+    from django_redis.cache import RedisCache as _RedisCache
+except ImportError:  # django-redis is only needed when REDIS_URL is set
+    _RedisCache = None
+
+
+# request metrics .................................................................
+# MetricsMiddleware opens a RequestStats for each request in a context variable.
+# The database execute wrapper, the cache backends and the template backend below
+# add to it, from the request thread and from sync_to_async threads alike (both
+# see the same context). Outside a request they only check the variable.
+# Totals are kept per process and exposed in Prometheus text format at
+# /internal/metrics/, and per request in the Server-Timing header.
+
+logger = get_logger('yk.metrics')
+
+current_stats = ContextVar('current_stats', default=None)
+
+DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MISSING = object()
+
+
+class RequestStats:
+
+    def __init__(self, query_log_threshold):
+        self.started = time.perf_counter()
+        self.query_log_threshold = query_log_threshold
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_seconds = 0.0
+        self.slowest = []  # (seconds, sql) of the five slowest queries
+        self.excess_stack = None  # where the first query over the threshold was made
+
+    def add_query(self, sql, seconds):
+        self.queries += 1
+        self.db_seconds += seconds
+        if len(self.slowest) < 5 or seconds > self.slowest[-1][0]:
+            self.slowest = sorted(self.slowest + [(seconds, sql)], reverse=True)[:5]
+        if self.query_log_threshold and self.queries == self.query_log_threshold + 1:
+            self.excess_stack = ''.join(traceback.format_stack(limit=25)[:-3])
+
+
+def record_query(execute, sql, params, many, context):
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add_query(sql, time.perf_counter() - started)
+
+
+def instrument(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(instrument)
+
+
+def record_cache(hits, misses):
+    stats = current_stats.get()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+# cache backends that count hits and misses; CACHES points at these
+
+class CacheStatsMixin:
+
+    def get(self, key, default=None, *args, **kwargs):
+        value = super().get(key, MISSING, *args, **kwargs)
+        hit = value is not MISSING
+        record_cache(int(hit), int(not hit))
+        return value if hit else default
+
+    def get_many(self, keys, *args, **kwargs):
+        keys = list(keys)
+        token = current_stats.set(None)  # some backends implement get_many with get()
+        try:
+            found = super().get_many(keys, *args, **kwargs)
+        finally:
+            current_stats.reset(token)
+        record_cache(len(found), len(keys) - len(found))
+        return found
+
+
+class LocMemCache(CacheStatsMixin, _LocMemCache):
+    pass
+
+
+if _RedisCache is not None:
+    class RedisCache(CacheStatsMixin, _RedisCache):
+        pass
+
+
+# template backend that times top-level renders; includes are inside them
+
+class Template(django_backend.Template):
+
+    def render(self, context=None, request=None):
+        stats = current_stats.get()
+        if stats is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_seconds += time.perf_counter() - started
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except django_backend.TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
+
+
+def label(value):
+    """A label value as the text format quotes it"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Registry:
+    """Per-process totals, labelled by view name"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = defaultdict(int)  # (view, method, status) -> count
+        self.buckets = defaultdict(lambda: [0] * len(DURATION_BUCKETS))
+        self.totals = defaultdict(lambda: defaultdict(float))  # view -> metric -> sum
+
+    def observe(self, view, method, status, duration, stats):
+        with self.lock:
+            self.requests[view, method, status] += 1
+            buckets = self.buckets[view]
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    buckets[i] += 1
+            totals = self.totals[view]
+            totals['count'] += 1
+            totals['duration'] += duration
+            totals['db_queries'] += stats.queries
+            totals['db_seconds'] += stats.db_seconds
+            totals['cache_hits'] += stats.cache_hits
+            totals['cache_misses'] += stats.cache_misses
+            totals['template_seconds'] += stats.template_seconds
+
+    def exposition(self):
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        with self.lock:
+            family('yk_http_requests_total', 'counter', 'Requests by view, method and status')
+            for (view, method, status), count in sorted(self.requests.items()):
+                lines.append(f'yk_http_requests_total{{view="{label(view)}",method="{label(method)}",'
+                             f'status="{status}"}} {count}')
+
+            family('yk_http_request_duration_seconds', 'histogram', 'Wall time per request')
+            for view, buckets in sorted(self.buckets.items()):
+                totals, view = self.totals[view], label(view)
+                for bound, count in zip(DURATION_BUCKETS, buckets):
+                    lines.append(f'yk_http_request_duration_seconds_bucket{{view="{view}",le="{bound}"}} {count}')
+                lines.append(f'yk_http_request_duration_seconds_bucket{{view="{view}",le="+Inf"}} {int(totals["count"])}')
+                lines.append(f'yk_http_request_duration_seconds_sum{{view="{view}"}} {totals["duration"]:.6f}')
+                lines.append(f'yk_http_request_duration_seconds_count{{view="{view}"}} {int(totals["count"])}')
+
+            for metric, help_text in (
+                    ('db_queries', 'Database queries'),
+                    ('db_seconds', 'Seconds spent in database queries'),
+                    ('cache_hits', 'Cache hits'),
+                    ('cache_misses', 'Cache misses'),
+                    ('template_seconds', 'Seconds spent rendering templates')):
+                name = f'yk_http_request_{metric}_total'
+                family(name, 'counter', f'{help_text}, summed over requests')
+                for view, totals in sorted(self.totals.items()):
+                    view, value = label(view), totals[metric]
+                    lines.append(f'{name}{{view="{view}"}} {value:.6f}' if 'seconds' in metric
+                                 else f'{name}{{view="{view}"}} {int(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else 'unresolved'
+
+
+def server_timing(stats, duration):
+    return ', '.join((
+        f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries"',
+        f'cache;desc="{stats.cache_hits} hits {stats.cache_misses} misses"',
+        f'tpl;dur={stats.template_seconds * 1000:.1f}',
+        f'total;dur={duration * 1000:.1f}',
+    ))
+
+
+class MetricsMiddleware:
+    """
+    Record query count, DB time, cache hits/misses, template time and wall time
+    per request, labelled with the resolved URL name. Requests making more than
+    METRICS_QUERY_LOG_THRESHOLD queries are logged with their slowest queries
+    and the stack of the first query over the limit.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            stats = current_stats.get()
+            current_stats.reset(token)
+        return self.finish(request, response, stats)
+
+    async def __acall__(self, request):
+        token = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            stats = current_stats.get()
+            current_stats.reset(token)
+        return self.finish(request, response, stats)
+
+    def start(self):
+        for connection in connections.all(initialized_only=True):
+            instrument(connection)
+        return current_stats.set(RequestStats(settings.METRICS_QUERY_LOG_THRESHOLD))
+
+    def finish(self, request, response, stats):
+        duration = time.perf_counter() - stats.started
+        view = view_name(request)
+        registry.observe(view, request.method, response.status_code, duration, stats)
+        if settings.METRICS_SERVER_TIMING:
+            response['Server-Timing'] = server_timing(stats, duration)
+        if stats.excess_stack:
+            logger.warning('too_many_queries', view=view, path=request.path, queries=stats.queries,
+                           db_ms=round(stats.db_seconds * 1000, 2),
+                           slowest=[(round(seconds * 1000, 2), sql) for seconds, sql in stats.slowest],
+                           stack=stats.excess_stack)
+        return response
+
+
+def scrape_allowed(request):
+    token = settings.METRICS_TOKEN
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+
+def metrics(request):
+    """Prometheus scrape endpoint, only with METRICS_TOKEN or from METRICS_ALLOWED_IPS"""
+    if not scrape_allowed(request):
+        raise PermissionDenied
+    return HttpResponse(registry.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -3,6 +3,8 @@ import os
 from pathlib import Path
 from decouple import config
 
+from yk.log import configure_logging
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = config('SECRET_KEY')
@@ -47,11 +49,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'yk.log.RequestLogMiddleware',
+    'yk.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.roles.ProfileMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 
@@ -63,7 +68,7 @@ ROOT_URLCONF = 'yk.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'yk.metrics.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -87,17 +92,43 @@ WSGI_APPLICATION = 'yk.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# DB_ROLE=web|worker picks the connection limits below; run celery with DB_ROLE=worker.
+# DB_POOL=True uses psycopg 3's connection pool (one per process, right for ASGI
+# and threaded servers); otherwise connections persist for DB_CONN_MAX_AGE seconds
+# and are health-checked before reuse.
+
+DB_ROLE = config('DB_ROLE', default='web')
+DB_POOL = config('DB_POOL', default=False, cast=bool)
+
 DATABASES = {
     'default': {
-        'ENGINE': config('DB_HOST', default='django.db.backends.postgresql'),
+        'ENGINE': config('ENGINE', default='django.db.backends.postgresql'),
         'NAME': config('DB_NAME'),
         'USER': config('DB_USER'),
         'PASSWORD': config('DB_PASSWORD'),
         'HOST': config('DB_HOST', default='localhost'),
-        'PORT': config('PORT', '5432', cast=int),
+        'PORT': config('DB_PORT', default=config('PORT', default=5432), cast=int),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
     }
 }
 
+if 'postgresql' in DATABASES['default']['ENGINE']:
+    DATABASES['default']['OPTIONS']['connect_timeout'] = config('DB_CONNECT_TIMEOUT', default=5, cast=int)
+
+if DB_POOL:
+    DATABASES['default']['CONN_MAX_AGE'] = 0  # the pool owns connection lifetime
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': config('DB_POOL_MIN_SIZE', default=2 if DB_ROLE == 'web' else 1, cast=int),
+        'max_size': config('DB_POOL_MAX_SIZE', default=10 if DB_ROLE == 'web' else 4, cast=int),
+        'timeout': config('DB_POOL_TIMEOUT', default=10, cast=float),
+        'max_idle': config('DB_POOL_MAX_IDLE', default=300, cast=float),
+    }
+else:
+    # workers hold a connection for a whole task, close idle ones sooner so they free server slots
+    DATABASES['default']['CONN_MAX_AGE'] = config(
+        'DB_CONN_MAX_AGE', default=60 if DB_ROLE == 'web' else 30, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -176,3 +207,78 @@ ACCOUNT_EMAIL_VERIFICATION = 'none'
 LOGIN_REDIRECT_URL = '/'
 SIGNUP_REDIRECT_URL = '/profile/'
 
+
+# celery settings
+# Leave CELERY_BROKER_URL empty to run background tasks inline after commit.
+
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='')
+CELERY_TASK_IGNORE_RESULT = True
+
+
+# cache settings
+# django-redis when REDIS_URL is set, per-process local memory otherwise (tests, local runs).
+# The yk.metrics subclasses count hits and misses per request.
+
+REDIS_URL = config('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'yk.metrics.RedisCache',
+            'LOCATION': REDIS_URL,
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+                'IGNORE_EXCEPTIONS': True,
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'yk.metrics.LocMemCache',
+        }
+    }
+
+# seconds an anonymous marketing page stays cached; 0 disables webpages.cache
+PAGE_CACHE_TIMEOUT = config('PAGE_CACHE_TIMEOUT', default=600, cast=int)
+
+# seconds a rendered sitemap page stays cached; portion and job changes drop their pages sooner
+SITEMAP_CACHE_TIMEOUT = config('SITEMAP_CACHE_TIMEOUT', default=60 * 60 * 6, cast=int)
+
+# PostgreSQL text search configurations portion text is indexed and queried with
+FULLTEXT_CONFIGS = config('FULLTEXT_CONFIGS', default='english,arabic',
+                          cast=lambda v: tuple(s.strip() for s in v.split(',') if s.strip()))
+
+
+# health check settings
+# seconds each readiness probe may take, and how long one report is reused per process
+
+HEALTH_PROBE_TIMEOUT = config('HEALTH_PROBE_TIMEOUT', default=2.0, cast=float)
+HEALTH_CACHE_TTL = config('HEALTH_CACHE_TTL', default=5, cast=float)
+
+
+# logging settings
+# structlog events rendered as JSON lines (console output when LOG_JSON=False).
+# A sample of requests is logged with its request_id; errors and slow requests always are.
+
+LOG_LEVEL = config('LOG_LEVEL', default='INFO')
+LOG_JSON = config('LOG_JSON', default=not DEBUG, cast=bool)
+LOG_REQUEST_SAMPLE_RATE = config('LOG_REQUEST_SAMPLE_RATE', default=0.01, cast=float)
+LOG_SLOW_REQUEST_MS = config('LOG_SLOW_REQUEST_MS', default=1000, cast=float)
+
+LOGGING = configure_logging(LOG_LEVEL, json=LOG_JSON)
+
+
+# metrics settings
+# Prometheus text at /internal/metrics/, closed unless configured: scrapers send
+# "Authorization: Bearer <METRICS_TOKEN>", or connect from METRICS_ALLOWED_IPS. The
+# allowlist matches REMOTE_ADDR, which behind a proxy on the same host is the proxy's
+# own address for every client, so list addresses only where scrapers connect directly.
+# Requests making more than METRICS_QUERY_LOG_THRESHOLD queries are logged with a
+# stack (0 disables).
+
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+METRICS_ALLOWED_IPS = config('METRICS_ALLOWED_IPS', default='',
+                             cast=lambda v: [s.strip() for s in v.split(',') if s.strip()])
+METRICS_QUERY_LOG_THRESHOLD = config('METRICS_QUERY_LOG_THRESHOLD', default=50, cast=int)
+METRICS_SERVER_TIMING = config('METRICS_SERVER_TIMING', default=DEBUG, cast=bool)
@@ -3,9 +3,10 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from django.contrib.sitemaps.views import sitemap
-from webpages.sitemaps import StaticViewSitemap, JobListSitemap, PortionSitemap
+from django.contrib.sitemaps import views as sitemap_views
+from webpages.sitemaps import StaticViewSitemap, JobListSitemap, PortionSitemap, cache_sitemap
 from django.views.generic import TemplateView
+from yk.metrics import metrics
 
 
 sitemaps = {
@@ -20,7 +21,10 @@ urlpatterns = [
     path('accounts/', include('allauth.urls'), name='accounts'),
     path('', include('accounts.urls'), name='accounts'),
     path('', include(('webpages.urls', 'webpages'), namespace="webpages")),
-    path('sitemap.xml', sitemap, {'sitemaps': sitemaps}, name='django.contrib.sitemaps.views.sitemap'),
+    path('sitemap.xml', cache_sitemap(sitemap_views.index), {'sitemaps': sitemaps}, name='sitemap_index'),
+    path('sitemap-<section>.xml', cache_sitemap(sitemap_views.sitemap), {'sitemaps': sitemaps},
+         name='django.contrib.sitemaps.views.sitemap'),
+    path('internal/metrics/', metrics, name='metrics'),
     path('robots.txt', TemplateView.as_view(template_name="webpages/robots.txt", content_type='text/plain')),
      
     path('property/', include('property.urls'), name='property'),